@@ -1,6 +1,7 @@
 
 from .Settings import Settings
 from .Print import Print
+from .Plugin_Stats import Plugin_Stats
 
 # Record a list of all plugins defined.
 # This is filled in by the decorator at startup.
@@ -23,6 +24,231 @@ def Plugin_Was_Run_Before(plugin_name):
     '''
     return plugin_name in plugins_names_run
 
+
+class Edit_Planner_class:
+    '''
+    Planner for xml edits queued by transforms, when the
+    batch_transform_edits setting is enabled. Edits are queued as
+    functions taking open XML_Edits, then applied together with a
+    single XML_Edit per file, committed once all edits are applied.
+
+    Attributes:
+    * queued_edits
+      - List of tuples of (plugin name, call id, game files, edit
+        function), in queue order.
+    * after_edits
+      - List of tuples of (plugin name, call id, function), to call
+        once all queued edits are applied.
+    * plugin_name
+      - String, name of the edit queuing plugin currently running,
+        or None. Set only for outermost plugin calls.
+    * plugin_depth
+      - Int, number of nested plugin calls currently running.
+    * call_id
+      - Int, incremented on each queuing plugin call, to identify
+        the edits to drop if the call fails.
+    * call_records
+      - Dict, keyed by call id, holding the Plugin_Stats records of
+        queuing plugin calls, so that edits failing later can be
+        recorded against the plugin that queued them.
+    '''
+    def __init__(self):
+        self.queued_edits = []
+        self.after_edits = []
+        self.call_records = {}
+        self.plugin_name = None
+        self.plugin_depth = 0
+        self.call_id = 0
+        return
+
+
+    def Is_Queuing(self):
+        '''
+        Returns True if edits made now should be queued.
+        '''
+        return self.plugin_name != None and Settings.batch_transform_edits
+
+
+    def Edit_Root(self, game_file, edit_function):
+        '''
+        Applies an edit function to the current xml of a game file,
+        through an XML_Edit. When queuing, this is delayed until
+        Apply_Edits, otherwise it happens immediately.
+
+        * game_file
+          - XML_File to edit.
+        * edit_function
+          - Function which takes an open XML_Edit of the file, and
+            edits its root in place, using the XML_Edit methods (or
+            Track ahead of direct changes) so that the changes can be
+            rolled back if the function fails.
+        '''
+        self.Edit_Files([game_file], 
+                        lambda edits: edit_function(edits[game_file]))
+        return
+
+
+    def Edit_Files(self, game_files, edit_function):
+        '''
+        Applies an edit function to the current xml of several game
+        files together, eg. to apply an Attribute_Batch to all of them
+        at once. When queuing, this is delayed until Apply_Edits,
+        otherwise it happens immediately.
+
+        * game_files
+          - List of XML_Files to edit.
+        * edit_function
+          - Function which takes a dict of open XML_Edits, keyed by
+            game file, and edits them in place as in Edit_Root.
+          - If it fails, all of its changes are rolled back.
+        '''
+        if self.Is_Queuing():
+            self.queued_edits.append(
+                (self.plugin_name, self.call_id, list(game_files), edit_function))
+            return
+
+        edits = {}
+        try:
+            for game_file in game_files:
+                if game_file not in edits:
+                    edits[game_file] = game_file.Begin_Edit()
+            edit_function(edits)
+        except Exception as ex:
+            for edit in edits.values():
+                edit.Rollback()
+            raise ex
+        for edit in edits.values():
+            edit.Commit()
+        return
+
+
+    def After_Edits(self, function):
+        '''
+        Calls a function once edits passed to Edit_Root or Edit_Files
+        have been applied, eg. to report on changes; immediately if
+        not queuing.
+        '''
+        if not self.Is_Queuing():
+            function()
+            return
+        self.after_edits.append((self.plugin_name, self.call_id, function))
+        return
+
+
+    def Drop_Call(self, call_id):
+        '''
+        Drops all queued edits from the given plugin call.
+        '''
+        self.queued_edits = [x for x in self.queued_edits if x[1] != call_id]
+        self.after_edits  = [x for x in self.after_edits  if x[1] != call_id]
+        self.call_records.pop(call_id, None)
+        return
+
+
+    def Reset(self):
+        '''
+        Drops all queued edits, eg. when the loaded files are reset.
+        '''
+        self.queued_edits.clear()
+        self.after_edits.clear()
+        self.call_records.clear()
+        return
+
+
+    def Apply_Edits(self):
+        '''
+        Applies all queued edits, in queue order. Each file gets one
+        XML_Edit, committed after all edits are applied. If an edit
+        fails, its changes are rolled back and the rest of its
+        plugin call's edits are skipped, matching what would happen
+        without queuing. In developer mode, the first such exception
+        is raised after the other edits are applied.
+        '''
+        # Skip if nothing is queued.
+        if not self.queued_edits and not self.after_edits:
+            return
+        # Swap out the queues, in case of edits being queued during this.
+        queued_edits = self.queued_edits
+        after_edits = self.after_edits
+        call_records = self.call_records
+        self.queued_edits = []
+        self.after_edits = []
+        self.call_records = {}
+
+        # Time this like a plugin call, since it finishes the work of
+        # the queuing plugins. Failed edits are recorded against the
+        # plugins that queued them.
+        Plugin_Stats.Start_Call('Apply_Edits', 'Edit_Planner')
+        succeeded = False
+        try:
+            exception = self._Apply_Edits(queued_edits, after_edits, 
+                                          call_records)
+            succeeded = True
+        finally:
+            Plugin_Stats.End_Call(succeeded)
+
+        # Pass along the first failure, if in developer mode.
+        if exception != None:
+            raise exception
+        return
+
+
+    def _Apply_Edits(self, queued_edits, after_edits, call_records):
+        '''
+        Applies the given queued edits and after-edit functions, for
+        Apply_Edits, marking the call_records of failed calls as not
+        succeeded. Returns the first exception to raise in developer
+        mode, or None.
+        '''
+        failed_call_ids = set()
+        first_exception = None
+        # Open XML_Edits, keyed by game file.
+        file_edits_dict = {}
+        try:
+            for plugin_name, call_id, game_files, edit_function in queued_edits:
+                # Skip the rest of a call that failed earlier.
+                if call_id in failed_call_ids:
+                    continue
+
+                # Gather this function's edits, opening any new ones,
+                # and note where its changes begin.
+                edits = {}
+                for game_file in game_files:
+                    if game_file not in file_edits_dict:
+                        file_edits_dict[game_file] = game_file.Begin_Edit()
+                    edits[game_file] = file_edits_dict[game_file]
+                savepoints = {x : y.Get_Savepoint() for x,y in edits.items()}
+
+                try:
+                    edit_function(edits)
+                except Exception as ex:
+                    failed_call_ids.add(call_id)
+                    if call_id in call_records:
+                        call_records[call_id]['succeeded'] = False
+                    # Undo just this function's changes.
+                    for game_file, edit in edits.items():
+                        edit.Rollback(savepoints[game_file])
+                    if Settings.developer:
+                        if first_exception == None:
+                            first_exception = ex
+                        continue
+                    Print('Skipped {} edits to {} due to {}: "{}".'.format(
+                        plugin_name, 
+                        ', '.join(x.virtual_path for x in game_files),
+                        type(ex).__name__, str(ex)))
+        finally:
+            # Commit each file once, keeping the successful changes.
+            for edit in file_edits_dict.values():
+                edit.Commit()
+
+        for plugin_name, call_id, function in after_edits:
+            if call_id not in failed_call_ids:
+                function()
+        return first_exception
+
+# Static copy of the planner.
+Edit_Planner = Edit_Planner_class()
+
 '''
 Decorator function for plugins.
 
@@ -40,13 +266,14 @@ Decorator function for plugins.
     To get the wrapped function's name and documentation preserved,
     use the 'wraps' decorator from functools.
 '''
-from functools import wraps
+from functools import wraps, partial
 def _Plugin_Wrapper(
         plugin_type = None,
         category = None,
         uses_paths_from_settings = True,
         doc_priority = 0,
         shared_docs = None,
+        queues_edits = False,
     ):
     '''
     Wrapper function for plugins.
@@ -76,6 +303,12 @@ def _Plugin_Wrapper(
       - Printouts will aim to print this once when listing multiple
         plugins with the same shared_doc, or per-plugin when they
         are printed individually.
+    * queues_edits
+      - Bool, if True then the plugin makes all of its xml changes
+        through Edit_Planner.Edit_Root or Edit_Files, and they may be
+        queued when the batch_transform_edits setting is enabled.
+      - When False (default), any queued edits are applied before
+        the plugin runs, so that it sees their results.
     '''
     # Make the inner decorator function, capturing the wrapped function.
     def inner_decorator(func):
@@ -84,6 +317,7 @@ def _Plugin_Wrapper(
         func._plugin_type   = plugin_type
         func._uses_paths_from_settings = uses_paths_from_settings
         func._doc_priority = doc_priority
+        func._queues_edits = queues_edits
 
         # If a shared_docs string given, pack into a list;
         # use an empty list if None,
@@ -129,6 +363,24 @@ def _Plugin_Wrapper(
             # Note this plugin as having been called.
             plugins_names_run.add(func.__name__)            
 
+            # Plugins that don't queue edits need prior ones applied.
+            # Nested plugin calls keep the outer plugin's queuing state.
+            is_outer_call = Edit_Planner.plugin_depth == 0
+            if is_outer_call:
+                if func._queues_edits:
+                    Edit_Planner.plugin_name = func.__name__
+                    Edit_Planner.call_id += 1
+                else:
+                    Edit_Planner.Apply_Edits()
+            call_id = Edit_Planner.call_id
+            Edit_Planner.plugin_depth += 1
+
+            # Record the time and work done in the call.
+            call_record = Plugin_Stats.Start_Call(func.__name__, func._plugin_type)
+            succeeded = False
+            # Queued edits may fail later; keep the record to mark.
+            if is_outer_call and Edit_Planner.Is_Queuing():
+                Edit_Planner.call_records[call_id] = call_record
 
             # Call the plugin function, looking for exceptions.
             # This will be the generally clean fallback when anything
@@ -136,20 +388,28 @@ def _Plugin_Wrapper(
             #  attempted.
             try:
                 results = func(*args, **kwargs)
+                succeeded = True
 
                 # If here, ran successfully.
                 # (This may not be the case in dev mode, but that will
                 #  have other messages to indicate the problem.)
                 if Settings.verbose:
-                    Print('Successfully ran {}'.format(
-                        func.__name__
-                        ))
+                    message = 'Successfully ran {}'.format(func.__name__)
+                    # Queued edits may still fail, so wait on them.
+                    if func._queues_edits and Edit_Planner.Is_Queuing():
+                        Edit_Planner.After_Edits(partial(Print, message))
+                    else:
+                        Print(message)
 
                 # If the function is supposed to return anything, return it
                 #  here, though currently this is expected to always be None.
                 return results
             
             except Exception as ex:
+                # Drop any edits this call queued before failing.
+                if func._queues_edits and is_outer_call:
+                    Edit_Planner.Drop_Call(call_id)
+
                 # When set to catch exceptions, just print a nice message.
                 if not Settings.developer:
                     # Give the exception name.
@@ -162,6 +422,12 @@ def _Plugin_Wrapper(
                     # Reraise the exception.
                     raise ex
 
+            finally:
+                Plugin_Stats.End_Call(succeeded)
+                Edit_Planner.plugin_depth -= 1
+                if is_outer_call:
+                    Edit_Planner.plugin_name = None
+
             return
 
         # Return the callable function.
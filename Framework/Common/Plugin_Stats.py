@@ -0,0 +1,192 @@
+'''
+Timing and work counters for plugin calls, to help find where run
+time is spent.
+'''
+import cProfile
+import json
+import pstats
+import time
+from collections import defaultdict
+
+from .Settings import Settings
+from .Print import Print
+
+
+class Plugin_Stats_class:
+    '''
+    Records the wall and cpu time of each plugin call, along with the
+    framework work done during the call, as counted by Count (eg. files
+    loaded, xml parsed and patched, xpath lookups, catalog bytes read).
+    When the profile_plugins setting is enabled, outermost plugin calls
+    are also run under cProfile, recording their most costly functions.
+
+    Attributes:
+    * counters
+      - Dict, keyed by counter name, holding running totals.
+    * call_records
+      - List of dicts, one per plugin call, in the order the calls
+        started. Each has 'name', 'type', 'depth', 'succeeded',
+        'wall_time', 'cpu_time', 'counters' (dict of the counter
+        changes during the call), and optionally 'profile' (list of
+        dicts for the top functions by cumulative time).
+    * open_calls
+      - List of tuples of (record, counters copy, wall start, cpu start,
+        profiler or None), for calls still running, innermost last.
+    '''
+    # Counters shown in the summary table, with their column labels.
+    summary_counters = [
+        ('files_loaded'      , 'Loaded'),
+        ('xml_parsed'        , 'Parsed'),
+        ('xml_patched'       , 'Patched'),
+        ('xpath_evals'       , 'Xpaths'),
+        ('catalog_bytes_read', 'Cat bytes'),
+        ]
+    # How many profiled functions to record per call.
+    profile_row_limit = 30
+
+    def __init__(self):
+        self.counters = defaultdict(int)
+        self.call_records = []
+        self.open_calls = []
+        return
+
+
+    def Reset(self):
+        '''
+        Clears all counters and records, eg. at the start of a run.
+        Calls still running are unaffected.
+        '''
+        self.counters.clear()
+        self.call_records = []
+        return
+
+
+    def Count(self, name, amount = 1):
+        '''
+        Adds to a named counter.
+        '''
+        self.counters[name] += amount
+        return
+
+
+    def Start_Call(self, name, plugin_type = None):
+        '''
+        Starts recording a plugin call. Should be paired with End_Call.
+        Returns the call's record dict.
+        '''
+        record = {
+            'name'     : name,
+            'type'     : plugin_type,
+            'depth'    : len(self.open_calls),
+            'succeeded': False,
+            }
+        self.call_records.append(record)
+
+        # cProfile doesn't support nesting, so only profile outer calls.
+        profiler = None
+        if Settings.profile_plugins and not self.open_calls:
+            profiler = cProfile.Profile()
+
+        self.open_calls.append((record, dict(self.counters),
+                                time.perf_counter(), time.process_time(),
+                                profiler))
+        # Start profiling last, to skip the setup above.
+        if profiler != None:
+            profiler.enable()
+        return record
+
+
+    def End_Call(self, succeeded = True):
+        '''
+        Finishes recording the innermost running plugin call.
+        '''
+        record, start_counters, wall_start, cpu_start, profiler = self.open_calls.pop()
+        if profiler != None:
+            profiler.disable()
+        record['wall_time'] = time.perf_counter() - wall_start
+        record['cpu_time']  = time.process_time() - cpu_start
+        record['succeeded'] = succeeded
+        # Keep just the counters that changed.
+        record['counters'] = {
+            name : value - start_counters.get(name, 0)
+            for name, value in self.counters.items()
+            if value != start_counters.get(name, 0)}
+        if profiler != None:
+            record['profile'] = _Get_Profile_Rows(profiler, self.profile_row_limit)
+        return
+
+
+    def Write_Report(self):
+        '''
+        Writes the call records and counter totals to a json file,
+        next to the plugin log. Skipped if the output paths were never
+        set up, eg. when only plugins not using them were run.
+        '''
+        if not Settings._init_complete:
+            return
+        report = {
+            'calls'    : self.call_records,
+            'counters' : dict(self.counters),
+            }
+        with open(Settings.Get_Plugin_Stats_Path(), 'w') as file:
+            json.dump(report, file, indent = 2)
+        return
+
+
+    def Print_Summary(self):
+        '''
+        Prints a table of the recorded plugin calls, with their times
+        and main counters. Nested calls are indented under their caller.
+        '''
+        labels = ['Plugin', 'Wall s', 'CPU s'] + [x[1] for x in self.summary_counters]
+        rows = []
+        for record in self.call_records:
+            # Skip calls that are still running.
+            if 'wall_time' not in record:
+                continue
+            name = '  ' * record['depth'] + record['name']
+            if not record['succeeded']:
+                name += ' (failed)'
+            rows.append([name,
+                         '{:.3f}'.format(record['wall_time']),
+                         '{:.3f}'.format(record['cpu_time'])]
+                        + [str(record['counters'].get(x[0], 0))
+                           for x in self.summary_counters])
+        if not rows:
+            return
+
+        # Left align names, right align numbers.
+        widths = [max(len(row[i]) for row in [labels] + rows)
+                  for i in range(len(labels))]
+        lines = []
+        for row in [labels] + rows:
+            lines.append('  '.join(
+                [row[0].ljust(widths[0])]
+                + [x.rjust(w) for x, w in zip(row[1:], widths[1:])]))
+        lines.insert(1, '-' * len(lines[0]))
+        Print('Plugin run summary:\n' + '\n'.join(lines))
+        return
+
+
+def _Get_Profile_Rows(profiler, limit):
+    '''
+    Returns a list of dicts for the top functions of a profiler, by
+    cumulative time, holding 'function', 'calls', 'total_time'
+    and 'cumulative_time'.
+    '''
+    stats = pstats.Stats(profiler).sort_stats('cumulative')
+    rows = []
+    for func in stats.fcn_list[:limit]:
+        prim_calls, calls, total_time, cumulative_time, callers = stats.stats[func]
+        file_name, line, func_name = func
+        rows.append({
+            'function'        : '{}:{}({})'.format(file_name, line, func_name),
+            'calls'           : calls,
+            'total_time'      : total_time,
+            'cumulative_time' : cumulative_time,
+            })
+    return rows
+
+
+# Static copy of the stats.
+Plugin_Stats = Plugin_Stats_class()
@@ -129,6 +129,11 @@ class Settings_class:
         on the next run to guide the file handling logic.
       - File is located in the output extension folder.
       - Defaults to 'customizer_log.json'
+    * plugin_stats_file_name
+      - String, name of a json file to write plugin timing and work
+        counters to, at the end of a script run.
+      - File is located in the output extension folder.
+      - Defaults to 'plugin_stats.json'
     * log_source_paths
       - Bool, if True then the path for any source files read will be
         printed in the plugin log.
@@ -171,6 +176,37 @@ class Settings_class:
         manually to continue plugin processing.
       - Primarily for development use.
       - Defaults to False
+    * batch_transform_edits
+      - Bool, if True then transforms that support it will queue their
+        xml edits instead of applying them immediately. Queued edits
+        are applied together, with one in place edit per file, before
+        the next plugin that doesn't queue edits runs (eg. when writing
+        files) or at the end of the script.
+      - Reduces cache clearing when several transforms edit the same
+        files, eg. a series of weapon or ware transforms.
+      - Defaults to False
+    * profile_plugins
+      - Bool, if True then each plugin called by a script is profiled
+        with cProfile, and its most costly functions are recorded in
+        the plugin stats json file.
+      - Slows down plugins; primarily for development use.
+      - Defaults to False
+    * drop_vanilla_xml
+      - Bool, if True then the vanilla (pre-patching) xml of each loaded
+        file is released once patching is done, and re-read from its
+        source cat or loose file when next needed (eg. by the live
+        editor or when comparing against vanilla).
+      - Reduces memory use when many files are loaded, at the cost of
+        cpu time to re-read and re-parse files whose vanilla xml is
+        requested again.
+      - Defaults to False
+    * vanilla_xml_cache_size
+      - Int, when drop_vanilla_xml is set, the number of re-read vanilla
+        xml roots to keep in memory; the least recently used are
+        released first.
+      - Larger values avoid repeated re-reads of the same files, at the
+        cost of more memory.
+      - Defaults to 20
     '''
     '''
     TODO:
@@ -320,16 +356,21 @@ class Settings_class:
         defaults['plugin_log_file_name'] = 'plugin_log.txt'
         defaults['live_editor_log_file_name'] = 'live_editor_log.json'        
         defaults['customizer_log_file_name'] = 'customizer_log.json'
+        defaults['plugin_stats_file_name'] = 'plugin_stats.json'
         defaults['disable_cleanup_and_writeback'] = False
         defaults['log_source_paths'] = False
         defaults['skip_all_plugins'] = False
         defaults['use_scipy_for_scaling_equations'] = True
         defaults['show_scaling_plots'] = False
+        defaults['batch_transform_edits'] = False
+        defaults['profile_plugins'] = False
         defaults['developer'] = False
         defaults['disable_threading'] = False        
         defaults['verbose'] = True
         defaults['allow_path_error'] = False
         defaults['output_to_catalog'] = False
+        defaults['drop_vanilla_xml'] = False
+        defaults['vanilla_xml_cache_size'] = 20
         return defaults
 
 
@@ -581,6 +622,11 @@ class Settings_class:
         'Returns the path to the customizer log file.'
         return self.Get_Output_Folder() / self.customizer_log_file_name
     
+    @_Verify_Init
+    def Get_Plugin_Stats_Path(self):
+        'Returns the path to the plugin stats file.'
+        return self.Get_Output_Folder() / self.plugin_stats_file_name
+    
     @_Verify_Init
     def Get_User_Content_XML_Path(self):
         'Returns the path to the user content.xml file.'
@@ -11,11 +11,13 @@ from .Settings import Settings
 from .Print import Print
 from .Logs import Plugin_Log
 from .Logs import Customizer_Log_class
+from .Plugin_Stats import Plugin_Stats
 
 from .Plugin_Manager import Analysis_Wrapper
 from .Plugin_Manager import Transform_Wrapper
 from .Plugin_Manager import Utility_Wrapper
 from .Plugin_Manager import Plugin_Was_Run_Before
+from .Plugin_Manager import Edit_Planner
 
 from .Home_Path import home_path
 
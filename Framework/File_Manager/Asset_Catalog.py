@@ -0,0 +1,211 @@
+'''
+Catalog of asset (macro and component) files, for finding which files
+define given asset names or classes without parsing every file.
+'''
+from io import BytesIO
+from fnmatch import fnmatch
+from lxml import etree as ET
+
+from .File_System import File_System
+from .File_Types import XML_File
+
+
+class Asset_Catalog_class:
+    '''
+    Index of the asset files listed in index/macros.xml and
+    index/components.xml. Asset names are resolved through the index
+    entries directly. Asset classes are found with a header scan of
+    the indexed files: a streaming iterparse over the source binary
+    that stops at the start of the root's first asset node, as long as
+    no extension alters the file; otherwise the file is loaded normally.
+    Classes with known home folders (see class_path_patterns) only
+    scan indexed files in those folders.
+
+    Attributes:
+    * path_header_dict
+      - Dict, keyed by virtual path, holding tuples of (root tag,
+        set of asset classes), for files scanned from source binaries.
+    * source_reader
+      - The File_System source reader the path_header_dict entries
+        were read through; when it changes (eg. on a File_System reset)
+        the entries are dropped.
+    '''
+    def __init__(self):
+        self.path_header_dict = {}
+        self.source_reader = None
+        return
+
+
+    def Reset(self):
+        '''
+        Clears all scanned files.
+        '''
+        self.path_header_dict.clear()
+        self.source_reader = None
+        return
+
+
+    def Get_Asset_Path(self, name):
+        '''
+        Returns the virtual path of the file indexed as defining the
+        asset of the given name, or None if not found.
+        Macros are checked before components.
+        '''
+        for tag in XML_File.valid_asset_tags:
+            index_xml = File_System.Load_File('index/{}.xml'.format(tag),
+                                              error_if_not_found = False)
+            if index_xml == None:
+                continue
+            path = index_xml.Find(name)
+            if path != None:
+                return path.lower().replace('\\','/')
+        return None
+
+
+    def Get_Asset_Header(self, virtual_path):
+        '''
+        Returns a tuple of (root tag, set of asset classes) for the given
+        asset file, or None if the file is not found or not an asset file.
+        The result should not be modified.
+        '''
+        virtual_path = virtual_path.lower().replace('\\','/')
+
+        # Loaded files may have been edited; use their recorded assets.
+        if File_System.File_Is_Loaded(virtual_path):
+            return _Get_File_Header(File_System.Load_File(virtual_path))
+
+        # Drop headers taken through an older source reader.
+        source_reader = File_System.Get_Source_Reader()
+        if source_reader is not self.source_reader:
+            self.path_header_dict.clear()
+            self.source_reader = source_reader
+
+        if virtual_path not in self.path_header_dict:
+            binary = source_reader.Read_Unpatched_Binary(virtual_path)
+            if binary == None:
+                # Fall back on a normal load, to include extension changes.
+                game_file = File_System.Load_File(
+                    virtual_path, error_if_not_found = False)
+                if game_file == None:
+                    return None
+                return _Get_File_Header(game_file)
+            self.path_header_dict[virtual_path] = _Scan_Asset_Header(binary)
+        return self.path_header_dict[virtual_path]
+
+
+    def Get_Paths_By_Class(self, tag, *class_names):
+        '''
+        Returns a sorted list of virtual paths of indexed asset files with
+        the given root tag holding assets of any of the given classes.
+        Only files in the folders listed in class_path_patterns for
+        these classes are scanned; if any class has no listing, all
+        indexed files are scanned.
+
+        * tag
+          - String, one of 'macros','components'.
+        * class_names
+          - Strings, asset "class" attributes to look for.
+        '''
+        class_names = set(class_names)
+        index_xml = File_System.Load_File(
+            'index/{}.xml'.format(tag),
+            error_if_not_found = False)
+        if index_xml == None:
+            return []
+
+        # Gather the folder patterns to narrow the search by.
+        # Any class without known folders requires a full search.
+        path_patterns = []
+        for class_name in class_names:
+            if class_name not in class_path_patterns:
+                path_patterns = None
+                break
+            path_patterns += class_path_patterns[class_name]
+
+        paths = []
+        for virtual_path in sorted(set(x.lower().replace('\\','/')
+                                       for x in index_xml.Findall('*'))):
+            if path_patterns != None and not any(
+                    fnmatch(virtual_path, x) for x in path_patterns):
+                continue
+            header = self.Get_Asset_Header(virtual_path)
+            if (header != None and header[0] == tag
+                and not class_names.isdisjoint(header[1])):
+                paths.append(virtual_path)
+        return paths
+
+
+# Folders holding assets of given classes, as fnmatch patterns on the
+# lowercase virtual paths from the index files. These are the folders
+# the vanilla game uses; the leading '*' also covers extension folders.
+# Assets placed elsewhere by mods are only found when already loaded,
+# same as when these folders were loaded explicitly.
+class_path_patterns = {
+    'weapon'          : ['*assets/props/weaponsystems/*'],
+    'missilelauncher' : ['*assets/props/weaponsystems/*'],
+    'turret'          : ['*assets/props/weaponsystems/*'],
+    'missileturret'   : ['*assets/props/weaponsystems/*'],
+    'bomblauncher'    : ['*assets/props/weaponsystems/*'],
+    'bullet'          : ['*assets/fx/weaponfx/*'],
+    'missile'         : ['*assets/props/weaponsystems/*', '*assets/fx/weaponfx/*'],
+    'bomb'            : ['*assets/props/weaponsystems/*', '*assets/fx/weaponfx/*'],
+    'mine'            : ['*assets/props/weaponsystems/*', '*assets/fx/weaponfx/*'],
+    'countermeasure'  : ['*assets/props/weaponsystems/*', '*assets/fx/weaponfx/*'],
+    'shieldgenerator' : ['*assets/props/surfaceelements/*'],
+    'scanner'         : ['*assets/props/surfaceelements/*'],
+    'dockingbay'      : ['*assets/props/surfaceelements/*'],
+    'engine'          : ['*assets/props/engines/*'],
+    }
+
+
+def _Get_File_Header(game_file):
+    '''
+    Returns a tuple of (root tag, set of asset classes) for a loaded
+    game file, or None if it isn't an xml asset file.
+    '''
+    if not isinstance(game_file, XML_File) or game_file.asset_class_name_dict == None:
+        return None
+    return (game_file.root_tag, set(game_file.asset_class_name_dict.keys()))
+
+
+def _Scan_Asset_Header(binary):
+    '''
+    Returns a tuple of (root tag, set of asset classes) found in the
+    xml binary of an asset file, or None if the root tag isn't a
+    supported asset type. Uses a streaming parse that stops once the
+    first asset node has started, so only the class of that asset is
+    recorded; vanilla files hold a single asset, and extension changes
+    adding more lead to a normal load instead of a scan.
+    '''
+    root = None
+    node_tag = None
+    class_names = set()
+    depth = 0
+    for event, node in ET.iterparse(BytesIO(binary), events = ('start','end')):
+        if event == 'start':
+            depth += 1
+            if depth == 1:
+                root = node
+                # Stop early on files that don't hold assets.
+                if root.tag not in XML_File.valid_asset_tags:
+                    return None
+                node_tag = XML_File.valid_asset_tags[root.tag]
+            elif depth == 2 and node.tag == node_tag:
+                # Attributes are complete at the start event.
+                if node.get('class') != None and node.get('name') != None:
+                    class_names.add(node.get('class'))
+                # Skip the rest of the file.
+                break
+        else:
+            depth -= 1
+            # Release any finished non-asset root children.
+            if depth == 1:
+                node.clear()
+                root.remove(node)
+    if root == None:
+        return None
+    return (root.tag, class_names)
+
+
+# Static copy of the catalog.
+Asset_Catalog = Asset_Catalog_class()
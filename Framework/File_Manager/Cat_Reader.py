@@ -35,6 +35,7 @@ import hashlib
 from collections import namedtuple
 
 from ..Common import Cat_Hash_Exception, Settings, Print
+from ..Common import Plugin_Stats
 
 # Use a named tuple to track cat entries.
 # Values are integers unless suffixed otherwise.
@@ -165,6 +166,7 @@ class Cat_Reader:
             file.seek(self.cat_entries[virtual_path].start_byte)
             # Grab the byte range.
             binary = file.read(self.cat_entries[virtual_path].num_bytes)
+        Plugin_Stats.Count('catalog_bytes_read', len(binary))
 
 
         # Verify the hash.
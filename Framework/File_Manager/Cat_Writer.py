@@ -8,7 +8,50 @@ import time
 import hashlib
 from pathlib import Path
 from . import File_Types
-from .Cat_Reader import Get_Hash_String
+
+
+class _Dat_Stream:
+    '''
+    Support class wrapping the open dat file, which hashes and counts
+    the bytes written for the current packed file, so that files can
+    be streamed into the dat without being held in memory.
+
+    Attributes:
+    * file
+      - The open dat file.
+    * hash
+      - hashlib md5 object for the current packed file.
+    * num_bytes
+      - Int, number of bytes written for the current packed file.
+    '''
+    def __init__(self, file):
+        self.file = file
+        self.Start_File()
+        return
+
+    def Start_File(self):
+        '''
+        Resets the hash and count for a new packed file.
+        '''
+        self.hash = hashlib.md5()
+        self.num_bytes = 0
+        return
+
+    def write(self, binary):
+        '''
+        Write the binary to the dat file, updating the hash and count.
+        '''
+        self.hash.update(binary)
+        self.num_bytes += len(binary)
+        self.file.write(binary)
+        return len(binary)
+
+    def Get_Hash_String(self):
+        '''
+        Returns the md5 hex string for the current packed file,
+        matching Cat_Reader.Get_Hash_String.
+        '''
+        return self.hash.hexdigest()
 
 
 class Cat_Writer:
@@ -47,9 +90,8 @@ class Cat_Writer:
         Any existing files will be overwritten.
         '''
         # Cat contents will be kept as a list of strings.
-        # Dat contents will be running binary.
+        # Dat contents will be streamed to the file.
         cat_lines = []
-        dat_binary = bytearray()
 
         # Get the current time since epoch, as an integer, then
         #  swap to a string (normal base 10).
@@ -58,24 +100,22 @@ class Cat_Writer:
         # Collect info from the files.
         # Note: this may generate nothing if no game files were added,
         #  eg. when making dummy catalogs.
-        for game_file in self.game_files:
-
-            # Get the binary data; any text should be utf-8.
-            this_binary = game_file.Get_Binary()
+        with open(self.dat_path, 'wb') as file:
+            dat_stream = _Dat_Stream(file)
 
-            # Append to the existing dat binary.
-            dat_binary += this_binary
+            for game_file in self.game_files:
 
-            # Get the hash.
-            hash_str = Get_Hash_String(this_binary)
+                # Stream the binary data; any text should be utf-8.
+                dat_stream.Start_File()
+                game_file.Write_Stream(dat_stream)
 
-            # Add the cat entry line.
-            cat_lines.append( ' '.join([
-                game_file.virtual_path,
-                str(len(this_binary)),
-                timestamp,
-                hash_str,
-                ]))
+                # Add the cat entry line.
+                cat_lines.append( ' '.join([
+                    game_file.virtual_path,
+                    str(dat_stream.num_bytes),
+                    timestamp,
+                    dat_stream.Get_Hash_String(),
+                    ]))
 
 
         # The cat needs to end in a newline.
@@ -87,10 +127,8 @@ class Cat_Writer:
         cat_str = '\n'.join(cat_lines)
         cat_binary = bytes(cat_str, encoding = 'utf-8')
         
-        # Write the data out.
+        # Write the cat out; the dat was written above.
         with open(self.cat_path, 'wb') as file:
             file.write(cat_binary)
-        with open(self.dat_path, 'wb') as file:
-            file.write(dat_binary)
 
         return
@@ -9,11 +9,13 @@ from fnmatch import fnmatch
 
 from .Source_Reader import Source_Reader_class
 from .Cat_Writer import Cat_Writer
-from .File_Types import Misc_File, XML_File
+from .File_Types import Misc_File, XML_File, Vanilla_Root_Cache
 from ..Common import Settings
 from ..Common import File_Missing_Exception
 from ..Common import Customizer_Log_class
 from ..Common import Change_Log, Print
+from ..Common import Edit_Planner
+from ..Common import Plugin_Stats
 from ..Common import home_path
 
 
@@ -34,7 +36,8 @@ class File_System_class:
     * source_reader
       - Source_Reader object.
     * asset_class_dict
-      - Dict of dicts of lists holding XML_File objects, organized according
+      - Dict of dicts of dicts holding XML_File objects as keys (with
+        None values, used as ordered sets), organized according
         to asset properties.
       - Outer key is the root node tag for supported tags,
         currently one of ['macros','components'].
@@ -42,27 +45,38 @@ class File_System_class:
         eg. macros/macro/@class or components/component/@class.
       - Example: asset_class_dict['macros']['bullet'] to get all
         loaded bullet macro files.
-      - Filled in as files are loaded or created; use Load_Pattern to fill
-        in files on paths that hold the classes of  interest.
+      - Filled in as files are loaded or created; Get_Asset_Files_By_Class
+        will load indexed files holding the classes of interest.
     * asset_name_dict
       - Dict of XML_File objects keyed by their "name" attribute.
       - Similar to asset_class_dict, except set up to satisfy the
         way x4 files can reference each other by "name" attribute
         without clarifying tag or "class".
+    * file_asset_keys_dict
+      - Dict, keyed by virtual path, holding lists of (class, name)
+        tuples recorded in the above dicts for the file.
+      - Reverse index, so that a file's assets can be dropped without
+        searching the other dicts.
     * _patterns_loaded
       - Set of strings, virtual path name patterns that have been
         loaded and, when macros, added to class_macro_dict.
+    * reset_modified_paths
+      - Set of virtual paths of modified files that were dropped by
+        a Reset or Reset_File, kept until collected by
+        Get_Changed_Virtual_Paths.
     '''
     def __init__(self):
         self.game_file_dict = {}
         self.old_log = Customizer_Log_class()
         self.init_complete = False
         self.source_reader = Source_Reader_class()
-        # Set this up as a defaultdict of defaultdicts of lists,
+        # Set this up as a defaultdict of defaultdicts of dicts,
         # for easy initialization on new tags or classes.
-        self.asset_class_dict = defaultdict(lambda: defaultdict(list))
+        self.asset_class_dict = defaultdict(lambda: defaultdict(dict))
         self.asset_name_dict = {}
+        self.file_asset_keys_dict = {}
         self._patterns_loaded = set()
+        self.reset_modified_paths = set()
 
         return
     
@@ -113,10 +127,23 @@ class File_System_class:
         returning to non-initialized state, etc.
         This will also reset the Live_Editor, since it is out of date.
         '''
+        # Note which files had changes that are being dropped.
+        self.reset_modified_paths.update(
+            path for path, game_file in self.game_file_dict.items()
+            if game_file.modified)
+        # Stop dropped files from reporting asset changes.
+        for game_file in self.game_file_dict.values():
+            if isinstance(game_file, XML_File):
+                game_file.asset_update_callback = None
         self.game_file_dict.clear()
         self.asset_class_dict.clear()
         self.asset_name_dict.clear()
+        self.file_asset_keys_dict.clear()
         self._patterns_loaded.clear()
+        # Drop any transform edits queued against the old files.
+        Edit_Planner.Reset()
+        # Drop any re-read vanilla xml, which may be from old sources.
+        Vanilla_Root_Cache.Reset()
         # Pending a reset option for these, just recreate the objects.
         self.old_log = Customizer_Log_class()
         self.source_reader = Source_Reader_class()
@@ -147,19 +174,70 @@ class File_System_class:
         '''
         Record a new a Game_File object, keyed by its virtual path.
         '''
+        # If replacing a prior file on this path, drop its assets.
+        prior_file = self.game_file_dict.get(game_file.virtual_path)
+        if prior_file != None and prior_file is not game_file:
+            self._Remove_File_Assets(prior_file)
         self.game_file_dict[game_file.virtual_path] = game_file
         
         # Check if the game_file is an xml file with a supported
         # asset tag, and updates the asset_class_dict if so.
-        if isinstance(game_file, XML_File) and game_file.asset_class_name_dict != None:
-            tag        = game_file.root_tag
-            # There could be multiple assets of different classes, so
-            # loop over them.
-            for class_name, name_list in game_file.asset_class_name_dict.items():
-                for name in name_list:
-                    # Record the file two ways.
-                    self.asset_class_dict[tag][class_name].append(game_file)
-                    self.asset_name_dict[name] = game_file
+        if isinstance(game_file, XML_File):
+            self._Add_File_Assets(game_file)
+            # Track later changes to its assets from transforms.
+            game_file.asset_update_callback = self._Update_File_Assets
+        return
+
+
+    def _Add_File_Assets(self, game_file):
+        '''
+        Records the assets of an XML_File in the asset dicts and the
+        reverse index, if it has any.
+        '''
+        if game_file.asset_class_name_dict == None:
+            return
+        tag = game_file.root_tag
+        asset_keys = []
+        # There could be multiple assets of different classes, so
+        # loop over them.
+        for class_name, name_list in game_file.asset_class_name_dict.items():
+            for name in name_list:
+                # Record the file two ways.
+                self.asset_class_dict[tag][class_name][game_file] = None
+                self.asset_name_dict[name] = game_file
+                asset_keys.append((class_name, name))
+        self.file_asset_keys_dict[game_file.virtual_path] = asset_keys
+        return
+
+
+    def _Remove_File_Assets(self, game_file):
+        '''
+        Removes the assets of an XML_File from the asset dicts, using
+        the reverse index.
+        '''
+        asset_keys = self.file_asset_keys_dict.pop(game_file.virtual_path, None)
+        if not asset_keys:
+            return
+        class_dict = self.asset_class_dict[game_file.root_tag]
+        for class_name, name in asset_keys:
+            class_dict[class_name].pop(game_file, None)
+            # Leave the name alone if another file has since claimed it.
+            if self.asset_name_dict.get(name) is game_file:
+                self.asset_name_dict.pop(name)
+        return
+
+
+    def _Update_File_Assets(self, game_file):
+        '''
+        Callback from a registered XML_File whose assets changed,
+        eg. when a transform added or renamed a macro. Re-records
+        the file's assets.
+        '''
+        # Ignore files that were since dropped or replaced.
+        if self.game_file_dict.get(game_file.virtual_path) is not game_file:
+            return
+        self._Remove_File_Assets(game_file)
+        self._Add_File_Assets(game_file)
         return
 
 
@@ -173,50 +251,65 @@ class File_System_class:
         if virtual_path not in self.game_file_dict:
             return
 
-        # Look up the game file.
-        game_file = self.Load_File(virtual_path)
         # Remove from the main file dict.
-        self.game_file_dict.pop(virtual_path)
-
-        # Also remove from anywhere else that might use it.
-        # These will use a game_file object search.
-        for key, subdict in self.asset_class_dict.items():
-            for key2, sublist in subdict.items():
-                if game_file in sublist:
-                    sublist.remove(game_file)
-
-        for key, value in self.asset_name_dict.items():
-            if value is game_file:
-                # This should be okay to modify the dict if not continuing
-                # the loop further.
-                self.asset_name_dict.pop(key)
-                break
+        game_file = self.game_file_dict.pop(virtual_path)
+        if game_file.modified:
+            self.reset_modified_paths.add(virtual_path)
+
+        # Also remove from the asset dicts.
+        if isinstance(game_file, XML_File):
+            game_file.asset_update_callback = None
+            self._Remove_File_Assets(game_file)
         return
 
 
+    @_Verify_Init
     def Get_Asset_File(self, name):
         '''
-        Returns a loaded asset XML_File object with the corresponding
+        Returns an asset XML_File object with the corresponding
         "name" (as found in the xml).  Error if not found.
         The returned file may contain other assets.
+        If not loaded yet, the file is found through the macro and
+        component index files and loaded.
         
         Example: Get_Asset_File('weapon_tel_l_beam_01_mk1')
         '''
+        if name not in self.asset_name_dict:
+            # Delayed import, due to the catalog importing this module.
+            from .Asset_Catalog import Asset_Catalog
+            virtual_path = Asset_Catalog.Get_Asset_Path(name)
+            if virtual_path != None:
+                self.Load_File(virtual_path, error_if_not_found = False)
         return self.asset_name_dict[name]
 
 
+    @_Verify_Init
     def Get_Asset_Files_By_Class(self, tag, *class_names):
         '''
-        Returns the list of loaded asset XML_Files matching the
+        Returns the list of asset XML_Files matching the
         given tag and class_names. Accepts multiple class names.
-        Returns an empty list if no matching files are loaded yet.
+        Indexed files holding assets of these classes are loaded as
+        needed, found using a light header scan of unloaded files in
+        the folders known to hold these classes (see
+        Asset_Catalog.class_path_patterns); already loaded files
+        are always included.
+
+        Note: this previously returned only already loaded files,
+        leaving callers to Load_Files the relevant folders first;
+        loading here lets those calls be dropped, so only files
+        with matching assets get parsed.
 
         Example: Get_Asset_Files('macros','bullet','missile')
         '''
+        # Delayed import, due to the catalog importing this module.
+        from .Asset_Catalog import Asset_Catalog
+        for virtual_path in Asset_Catalog.Get_Paths_By_Class(tag, *class_names):
+            self.Load_File(virtual_path, error_if_not_found = False)
+
         ret_list = []
         # Collect lists together.
         for name in class_names:
-            ret_list += self.asset_class_dict[tag][name]
+            ret_list += self.asset_class_dict[tag][name].keys()
         return ret_list
     
     
@@ -280,6 +373,22 @@ class File_System_class:
         return False
 
 
+    def Get_Changed_Virtual_Paths(self):
+        '''
+        Returns a set of virtual paths of files whose current xml may
+        differ from when this was last called: those modified now,
+        and those modified before being dropped by a reset.
+        Meant for refreshing values read from current files, eg. in the
+        Live_Editor after a script run.
+        '''
+        changed_paths = self.reset_modified_paths
+        self.reset_modified_paths = set()
+        changed_paths.update(
+            path for path, game_file in self.game_file_dict.items()
+            if game_file.modified)
+        return changed_paths
+
+
     def Get_Loaded_Files(self, pattern = None):
         '''
         Returns a list of Game_File objects that are currently loaded.
@@ -347,6 +456,7 @@ class File_System_class:
             if not test_load:
                 assert game_file.virtual_path == virtual_path
                 self.Add_File(game_file)
+                Plugin_Stats.Count('files_loaded')
             else:
                 return None
 
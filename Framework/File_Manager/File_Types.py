@@ -7,13 +7,18 @@ import os
 from lxml import etree as ET
 from copy import deepcopy
 from collections import OrderedDict, defaultdict
+from functools import lru_cache
 import re
 from fnmatch import fnmatch
+from io import BytesIO
 
 from ..Common import Plugin_Log
 from ..Common import Settings
+from ..Common import Plugin_Stats
 #Settings = Common.Settings
 from . import XML_Diff
+from .Cat_Reader import Cat_Reader
+from .XML_Edit import XML_Edit
 
 
 def New_Game_File(binary, **kwargs):
@@ -53,6 +58,55 @@ def New_Game_File(binary, **kwargs):
 
 
 
+# Registry of indexes for children of the xml root, as tuples of
+#  (virtual path pattern, child tag, key attribute).
+# Matching files will index their root children of the tag by the
+#  attribute, to accelerate Get_Xpath_Nodes lookups of the form
+#  './tag[@attribute="value"]', optionally followed by a further path.
+# Plugins may add to this with Register_Child_Index.
+child_index_registry = [
+    ('libraries/wares.xml'             , 'ware'   , 'id'),
+    ('libraries/jobs.xml'              , 'job'    , 'id'),
+    ('libraries/ships.xml'             , 'ship'   , 'id'),
+    ('libraries/loadouts.xml'          , 'loadout', 'id'),
+    ('libraries/defaults.xml'          , 'dataset', 'class'),
+    ('libraries/region_definitions.xml', 'region' , 'name'),
+    ('index/*.xml'                     , 'entry'  , 'name'),
+    ('libraries/mousecursors.xml'      , 'entry'  , 'name'),
+    ('t/*.xml'                         , 'page'   , 'id'),
+    ]
+
+def Register_Child_Index(pattern, tag, attribute):
+    '''
+    Add an entry to the child_index_registry, for files loaded later.
+
+    * pattern
+      - String, virtual path pattern with wildcard support.
+    * tag
+      - String, tag of the root children to index.
+    * attribute
+      - String, name of the attribute to index the children by.
+    '''
+    child_index_registry.append((pattern, tag, attribute))
+    _Get_Child_Index_Specs.cache_clear()
+    return
+
+@lru_cache(maxsize = None)
+def _Get_Child_Index_Specs(virtual_path):
+    '''
+    Returns a tuple of (tag, attribute) pairs registered for the
+    given virtual path.
+    '''
+    return tuple((tag, attribute) 
+                 for pattern, tag, attribute in child_index_registry
+                 if fnmatch(virtual_path, pattern))
+
+# Pattern for xpaths that start with an indexable step, eg.
+#  './ware[@id="energycells"]/production', capturing the tag, attribute,
+#  value, and remainder.
+_indexed_xpath_re = re.compile(r'\./([\w\-]+)\[@([\w\-]+)="([^"]*)"\](.*)$', re.S)
+
+
 class Game_File:
     '''
     Base class to represent a source file.
@@ -226,6 +280,94 @@ class Game_File:
         return
 
 
+    def Write_Stream(self, stream):
+        '''
+        Writes the file contents (as from Get_Binary) to a binary stream,
+        eg. an open file. Subclasses may replace this to avoid building
+        the full binary in memory.
+        '''
+        stream.write(self.Get_Binary())
+        return
+
+
+class Vanilla_Root_Cache_class:
+    '''
+    Size limited memo of vanilla xml roots, re-read from their source
+    cat or loose files for XML_Files that released their original_root
+    after patching (when Settings.drop_vanilla_xml is set).
+    The least recently used roots are released first.
+
+    Catalogs are read through the Cat_Readers already held by the
+    File_System source reader, so they are not parsed again.
+
+    Attributes:
+    * root_dict
+      - OrderedDict, keyed by (file_source_path, source virtual_path),
+        holding parsed root Elements, oldest use first.
+    '''
+    def __init__(self):
+        self.root_dict = OrderedDict()
+        return
+
+
+    def Reset(self):
+        '''
+        Clears all cached roots.
+        '''
+        self.root_dict.clear()
+        return
+
+
+    def Get_Root(self, original_source):
+        '''
+        Returns the vanilla root Element for the given original_source,
+        reading and parsing it if not already cached.
+        The returned root should not be modified.
+
+        * original_source
+          - Tuple of (file_source_path, virtual_path), where the
+            virtual_path is relative to the source location.
+        '''
+        # Move cache hits to the end, as the most recently used.
+        if original_source in self.root_dict:
+            self.root_dict.move_to_end(original_source)
+            return self.root_dict[original_source]
+
+        source_path, virtual_path = original_source
+        if source_path.suffix == '.cat':
+            # Reuse the source reader's catalog readers; these parse the
+            # full cat on init.
+            # Delayed import, due to the File_System importing this module.
+            from .File_System import File_System
+            cat_reader = File_System.Get_Source_Reader().Get_Catalog_Reader(source_path)
+            # Cats outside the source locations get a one-off reader.
+            if cat_reader == None:
+                cat_reader = Cat_Reader(source_path)
+            # Any md5 problem was already handled on the initial read.
+            binary = cat_reader.Read(
+                virtual_path, 
+                error_if_not_found = True, 
+                allow_md5_error = True)
+        else:
+            with open(source_path, 'rb') as file:
+                binary = file.read()
+
+        # Parse the same way as XML_File.__init__.
+        root = ET.XML(binary, parser = ET.XMLParser(remove_blank_text=True))
+        Plugin_Stats.Count('xml_parsed')
+        self.root_dict[original_source] = root
+
+        # Release the oldest roots past the limit, keeping at least
+        # the one just read.
+        limit = max(1, int(Settings.vanilla_xml_cache_size))
+        while len(self.root_dict) > limit:
+            self.root_dict.popitem(last = False)
+        return root
+
+# Static copy shared by all xml files.
+Vanilla_Root_Cache = Vanilla_Root_Cache_class()
+
+
 # Note: encoding assumed to be utf-8 in general.
 # A grep of the x4 dat files didn't find any non-utf8 xml encodings.
 # Mods may be non-utf8; keep the logic for handling encoding here just
@@ -247,6 +389,14 @@ class XML_File(Game_File):
     Attributes:
     * original_root
       - Element holding the original parsed xml, pre-patches, pre-transforms.
+      - None after Delayed_Init if Settings.drop_vanilla_xml is set and
+        the file has an original_source; use Get_Root_Readonly('vanilla')
+        to access it in that case.
+    * original_source
+      - Tuple of (file_source_path, virtual_path relative to the source
+        location) that the original_root was parsed from, used to re-read
+        it on demand.
+      - None for generated files initialized from an xml_root.
     * patched_root
       - Element holding the diff patched root, pre-transforms.
     * modified_root
@@ -255,6 +405,32 @@ class XML_File(Game_File):
     * root_tag
       - Tag name of the root node, for convenient referencing.
       - This is never expected to change across diff patches or transforms.
+    * open_edit
+      - XML_Edit currently open on the modified_root, or None.
+    * dirty_node_ids
+      - Set of node_id strings for nodes in modified_root changed from
+        the patched_root, along with their ancestors, used to limit
+        diff generation to the changed subtrees.
+      - Filled by committed XML_Edits.
+      - None if changes are untracked (eg. after an Update_Root), in
+        which case the full tree is diffed.
+    * dirty_parent_ids
+      - Set of node_id strings for nodes in modified_root whose direct
+        children were changed from the patched_root, filled by committed
+        XML_Edits alongside dirty_node_ids.
+      - None when dirty_node_ids is None.
+    * patched_matches_vanilla
+      - Bool, True if the patched_root is known to match the original
+        root, eg. when no diff patches or substitutions were applied.
+    * child_index_specs
+      - Tuple of (tag, attribute) pairs from the child_index_registry
+        that apply to this file.
+    * version_child_indexes
+      - Dict, keyed by version, holding tuples of (root, dict keyed by
+        (tag, attribute) then attribute value, holding lists of
+        matching root children), filled in on demand.
+      - Indexes are rebuilt if the version's root object changes, and
+        the 'current' index is dropped whenever the current xml changes.
     * asset_class_name_dict
       - Dict, keyed by asset class as defined in the xml, holding a list of
         names of the asset nodes of the class type.
@@ -263,6 +439,18 @@ class XML_File(Game_File):
       - Often or always holds a single name that matches the last component
         of the virtual_path, without suffix.
       - TODO: maybe move this to an xml file subclass.
+      - Kept up to date with the current xml when its top level nodes
+        change, through Update_Root or a committed edit.
+    * asset_update_callback
+      - Optional function, called with this file whenever the
+        asset_class_name_dict is changed after Delayed_Init.
+      - Set by the File_System while the file is registered, to keep
+        its asset indexes current.
+    * current_change_count
+      - Int, incremented whenever the current xml changes, through
+        Update_Root or a closed edit that clears caches.
+      - Lets lookups cached outside of this file (eg. by plugins)
+        tell if they were taken from an older version of the xml.
     '''
     # For assets, the names of the asset group, and asset node tag.
     # Tag is generally or always the singular of a plural asset group.
@@ -277,6 +465,8 @@ class XML_File(Game_File):
             **kwargs):
         super().__init__(**kwargs)
         self.asset_class_name_dict = None
+        self.asset_update_callback = None
+        self.original_source = None
 
         # Should receive either the binary or the xml itself.
         assert binary != None or xml_root != None
@@ -289,6 +479,13 @@ class XML_File(Game_File):
             self.original_root = ET.XML(
             binary,
             parser = ET.XMLParser(remove_blank_text=True))
+            Plugin_Stats.Count('xml_parsed')
+
+            # Record where this came from, in case it needs a re-read.
+            # Note: the virtual_path here is still relative to the source
+            # location, prior to any extension path prefixing.
+            if self.file_source_path != None:
+                self.original_source = (self.file_source_path, self.virtual_path)
 
         elif xml_root != None:
             assert isinstance(xml_root, ET._Element)
@@ -298,6 +495,13 @@ class XML_File(Game_File):
         # Deepcopy this, since patching will edit it in place.
         self.patched_root = deepcopy(self.original_root)
         self.modified_root = None
+        self.open_edit = None
+        self.dirty_node_ids = set()
+        self.dirty_parent_ids = set()
+        self.current_change_count = 0
+        self.patched_matches_vanilla = True
+        self.child_index_specs = _Get_Child_Index_Specs(self.virtual_path)
+        self.version_child_indexes = {}
 
         # The root tag should never be changed by mods, so can
         #  record it here pre-patching.
@@ -313,34 +517,63 @@ class XML_File(Game_File):
         '''
         # Annotate the patched_root with node ids.
         XML_Diff.Fill_Node_IDs(self.patched_root)
+        # Drop any indexes taken during patching.
+        self.version_child_indexes.clear()
+
+        # Optionally release the vanilla xml; it will get re-read from
+        # the source on demand.
+        if Settings.drop_vanilla_xml and self.original_source != None:
+            self.original_root = None
         
+        # Record the asset nodes; this is the only time errors in them
+        # are logged, since later changes come from transforms.
+        self.asset_class_name_dict = self._Scan_Asset_Nodes(
+            self.patched_root, log_errors = True)
+        return
+
+
+    def _Scan_Asset_Nodes(self, root, log_errors = False):
+        '''
+        Returns a dict, as used for asset_class_name_dict, of the
+        asset nodes that are direct children of the given root, or None
+        if the root tag isn't a supported asset type or it holds no assets.
+
+        * log_errors
+          - Bool, if True then problems are reported to the plugin log,
+            and nodes missing a class or name will raise an assertion.
+          - When False, such nodes are quietly skipped.
+        '''
         # Skip if the tag doesn't match supported asset types.
         # Note: diff patches will have a 'diff' root, and don't
         # get matched here.
-        if self.patched_root.tag not in self.valid_asset_tags:
-            return
+        if root.tag not in self.valid_asset_tags:
+            return None
 
         # Get the subnode tag to look for.
-        node_tag = self.valid_asset_tags[self.patched_root.tag]
+        node_tag = self.valid_asset_tags[root.tag]
 
         # Look through the root children for class attributes.
         # Normally there is just one for vanilla files, but there could
         # be multiple for mods.
         # If something is amiss, this might return none.
-        asset_nodes = self.patched_root.findall('./'+node_tag)
+        asset_nodes = root.findall('./'+node_tag)
         if not asset_nodes:
-            Plugin_Log.Print(('Error: asset file contains no assets;'
-                'in file {}; sources: {}.').format(
-                    self.virtual_path, self.source_extension_names))
-            return
+            if log_errors:
+                Plugin_Log.Print(('Error: asset file contains no assets;'
+                    'in file {}; sources: {}.').format(
+                        self.virtual_path, self.source_extension_names))
+            return None
 
         # Start a fresh dict to record these.
-        self.asset_class_name_dict = defaultdict(list)
+        asset_class_name_dict = defaultdict(list)
         for node in asset_nodes:
             asset_class_name = node.get('class')
             asset_name       = node.get('name')
-            assert asset_class_name != None
-            assert asset_name != None
+            if log_errors:
+                assert asset_class_name != None
+                assert asset_name != None
+            elif asset_class_name == None or asset_name == None:
+                continue
 
             # It is possible that the same asset name was defined
             #  multiple times, most likely due to a file format
@@ -349,16 +582,36 @@ class XML_File(Game_File):
             # Catch that here with a warning, and continue in the
             #  x4 style of using the first match.
             # Generated xpaths below will need to account for this.
-            if asset_class_name in self.asset_class_name_dict:
+            if asset_class_name in asset_class_name_dict:
                 # Give the extensions sourced from in the log, to help
                 # the extension checker know which ext to assign the
                 # error to.
-                Plugin_Log.Print(('Error: multiple assets found with name'
-                       ' {} in file {}; sources: {}; only the first will be used.'
-                       ).format(asset_name, self.virtual_path,
-                                self.source_extension_names))
+                if log_errors:
+                    Plugin_Log.Print(('Error: multiple assets found with name'
+                           ' {} in file {}; sources: {}; only the first will be used.'
+                           ).format(asset_name, self.virtual_path,
+                                    self.source_extension_names))
             else:
-                self.asset_class_name_dict[asset_class_name].append(asset_name)
+                asset_class_name_dict[asset_class_name].append(asset_name)
+        return asset_class_name_dict
+
+
+    def _Refresh_Asset_Nodes(self):
+        '''
+        Rescans the asset nodes of the current xml, following a change
+        to its top level nodes. If the assets changed, the
+        asset_class_name_dict is replaced and the asset_update_callback,
+        if any, is called with this file.
+        '''
+        # Files that never held assets (by root tag) are skipped.
+        if self.root_tag not in self.valid_asset_tags:
+            return
+        asset_class_name_dict = self._Scan_Asset_Nodes(self.Get_Root_Readonly())
+        if asset_class_name_dict == self.asset_class_name_dict:
+            return
+        self.asset_class_name_dict = asset_class_name_dict
+        if self.asset_update_callback != None:
+            self.asset_update_callback(self)
         return
 
 
@@ -418,6 +671,8 @@ class XML_File(Game_File):
                 return self.modified_root
             return self.patched_root
         elif version == 'vanilla':
+            if self.original_root == None:
+                return Vanilla_Root_Cache.Get_Root(self.original_source)
             return self.original_root
         elif version == 'patched':
             return self.patched_root
@@ -443,6 +698,9 @@ class XML_File(Game_File):
             or self.modified_root == None):
             raise AssertionError('Attempted to Update_Root with a read-only'
                                  ' existing root.')
+        # Replacing the root would discard an open edit's changes.
+        if self.open_edit != None:
+            raise AssertionError('Attempted to Update_Root during an open edit.')
         # Ensure tags match up.
         # TODO: consider ensuring the node ids match up; though that
         # wouldn't support complete xml replacements, it can catch
@@ -452,9 +710,149 @@ class XML_File(Game_File):
         # Assume the xml changed from the patched version.
         self.modified = True
         self.modified_root = element_root
+        # Changed nodes are unknown; diffs will check the whole tree.
+        self.dirty_node_ids = None
+        self.dirty_parent_ids = None
+        self.version_child_indexes.pop('current', None)
+        self.current_change_count += 1
+        self.Clear_Caches()
+        # Any top level asset node may have changed.
+        self._Refresh_Asset_Nodes()
+        return
+
+
+    def Clear_Caches(self, dirty_node_ids = None, dirty_parent_ids = None):
+        '''
+        Placeholder for subclasses to clear any lookups cached from
+        the current xml, called whenever the modified_root changes.
+
+        * dirty_node_ids, dirty_parent_ids
+          - Optional sets of node_ids, as in XML_Edit, when the change
+            was an edit with known changed nodes.
+          - When None, any part of the xml may have changed.
+        '''
+        return
+
+
+    def Begin_Edit(self):
+        '''
+        Returns a new XML_Edit for editing the current xml in place,
+        without copying it. The edit should be closed with a Commit
+        or Rollback before other edits are started, typically by using
+        it as a context manager.
+        '''
+        if self.open_edit != None:
+            raise AssertionError('Attempted to Begin_Edit on {} with an edit'
+                                 ' already open.'.format(self.virtual_path))
+        if self.modified_root == None:
+            # Same initial copy as Get_Root; keeps node_ids intact.
+            self.modified_root = deepcopy(self.patched_root)
+        self.open_edit = XML_Edit(self, self.modified_root)
+        return self.open_edit
+
+
+    def _Close_Edit(self, xml_edit, changed, clear_caches = None,
+                    dirty_node_ids = None, dirty_parent_ids = None):
+        '''
+        Called by an XML_Edit when committed or rolled back.
+
+        * changed
+          - Bool, if True the file is flagged as modified.
+        * clear_caches
+          - Bool, if True then Clear_Caches is called.
+          - Defaults to matching changed.
+        * dirty_node_ids
+          - Optional set of node_ids changed by the edit.
+        * dirty_parent_ids
+          - Optional set of node_ids with children changed by the edit.
+        '''
+        assert xml_edit is self.open_edit
+        self.open_edit = None
+        if changed:
+            self.modified = True
+            # Accumulate changed nodes, unless already untracked.
+            if self.dirty_node_ids != None and dirty_node_ids:
+                self.dirty_node_ids.update(dirty_node_ids)
+            if self.dirty_parent_ids != None and dirty_parent_ids:
+                self.dirty_parent_ids.update(dirty_parent_ids)
+        if clear_caches == None:
+            clear_caches = changed
+        if clear_caches:
+            self.version_child_indexes.pop('current', None)
+            self.current_change_count += 1
+            # Pass along the changed nodes, when known.
+            if changed and dirty_node_ids != None and dirty_parent_ids != None:
+                self.Clear_Caches(dirty_node_ids = dirty_node_ids,
+                                  dirty_parent_ids = dirty_parent_ids)
+            else:
+                self.Clear_Caches()
+
+        # Rescan assets if the root's children were added, removed, or
+        # edited directly; changes deeper in the tree can't affect them.
+        if changed and (dirty_parent_ids == None
+                        or xml_edit.top_level_tracked
+                        or XML_Diff.Get_Node_ID(self.modified_root) in dirty_parent_ids):
+            self._Refresh_Asset_Nodes()
         return
 
 
+    def Current_Matches_Patched(self, patched_node = None):
+        '''
+        Returns True if the current xml is known to match the patched
+        xml, else False.
+
+        * patched_node
+          - Optional node from the patched_root.
+          - When given, returns True if this node and its subtree are
+            unchanged in the current xml, and no siblings of it or
+            of its ancestors changed, such that an xpath from the root
+            resolving to this node in the patched xml will resolve to
+            a matching node in the current xml.
+          - Assumes xpath predicates only test the attributes or
+            positions of the nodes they select, and that attribute
+            edits to siblings don't make them match in its place.
+            (Only added or removed children mark a parent as dirty.)
+        '''
+        # Without a modified_root, current is the patched_root.
+        if self.modified_root == None:
+            return True
+        # If changes weren't tracked, nothing is known.
+        if self.dirty_node_ids == None:
+            return False
+        # No changes made.
+        if not self.dirty_node_ids:
+            return True
+        if patched_node == None:
+            return False
+
+        # The node and its subtree should be unchanged.
+        node_id = XML_Diff.Get_Node_ID(patched_node)
+        if not node_id or node_id in self.dirty_node_ids:
+            return False
+        # No ancestor should have had its children changed.
+        for ancestor in patched_node.iterancestors():
+            if XML_Diff.Get_Node_ID(ancestor) in self.dirty_parent_ids:
+                return False
+        return True
+
+
+    def Get_Version_Roots(self):
+        '''
+        Returns a dict of read-only roots keyed by version, for
+        'vanilla', 'patched', and 'current'. Versions known to match
+        the patched xml will use the patched_root, so that users may
+        skip repeated lookups on the same root object.
+        '''
+        patched_root = self.patched_root
+        return {
+            'vanilla' : (patched_root if self.patched_matches_vanilla
+                         else self.Get_Root_Readonly('vanilla')),
+            'patched' : patched_root,
+            'current' : (patched_root if self.Current_Matches_Patched()
+                         else self.Get_Root_Readonly('current')),
+            }
+
+
     def Get_Xpath_Nodes(self, xpath, version = 'current'):
         '''
         Returns a list of read-only nodes found using the given xpath on
@@ -463,12 +861,84 @@ class XML_File(Game_File):
         Subclasses may offer special handling of this to speed up
         xpath searches on large xml files with regular structure
         for doing value lookups.
+
+        If the xpath starts with a './tag[@attribute="value"]' step
+        matching a registered child index (see child_index_registry),
+        its lookup will be accelerated.
         '''
+        Plugin_Stats.Count('xpath_evals')
+        if self.child_index_specs:
+            nodes = self._Get_Indexed_Xpath_Nodes(xpath, version)
+            if nodes != None:
+                return nodes
         root = self.Get_Root_Readonly(version)
         nodes = root.xpath(xpath)
         return nodes
 
 
+    def Get_Child_Index(self, tag, attribute, version = 'current'):
+        '''
+        Returns a dict, keyed by attribute value, holding lists of the
+        root children with the given tag, in document order.
+        The tag and attribute should be a registered child index for
+        this file. The dict should not be modified.
+        '''
+        assert (tag, attribute) in self.child_index_specs
+        root = self.Get_Root_Readonly(version)
+        cached = self.version_child_indexes.get(version)
+        if cached == None or cached[0] is not root:
+            # Share with another version using the same root,
+            # eg. current before any modification.
+            for other_root, other_indexes in self.version_child_indexes.values():
+                if other_root is root:
+                    cached = (root, other_indexes)
+                    break
+            else:
+                cached = (root, {})
+            self.version_child_indexes[version] = cached
+
+        indexes = cached[1]
+        index = indexes.get((tag, attribute))
+        if index == None:
+            index = defaultdict(list)
+            for node in root.iterchildren(tag):
+                index[node.get(attribute)].append(node)
+            # Switch to a normal dict, so that lookups don't add keys.
+            index = dict(index)
+            indexes[(tag, attribute)] = index
+        return index
+
+
+    def _Get_Indexed_Xpath_Nodes(self, xpath, version):
+        '''
+        Returns a list of nodes found for the xpath using a child index,
+        or None if the xpath is not supported by any index.
+        '''
+        match = _indexed_xpath_re.match(xpath)
+        if match == None:
+            return None
+        tag, attribute, value, remainder = match.groups()
+        if (tag, attribute) not in self.child_index_specs:
+            return None
+        # The remainder should be a further path; other qualifiers
+        # (eg. an index or a union) need a normal xpath.
+        if remainder and (remainder[0] != '/' or '|' in remainder):
+            return None
+
+        nodes = self.Get_Child_Index(tag, attribute, version).get(value, [])
+        # If there is a remainder, reform it into a further
+        #  xpath starting from the node.
+        if remainder:
+            # With repeated keys, results from each node could overlap
+            # (eg. a '/..' remainder); leave those to a normal xpath.
+            if len(nodes) > 1:
+                return None
+            if not nodes:
+                return []
+            return nodes[0].xpath('.' + remainder)
+        return list(nodes)
+
+
     # Note: xml only needs diffing if it originates from somewhere else,
     #  and isn't new.
     # TODO: set up a flag for new, non-diff xml files. For now, all need
@@ -482,39 +952,47 @@ class XML_File(Game_File):
             original_node = self.patched_root, 
             modified_node = self.Get_Root_Readonly(),
             maximal = Settings.make_maximal_diffs,
-            verify = True)
+            verify = True,
+            # Limit the search to changed nodes, if known.
+            dirty_node_ids = self.dirty_node_ids)
         return patch_node
 
 
-    def Get_Binary(self):
+    def Write_Stream(self, stream):
         '''
-        Returns a bytearray with the full modified_root.
+        Writes the full modified_root (or its diff patch) to a binary
+        stream, pretty printed with an xml header, without building
+        the output in memory.
         '''
-        # Pack into an ElementTree, to get full header.
         # Modified source files will form a diff patch, others
         # just record full xml.
         if self.from_source:
-            tree = ET.ElementTree(self.Get_Diff())
+            root = self.Get_Diff()
         else:
-            tree = ET.ElementTree(self.Get_Root_Readonly())
+            root = self.Get_Root_Readonly()
 
-        # Pretty print it. This returns bytes.
-        binary = XML_Diff.Print(tree, encoding = 'utf-8', xml_declaration = True)
-        # To be safe, add a newline at the end if not there, since
+        # This skips node ids, and always ends in a newline, since
         # some file readers need it.
-        newline_char = '\n'.encode(encoding = 'utf-8')
-        if not binary.endswith(newline_char):
-            binary += newline_char
-        return binary
+        XML_Diff.Write(root, stream, encoding = 'utf-8', xml_declaration = True)
+        return
+
+
+    def Get_Binary(self):
+        '''
+        Returns a bytes object with the full modified_root.
+        '''
+        stream = BytesIO()
+        self.Write_Stream(stream)
+        return stream.getvalue()
 
 
     def Write_File(self, file_path):
         '''
         Write these contents to the target file_path.
         '''
-        # Do a binary write.
+        # Do a binary write, streaming to the file.
         with open(file_path, 'wb') as file:
-            file.write(self.Get_Binary())                      
+            self.Write_Stream(file)
         return
 
     
@@ -535,6 +1013,8 @@ class XML_File(Game_File):
             
         # Preserve this root as the original.
         other_file.original_root = self.original_root
+        other_file.original_source = self.original_source
+        other_file.patched_matches_vanilla = False
         
         # Based on x4 log errors, it seems that it will handle
         #  diff xmls (when fed as an original file or substitution)
@@ -574,6 +1054,10 @@ class XML_File(Game_File):
                 other_xml_file.extension_name )
             )
 
+        # The patched xml may now differ from vanilla.
+        self.patched_matches_vanilla = False
+        Plugin_Stats.Count('xml_patched')
+
         # Record the extension holding the patch, as a source for this file.
         self.source_extension_names.extend(other_xml_file.source_extension_names)
         
@@ -593,17 +1077,12 @@ class XML_Text_File(XML_File):
     This provides functionality for looking up text references.
 
     Attributes:
-    * page_text_dict
-      - Dict, keyed by 'page[id]' then 't[id]', holding the current
-        text values.
-      - Added to speed up performance compared to looking up
-        text each time in the xml with xpath.
-    * requests_until_refresh
-      - Int, how many text lookup requests may occurred since the
-        last page_text_dict reset (due to modification) before
-        an automatic refresh is triggerred.
-      - Used to prevent refreshing too often when fine grain
-        modifications occur.
+    * version_text_caches
+      - Dict, keyed by version, holding _Text_Cache objects with the
+        indexed t-node text and resolved strings of that version.
+      - Filled in on the first Read of each version.
+      - After an edit of the current xml, only entries of changed
+        t-nodes (and entries referring to them) are dropped.
     '''
     '''
     Note: for writing out wares to html, 16% of the long runtime
@@ -611,232 +1090,287 @@ class XML_Text_File(XML_File):
     to speed this process up. (This may have been influenced
     by using a .// style xpath, since reduced to ./ style.)
     '''
-    # Static value for how many requests are allowed before a refresh.
-    # One request may count multiple times if there are recursive
-    # text lookups, so don't make this too sensitive.
-    # Note: number is an intuitive guess, and wasn't tested for optimality.
-    # Note: setting 0 here will disable the refreshes.
-    requests_until_refresh_limit = 20
-
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.page_text_dict = defaultdict(dict)
-        self.requests_until_refresh = self.requests_until_refresh_limit
+        self.version_text_caches = {}
         return
 
 
-    def Refresh_Cache(self):
+    def Clear_Caches(self, dirty_node_ids = None, dirty_parent_ids = None):
         '''
-        Reads the xml and sets up the page_text_dict.
-        This will need a rerun when the xml gets modified and a new
-        Read is requested, if it is to be beneficial.
+        Clears cached text of the current version when root is updated,
+        or just the affected entries if the changed nodes are known.
         '''
-        # Stop the counter.
-        self.requests_until_refresh = 0
-        # Skip early if the dict is already filled in.
-        if self.page_text_dict:
+        text_cache = self.version_text_caches.get('current')
+        if text_cache == None:
             return
-        for page_node in self.Get_Root_Readonly().getchildren():
-            if page_node.tag != 'page':
-                continue
-            page_id = page_node.get('id')
-            for t_node in page_node.getchildren():
-                if t_node.tag != 't':
-                    continue
-                self.page_text_dict[page_id][t_node.get('id')] = t_node.text
+        # The cache can only be updated in place if it was built from
+        # the edited root; otherwise (eg. on the first edit, which copies
+        # the patched root) it is simply dropped.
+        if (dirty_node_ids == None 
+        or text_cache.root is not self.Get_Root_Readonly('current')):
+            del(self.version_text_caches['current'])
+        else:
+            text_cache.Update_Pages(dirty_node_ids, dirty_parent_ids)
         return
 
 
-    def Update_Root(self, *args, **kwargs):
+    def _Get_Text_Cache(self, version):
         '''
-        Clears the page_text_dict when root is updated.
+        Returns the _Text_Cache for the given version, creating it
+        if needed.
         '''
-        super().Update_Root(*args, **kwargs)
-        self.page_text_dict.clear()
-        # Set the refresh countdown.
-        self.requests_until_refresh = self.requests_until_refresh_limit
-        return
+        text_cache = self.version_text_caches.get(version)
+        if text_cache == None:
+            root = self.Get_Root_Readonly(version)
+            # Share with another version using the same root,
+            # eg. current before any modification.
+            for other_cache in self.version_text_caches.values():
+                if other_cache.root is root:
+                    text_cache = other_cache
+                    break
+            else:
+                text_cache = _Text_Cache(root)
+            self.version_text_caches[version] = text_cache
+        return text_cache
 
 
     # TODO: maybe a version that takes separate page and id terms.
-    def Read(self, text = None, page = None, id = None):
+    def Read(self, text = None, page = None, id = None, version = 'current'):
         '''
         Reads and returns the text at the given {page,id}.
         Recursively expands nested references.
         Removes comments in parentheses.
-        Returns None if no text found.
+        Returns None if no text found, or if references are circular.
 
         * text
           - String, including any internal '{page,id}' terms.
         * page, id
           - Int or string, page and id separated; give for direct
             dereference instead of a full text string.
+        * version
+          - String, version of the xml to read from; defaults 'current'.
         '''
-        # Maybe do a refresh of the page_text_dict.
-        if self.requests_until_refresh > 0:
-            self.requests_until_refresh -= 1
-            if self.requests_until_refresh <= 0:
-                self.Refresh_Cache()
-
-        # If page and id given, pack them in a string to reuse the
-        # following code. Probably don't need to worry about performance
-        # of this.
+        text_cache = self._Get_Text_Cache(version)
         if text == None:
-            text = '{{{},{}}}'.format(page,id)
-                       
-        # Remove any comments, in parentheses.
-        if '(' in text:
-            # .*?     : Non-greed match a series of chars.
-            # \( \)   : Match parentheses
-            # (?<!\\) : Look behind for no preceeding escape char.
-            # Note: put all this in a raw string to avoid python escapes.
-            text = ''.join(re.split(r'(?<!\\)\(.*?(?<!\\)\)', text))
-        #if text.startswith('(') and ')' in text:
-        #    text = text.split(')',1)[1]
-
-        # Remove leftover escape characters, blindly for now (assume
-        # they are never escaped themselves).
-        text = text.replace('\\','')
-
-        # If lookups are present, deal with them recursively.
-        # TODO: isn't this always the case with the current setup?
-        #  -Maybe remove this check.
-        if '{' in text:
-            if not self.page_text_dict or 1:
-                root = self.Get_Root_Readonly()
-
-            # RE pattern used:
-            #  .*    : Match a series of chars.
-            #  .*?   : As above, but changes to non-greedy.
-            #  {.*?} : Matches between { and }.
-            #  ()    : When put around pattern in re.split, returns the
-            #          separators (eg. the text lookups).
-            new_text = ''
-            for term in re.split('({.*?})', text):
-                # Skip empty terms (eg. when there is no text before the 
-                # first '{').
-                if not term:
-                    continue
-
-                # Check if it is a nested lookup.
-                if term.startswith('{'):
-            
-                    # Split it apart.
-                    page, id = (term.replace(' ','').replace('{','')
-                                .replace('}','').split(','))
-            
-                    # Look up the initial replacement.
-                    # Use xpath if the page_text_dict is not ready,
-                    # else use the dict for faster lookup.
-                    if self.page_text_dict:
-                        try:
-                            replacement_text = self.page_text_dict[page][id]
-                        except KeyError:
-                            return
-                    else:
-                        nodes = root.xpath('./page[@id="{}"]/t[@id="{}"]'.format(page, id))
-                        if not nodes:
-                            return
-                        replacement_text = nodes[0].text
-            
-                    # In case this replacement has nested terms,
-                    # recursively process it, and append to the running
-                    # result.
-                    new_text += self.Read(replacement_text)
-                else:
-                    # There was no lookup for this term; just append
-                    # it back to the text string.
-                    new_text += term
-
-            # Overwrite the text with the replacements.
-            text = new_text
-            
-        return text
+            return text_cache.Resolve_Key(
+                (str(page).replace(' ',''), str(id).replace(' ','')))
+        return text_cache.Resolve_Tokens(_Compile_Text(text))
 
-    
-class XML_Index_File(XML_File):
+
+@lru_cache(maxsize = 4096)
+def _Compile_Text(text):
     '''
-    XML file holding a an index (effectively dict) of name:path pairs.
-    Expected to be used for macros, components, and mousecursors.
-    This will append a '.xml' extension to the looked up paths, since
-    it is missing from the x4 source file paths.
+    Returns a tuple of tokens for the text, after removing comments
+    and escape characters. Tokens are strings of plain text, or tuples
+    of (page, id) strings for nested lookups, or None for a malformed
+    lookup.
+    '''
+    # Treat empty text nodes as empty strings.
+    if text == None:
+        return ()
+
+    # Remove any comments, in parentheses.
+    if '(' in text:
+        # .*?     : Non-greed match a series of chars.
+        # \( \)   : Match parentheses
+        # (?<!\\) : Look behind for no preceeding escape char.
+        text = ''.join(_comment_re.split(text))
+
+    # Remove leftover escape characters, blindly for now (assume
+    # they are never escaped themselves).
+    text = text.replace('\\','')
+
+    if '{' not in text:
+        return (text,)
+
+    tokens = []
+    for term in _lookup_re.split(text):
+        # Skip empty terms (eg. when there is no text before the 
+        # first '{').
+        if not term:
+            continue
+        # Check if it is a nested lookup.
+        if term.startswith('{'):
+            # Split it apart.
+            fields = (term.replace(' ','').replace('{','')
+                      .replace('}','').split(','))
+            tokens.append(tuple(fields) if len(fields) == 2 else None)
+        else:
+            # There was no lookup for this term; just keep the text.
+            tokens.append(term)
+    return tuple(tokens)
 
-    Attributes:
-    * name_path_dict
-      - Dict, keyed by entry name, with the virtual_path to an
-        xml source file.
-    * requests_until_refresh
-      - Int, how many text lookup requests may occurred since the
-        last page_text_dict reset (due to modification) before
-        an automatic refresh is triggerred.
-      - Used to prevent refreshing too often when fine grain
-        modifications occur.
+# Note: put these in raw strings to avoid python escapes.
+_comment_re = re.compile(r'(?<!\\)\(.*?(?<!\\)\)')
+# RE pattern used:
+#  .*?   : Non-greedy match a series of chars.
+#  {.*?} : Matches between { and }.
+#  ()    : When put around pattern in re.split, returns the
+#          separators (eg. the text lookups).
+_lookup_re = re.compile('({.*?})')
+
+
+class _Text_Cache:
     '''
-    requests_until_refresh_limit = 5
+    Indexed and resolved text for one xml root of an XML_Text_File.
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.name_path_dict = {}
-        self.requests_until_refresh = self.requests_until_refresh_limit
+    Attributes:
+    * root
+      - The xml root the text was read from.
+    * page_text_dict
+      - Dict, keyed by page id then t id, holding the t-node text.
+      - Where ids repeat, the last node is used.
+    * resolved_dict
+      - Dict, keyed by (page id, t id), holding fully resolved text,
+        or None for lookups that failed.
+    * dependents_dict
+      - Dict, keyed by (page id, t id), holding sets of keys whose
+        resolved text made use of that entry.
+    '''
+    def __init__(self, root):
+        self.root = root
+        self.page_text_dict = defaultdict(dict)
+        self.resolved_dict = {}
+        self.dependents_dict = defaultdict(set)
+        for page_node in root.iterchildren('page'):
+            self._Read_Page_Node(page_node, self.page_text_dict)
         return
 
-    def Refresh_Cache(self):
+
+    def _Read_Page_Node(self, page_node, page_text_dict):
         '''
-        Reads the xml and sets up the name_path_dict.
-        This will need a rerun when the xml gets modified and a new
-        Get is requested, if it is to be beneficial.
+        Records the text of a page node's t-nodes to the given dict.
         '''
-        # Stop the counter.
-        self.requests_until_refresh = 0
-        # Skip early if the dict is already filled in.
-        if self.name_path_dict:
-            return
-        # Root is an <index> node, children are <entry> nodes.
-        for entry_node in self.Get_Root_Readonly().getchildren():
-            if entry_node.tag != 'entry':
-                continue
-            # Note: if a mod appends new entries to the index, they will
-            #  overwrite those earlier in the index, as described at
-            #  https://forum.egosoft.com/viewtopic.php?t=347831 .
-            # No warning will be printed here, as such cases are assumed
-            #  to be intentional.
-            self.name_path_dict[entry_node.get('name')] = entry_node.get('value') + '.xml'
+        t_dict = page_text_dict[page_node.get('id')]
+        for t_node in page_node.iterchildren('t'):
+            t_dict[t_node.get('id')] = t_node.text
         return
 
 
-    def Update_Root(self, *args, **kwargs):
+    def Update_Pages(self, dirty_node_ids, dirty_parent_ids):
         '''
-        Clears the page_text_dict when root is updated.
+        Rereads pages holding changed nodes, and clears resolved text
+        for t-nodes that changed, and anything that refers to them.
         '''
-        super().Update_Root(*args, **kwargs)
-        self.name_path_dict.clear()
-        # Set the refresh countdown.
-        self.requests_until_refresh = self.requests_until_refresh_limit
+        root_id = XML_Diff.Get_Node_ID(self.root)
+        page_nodes = list(self.root.iterchildren('page'))
+        # If pages were added or removed, check them all.
+        if not root_id or root_id in dirty_parent_ids:
+            dirty_page_ids = set(self.page_text_dict.keys())
+            dirty_page_ids.update(x.get('id') for x in page_nodes)
+        else:
+            # Pick out changed or new pages.
+            dirty_page_ids = set(
+                x.get('id') for x in page_nodes
+                if (not XML_Diff.Get_Node_ID(x)
+                    or XML_Diff.Get_Node_ID(x) in dirty_node_ids))
+            # Pages edited directly may have had their id changed,
+            # so also drop entries for ids no longer present.
+            dirty_page_ids.update(self.page_text_dict.keys() 
+                                  - set(x.get('id') for x in page_nodes))
+            # Note: pages may repeat ids, so reread all nodes of an id.
+            page_nodes = [x for x in page_nodes 
+                          if x.get('id') in dirty_page_ids]
+
+        new_page_text_dict = defaultdict(dict)
+        for page_node in page_nodes:
+            self._Read_Page_Node(page_node, new_page_text_dict)
+
+        # Compare entries, to find those that changed.
+        changed_keys = []
+        for page_id in dirty_page_ids:
+            old_t_dict = self.page_text_dict.pop(page_id, {})
+            new_t_dict = new_page_text_dict.get(page_id, {})
+            for t_id in old_t_dict.keys() | new_t_dict.keys():
+                if (t_id not in old_t_dict or t_id not in new_t_dict
+                or old_t_dict[t_id] != new_t_dict[t_id]):
+                    changed_keys.append((page_id, t_id))
+            if new_t_dict:
+                self.page_text_dict[page_id] = new_t_dict
+
+        # Clear resolved text of the changed entries and dependents.
+        while changed_keys:
+            key = changed_keys.pop()
+            self.resolved_dict.pop(key, None)
+            changed_keys.extend(self.dependents_dict.pop(key, ()))
         return
 
 
+    def Resolve_Key(self, key, in_progress = None):
+        '''
+        Returns the resolved text of the t-node with the given
+        (page id, t id) key, or None if it could not be resolved.
+        '''
+        if key in self.resolved_dict:
+            return self.resolved_dict[key]
+
+        page_id, t_id = key
+        t_dict = self.page_text_dict.get(page_id)
+        if t_dict == None or t_id not in t_dict:
+            # Note: not recorded, so that new entries will be seen.
+            return None
+
+        # Check for circular references.
+        if in_progress == None:
+            in_progress = set()
+        elif key in in_progress:
+            return None
+        in_progress.add(key)
+        text = self.Resolve_Tokens(_Compile_Text(t_dict[t_id]), 
+                                   dependent = key, in_progress = in_progress)
+        in_progress.remove(key)
+        self.resolved_dict[key] = text
+        return text
+
+
+    def Resolve_Tokens(self, tokens, dependent = None, in_progress = None):
+        '''
+        Returns the resolved text for a series of tokens, or None if
+        any lookup failed. Lookups are noted as being used by the
+        dependent key, if given.
+        '''
+        strings = []
+        for token in tokens:
+            if token.__class__ is str:
+                strings.append(token)
+                continue
+            if token == None:
+                return None
+            if dependent != None:
+                self.dependents_dict[token].add(dependent)
+            text = self.Resolve_Key(token, in_progress)
+            if text == None:
+                return None
+            strings.append(text)
+        return ''.join(strings)
+
+
+class XML_Index_File(XML_File):
+    '''
+    XML file holding a an index (effectively dict) of name:path pairs.
+    Expected to be used for macros, components, and mousecursors.
+    This will append a '.xml' extension to the looked up paths, since
+    it is missing from the x4 source file paths.
+    Lookups use the registered child index of 'entry' nodes by 'name'.
+    '''
     def Find(self, name):
         '''
         Returns the indexed path matching the given name, or None
         if the name is not found.
         '''
-        # Maybe do a refresh of the name_path_dict.
-        if self.requests_until_refresh > 0:
-            self.requests_until_refresh -= 1
-            if self.requests_until_refresh <= 0:
-                self.Refresh_Cache()
-
-        # Do a normal or xpath lookup, depending on cache status.
-        if self.name_path_dict:
-            return self.name_path_dict.get(name, None)
-        else:
-            root = self.Get_Root_Readonly()
-            nodes = root.xpath('./entry[@name="{}"]'.format(name))
-            if not nodes:
-                value = nodes[0].get('value', None)
-                if value != None:
-                    return value + '.xml'
-        return None
+        nodes = self.Get_Child_Index('entry', 'name').get(name)
+        if not nodes:
+            return None
+        # Note: if a mod appends new entries to the index, they will
+        #  overwrite those earlier in the index, as described at
+        #  https://forum.egosoft.com/viewtopic.php?t=347831 .
+        # No warning will be printed here, as such cases are assumed
+        #  to be intentional.
+        value = nodes[-1].get('value')
+        if value == None:
+            return None
+        return value + '.xml'
 
 
     def Findall(self, pattern):
@@ -846,135 +1380,32 @@ class XML_Index_File(XML_File):
         Eg. Findall('ship_*') is expected to find every ship file path.
         Duplicates are ignored.
         '''
-        # Use the cached dict for this; ensure it is filled in.
-        self.Refresh_Cache()
-
         # Seach the keys.
         ret_list = set()
-        for key, value in self.name_path_dict.items():
+        for key, nodes in self.Get_Child_Index('entry', 'name').items():
+            # Entries without a name or value are skipped.
+            if key == None or nodes[-1].get('value') == None:
+                continue
             if fnmatch(key, pattern):
-                ret_list.add(value)
+                ret_list.add(nodes[-1].get('value') + '.xml')
         return ret_list
 
 
 class XML_Wares_File(XML_File):
     '''
-    The libraries/wares.xml file. This has some functionality for
-    speeding up xpath reads.
-
-    Attributes:
-    * version_ware_node_dict
-      - Dict, keyed by version then by 'ware[id]', holding the node for
-        each ware.
-      - Added to speed up performance compared to looking up
-        nodes each time in the xml with xpath, when the xpaths
-        have ware id qualifiers.
-    * requests_until_refresh
-      - Int, how many text lookup requests may occurred since the
-        last ware_node_dict reset (due to modification) before
-        an automatic refresh is triggerred.
-      - Used to prevent refreshing too often when fine grain
-        modifications occur.
+    The libraries/wares.xml file. Xpath reads starting with
+    './ware[@id="*"]' are sped up by the registered child index
+    of 'ware' nodes by 'id'.
     '''
     '''
     Note: this caching dropped the wares live editor object parsing
     from 18 seconds down to 2, compared to using the full xpath
     every time.
     '''
-    requests_until_refresh_limit = 5
-
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         assert self.virtual_path == 'libraries/wares.xml'
-        self.version_ware_node_dict = defaultdict(dict)
-        self.requests_until_refresh = self.requests_until_refresh_limit
         return
-    
-
-    def Refresh_Cache(self):
-        '''
-        Reads the xml and sets up the ware_node_dict.
-        This will need a rerun when the xml gets modified and a new
-        Get_Xpath_Nodes is requested, if it is to be beneficial.
-        The 'vanilla' and 'patched' versions will be filled once
-        and never cleared.
-        '''
-        # Stop the counter.
-        self.requests_until_refresh = 0
-        for version in ['vanilla','patched','current']:
-            # Skip if already filled in.
-            if self.version_ware_node_dict[version]:
-                continue
-            # Convenience renaming.
-            this_dict = self.version_ware_node_dict[version]
-            # Loop over the wares.
-            for ware_node in self.Get_Root_Readonly(version).getchildren():
-                if ware_node.tag != 'ware':
-                    continue
-                # Store it by id.
-                this_dict[ware_node.get('id')] = ware_node
-        return
-
-
-    def Update_Root(self, *args, **kwargs):
-        '''
-        Clears version_ware_node_dict['current'] when root is updated.
-        '''
-        super().Update_Root(*args, **kwargs)
-        self.version_ware_node_dict['current'].clear()
-        # Set the refresh countdown.
-        self.requests_until_refresh = self.requests_until_refresh_limit
-        return
-    
-
-    def Get_Xpath_Nodes(self, xpath, version = 'current'):
-        '''
-        Returns a list of nodes found using the given xpath on the given
-        version of the xml root. Defaults to the 'current' version.
-        Nodes should be considered read only.
-
-        If the xpath starts with the pattern './ware[@id="*"]/*', its
-        lookup will be accelerated.
-        '''
-        # Maybe do a refresh of the version_ware_node_dict.
-        if self.requests_until_refresh > 0:
-            self.requests_until_refresh -= 1
-            if self.requests_until_refresh <= 0:
-                # This will fill in all versions, which shouldn't
-                # have much overhead vs just one version, and saves
-                # this from having to have separate version countdowns.
-                self.Refresh_Cache()
-
-        # Check if the cache is ready.
-        ware_nodes = None
-        if self.version_ware_node_dict[version]:
-
-            # Check the xpath start.
-            if xpath.startswith('./ware[@id="'):
-                # Split out the id.
-                id, remainder = xpath.replace('./ware[@id="','').split('"]',1)
-
-                # If the remainder is empty or a '/', can continue,
-                # otherwise do a normal xpath since there are more
-                # qualifiers.
-                if not remainder or remainder[0] == '/':
-
-                    # Look up the node from the cache.
-                    ware_node = self.version_ware_node_dict[version].get(id)
-                    if ware_node != None:
-                        # If there is a remainder, reform it into a further
-                        #  xpath starting from the ware node.
-                        if remainder:
-                            new_xpath = '.' + remainder
-                            ware_nodes = ware_node.xpath(new_xpath)
-                        # Otherwise, just return this ware.
-                        else:
-                            ware_nodes = [ware_node]                               
-
-        # If nothing was found in the cache, do a normal lookup.
-        if not ware_nodes:
-            ware_nodes = super().Get_Xpath_Nodes(xpath, version)            
-        return ware_nodes
 
 
 # TODO: split this into separate text and binary versions.
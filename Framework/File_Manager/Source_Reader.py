@@ -113,11 +113,16 @@ class Source_Reader_class:
       - String, during xml patch application this is the name (folder) of the
         extension sourcing the patch.
       - For use by monitoring code.
+    * _extension_paths_set
+      - Set of virtual paths of all files in the extension_source_readers,
+        used to check if extensions may alter a base file.
+      - Rebuilt whenever the extension_source_readers are set.
     '''
     def __init__(self):
         self.base_x4_source_reader    = None
         self.loose_source_reader      = None
         self.extension_source_readers = OrderedDict()
+        self._extension_paths_set     = set()
         self.ext_currently_patching = None
         return
 
@@ -319,6 +324,12 @@ class Source_Reader_class:
 
         # Store the sorted list.
         self.extension_source_readers = sorted_dict
+
+        # Collect the paths of all extension files, for quick checks
+        #  in Read_Unpatched_Binary.
+        self._extension_paths_set = set()
+        for ext_reader in self.extension_source_readers.values():
+            self._extension_paths_set.update(ext_reader.Get_Virtual_Paths())
         return
 
 
@@ -550,6 +561,46 @@ class Source_Reader_class:
         return game_file
 
 
+    def Read_Unpatched_Binary(self, virtual_path):
+        '''
+        Returns the binary of a base file (from the loose source folder
+        or base x4 location) if no extension substitutes or patches it,
+        such that the binary matches what Read would give.
+        Returns None if the file is not found, is sourced from an
+        extension, or may be altered by an extension.
+        '''
+        virtual_path = virtual_path.lower()
+        if virtual_path.startswith('extensions/'):
+            return None
+
+        # Skip files that any extension holds.
+        if virtual_path in self._extension_paths_set:
+            return None
+
+        # Read from the source and base x4 locations, in the same
+        #  order as Read.
+        for reader in [self.loose_source_reader, self.base_x4_source_reader]:
+            if reader == None:
+                continue
+            source_path, binary = reader.Read_Binary(virtual_path)
+            if binary != None:
+                return binary
+        return None
+
+
+    def Get_Catalog_Reader(self, cat_path):
+        '''
+        Returns the Cat_Reader for the given cat file path, from whichever
+        location reader holds it, opening it if needed. Returns None if
+        the cat is not part of any source location.
+        '''
+        for reader in [self.loose_source_reader, self.base_x4_source_reader,
+                       *self.extension_source_readers.values()]:
+            if reader != None and cat_path in reader.catalog_file_dict:
+                return reader.Get_Catalog_Reader(cat_path)
+        return None
+
+
     def Get_All_Loose_Source_Files(self):
         '''
         Returns a dict of absolute paths to all loose files in the loose
@@ -324,33 +324,17 @@ class Location_Source_Reader:
         return (cat_path, file_binary)
     
 
-    def Read(self, 
-             virtual_path,
-             include_loose_files = True,
-             cat_prefix = None,
-             error_if_not_found = False,
-             allow_md5_error = False,
-             ):
+    def Read_Binary(self, 
+                    virtual_path,
+                    include_loose_files = True,
+                    cat_prefix = None,
+                    allow_md5_error = False,
+                    ):
         '''
-        Returns a Game_File intialized with the contents read from
-        a loose file or unpacked from a cat file.
-        If the file contents are empty, this returns None.
-         
-        * virtual_path
-          - String, virtual path of the file to look up.
-          - For files which may be gzipped into a pck file, give the
-            expected non-zipped extension (.xml, .txt, etc.).
-        * include_loose_files
-          - Bool, if True then loose files are searched.
-        * cat_prefix
-          - Optional string, prefix of catalog files to search.
-          - Eg. 'subst' to look only at 'subst_#.cat' files.
-        * error_if_not_found
-          - Bool, if True an exception will be thrown if the file cannot
-            be found, otherwise None is returned.
-        * allow_md5_error
-          - Bool, if True then the md5 check will be suppressed and
-            errors allowed. May still print a warning message.
+        Returns a tuple of (source_path, file_binary) for the file
+        matching the virtual_path, searching loose files and catalogs
+        as in Read, but without parsing the file.
+        If no file found, returns (None, None).
         '''
         # Can pick from either loose files or cat/dat files.
         # Preference is taken from Settings.
@@ -380,6 +364,46 @@ class Location_Source_Reader:
             if file_binary != None:
                 break
             
+        if file_binary == None:
+            return (None, None)
+        return (source_path, file_binary)
+
+
+    def Read(self, 
+             virtual_path,
+             include_loose_files = True,
+             cat_prefix = None,
+             error_if_not_found = False,
+             allow_md5_error = False,
+             ):
+        '''
+        Returns a Game_File intialized with the contents read from
+        a loose file or unpacked from a cat file.
+        If the file contents are empty, this returns None.
+         
+        * virtual_path
+          - String, virtual path of the file to look up.
+          - For files which may be gzipped into a pck file, give the
+            expected non-zipped extension (.xml, .txt, etc.).
+        * include_loose_files
+          - Bool, if True then loose files are searched.
+        * cat_prefix
+          - Optional string, prefix of catalog files to search.
+          - Eg. 'subst' to look only at 'subst_#.cat' files.
+        * error_if_not_found
+          - Bool, if True an exception will be thrown if the file cannot
+            be found, otherwise None is returned.
+        * allow_md5_error
+          - Bool, if True then the md5 check will be suppressed and
+            errors allowed. May still print a warning message.
+        '''
+        source_path, file_binary = self.Read_Binary(
+            virtual_path,
+            include_loose_files = include_loose_files,
+            cat_prefix = cat_prefix,
+            allow_md5_error = allow_md5_error,
+            )
+
         # If no binary was found, error.
         if file_binary == None:
             if error_if_not_found:
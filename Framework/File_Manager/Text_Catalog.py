@@ -0,0 +1,160 @@
+'''
+Catalog of text nodes across the language t files, for finding which
+languages hold given text entries without parsing every file.
+'''
+import re
+
+from .File_System import File_System
+
+
+class Text_Catalog_class:
+    '''
+    Index of where text entries sit in each language's t file, keyed
+    by (virtual path, page id, t id), filled in lazily as entries are
+    looked up. Files not yet loaded are searched as raw source binary,
+    for just the requested page and t ids, without any xml parsing,
+    as long as no extension alters them; otherwise they are loaded
+    normally. Loaded files are checked against their current xml.
+
+    Attributes:
+    * path_offsets_dict
+      - Dict, keyed by virtual path, holding dicts keyed by (page id,
+        t id) with the byte offset of the t node's start tag in the
+        source binary, or None if the file has no such entry.
+    * source_reader
+      - The File_System source reader the path_offsets_dict entries
+        were read through; when it changes (eg. on a File_System reset)
+        the entries are dropped.
+    '''
+    def __init__(self):
+        self.path_offsets_dict = {}
+        self.source_reader = None
+        return
+
+
+    def Reset(self):
+        '''
+        Clears all indexed entries.
+        '''
+        self.path_offsets_dict.clear()
+        self.source_reader = None
+        return
+
+
+    def Get_Language_Paths(self):
+        '''
+        Returns a sorted list of virtual paths of all language t files.
+        '''
+        return sorted(File_System.Gen_All_Virtual_Paths('t/*.xml'))
+
+
+    def Get_Language_ID(self, virtual_path):
+        '''
+        Returns the language id of a t file, as a string, eg. '44' for
+        't/0001-l044.xml', or None if the name has no language suffix.
+        '''
+        match = _language_re.search(virtual_path.lower())
+        if match == None:
+            return None
+        return str(int(match.group(1)))
+
+
+    def Get_Text_Offsets(self, virtual_path, page_t_ids):
+        '''
+        Returns a dict, keyed by (page id, t id), of the byte offsets of
+        the given text entries in the source binary of a t file, or None
+        for entries not found. Returns None if the file has no unaltered
+        source binary (eg. it is patched by an extension), in which case
+        it needs to be loaded to be checked.
+
+        * page_t_ids
+          - List of tuples of (page id, t id), as strings.
+        '''
+        virtual_path = virtual_path.lower()
+
+        # Drop offsets taken through an older source reader.
+        source_reader = File_System.Get_Source_Reader()
+        if source_reader is not self.source_reader:
+            self.path_offsets_dict.clear()
+            self.source_reader = source_reader
+
+        offsets = self.path_offsets_dict.get(virtual_path)
+        missing_ids = [x for x in page_t_ids
+                       if offsets == None or x not in offsets]
+        if missing_ids:
+            binary = source_reader.Read_Unpatched_Binary(virtual_path)
+            if binary == None:
+                return None
+            offsets = self.path_offsets_dict.setdefault(virtual_path, {})
+            for page, id in missing_ids:
+                offsets[(page, id)] = _Find_Text_Offset(binary, page, id)
+        return {x : offsets[x] for x in page_t_ids}
+
+
+    def Get_Paths_With_Text(self, page_t_ids):
+        '''
+        Returns a list of virtual paths of language t files which hold
+        any of the given text entries. Files not otherwise loaded are
+        only loaded if they can't be searched as source binary.
+
+        * page_t_ids
+          - List of tuples of (page id, t id), as ints or strings.
+        '''
+        page_t_ids = [(str(page), str(id)) for page, id in page_t_ids]
+        paths = []
+        for virtual_path in self.Get_Language_Paths():
+
+            # Loaded files may have been edited; check their current xml.
+            if not File_System.File_Is_Loaded(virtual_path):
+                offsets = self.Get_Text_Offsets(virtual_path, page_t_ids)
+                if offsets != None:
+                    if any(x != None for x in offsets.values()):
+                        paths.append(virtual_path)
+                    continue
+
+            game_file = File_System.Load_File(
+                virtual_path, error_if_not_found = False)
+            if game_file == None:
+                continue
+            root = game_file.Get_Root_Readonly()
+            if any(root.find('./page[@id="{}"]/t[@id="{}"]'.format(page, id)) != None
+                   for page, id in page_t_ids):
+                paths.append(virtual_path)
+        return paths
+
+
+# Pattern for language file names, eg. '0001-l044.xml'.
+_language_re = re.compile(r'-l(\d+)\.xml$')
+
+# Patterns for page and t start tags with a given id, filled in with
+# the escaped id bytes.
+_page_tag_pattern = rb'<page\b[^>]*?\sid\s*=\s*["\']{}["\'][^>]*>'
+_t_tag_pattern    = rb'<t\b[^>]*?\sid\s*=\s*["\']{}["\']'
+
+
+def _Find_Text_Offset(binary, page, id):
+    '''
+    Returns the byte offset of the start tag of a t node under a page
+    node, found by searching the raw xml binary of a t file, or None
+    if not found. Pages repeating an id are all searched.
+    Text in comments may rarely give a false match, which at worst
+    leads to a file being loaded without a change.
+    '''
+    page_re = re.compile(_page_tag_pattern.replace(b'{}', re.escape(page.encode())))
+    t_re    = re.compile(_t_tag_pattern.replace(b'{}', re.escape(id.encode())))
+    for page_match in page_re.finditer(binary):
+        # Pages without children close in their start tag.
+        if page_match.group().endswith(b'/>'):
+            continue
+        start = page_match.end()
+        end = binary.find(b'</page>', start)
+        if end < 0:
+            end = len(binary)
+        t_match = t_re.search(binary, start, end)
+        if t_match != None:
+            return t_match.start()
+    return None
+
+
+# Static copy of the catalog.
+Text_Catalog = Text_Catalog_class()
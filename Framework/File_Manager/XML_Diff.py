@@ -118,6 +118,7 @@ import time # Used for some profiling.
 
 from ..Common import Plugin_Log
 from ..Common import Print as Print_Log
+from ..Common import Plugin_Stats
 from ..Common.Exceptions import XML_Patch_Exception
 
 
@@ -151,12 +152,52 @@ def LXML_Element_Depickler(xml_string):
 copyreg.pickle(ET._Element, LXML_Element_Pickler, LXML_Element_Depickler)
 
 
+'''
+Note on node id storage:
+    Other storage options were considered, but lxml element python
+    objects are only proxies, created on access and freed when no
+    longer referenced, so they cannot hold python attributes across
+    accesses (even with a custom element class lookup). A side table
+    keyed by element would need to keep a proxy alive for every node,
+    costing more than the tail, and would not carry through deepcopy
+    or pickling as the tail does.
+    
+    So ids stay in the tail, but are written in a compact base 36 form,
+    and all readers should go through Get_Node_ID so the storage
+    remains an internal detail of this module.
+'''
+# Digits used for the node id strings.
+_node_id_digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+def _Encode_Node_ID(value):
+    '''
+    Returns a compact base 36 string for the given non-negative integer.
+    '''
+    if value == 0:
+        return '0'
+    chars = []
+    while value:
+        value, digit = divmod(value, 36)
+        chars.append(_node_id_digits[digit])
+    return ''.join(reversed(chars))
+
+
+def Get_Node_ID(xml_node):
+    '''
+    Returns the node_id string of the given node, or None if it has
+    not been assigned one. Node ids can be compared for equality
+    and used as dict keys, but have no other meaning.
+    '''
+    # Empty tails count as no id.
+    return xml_node.tail or None
+
+
 # Statically track the number of node id values assigned, and just
 # keep incrementing this.
 _running_id = 0
 def Fill_Node_IDs(xml_node):
     '''
-    For all elements, fill their tail property with a unique integer
+    For all elements, fill their tail property with a unique
     node_id. Values remain unique throughput the python session.
     Ids are unique across xml documents annotated.
     If an id string is already in the tail, it will be left unchanged,
@@ -167,8 +208,8 @@ def Fill_Node_IDs(xml_node):
     # Loop over the nodes, including comments.
     for node in xml_node.iter():
         # If the tail is empty, fill it in.
-        if not node.tail:
-            node.tail = str(_running_id)
+        if not Get_Node_ID(node):
+            node.tail = _Encode_Node_ID(_running_id)
             _running_id += 1
     return xml_node
 
@@ -180,18 +221,116 @@ def Print(xml_node, **kwargs):
     Any kwargs are passed to ET.tostring.
     '''
     # Back up all tails, and clear them.
-    node_id_dict = {}
+    # Tails are kept in iteration order, and restored with a second
+    # iteration, to avoid holding a python proxy for every node.
+    tails = []
     for node in xml_node.iter():
-        node_id_dict[node] = node.tail
+        tails.append(node.tail)
         node.tail = None
     # Print.
     text = ET.tostring(xml_node, pretty_print = True, **kwargs)
     # Put tails back.
-    for node, tail in node_id_dict.items():
+    for node, tail in zip(xml_node.iter(), tails):
         node.tail = tail
     return text
 
 
+def Write(xml_node, stream, encoding = 'utf-8', xml_declaration = True):
+    '''
+    Writes the prettyprinted xml_node to a binary stream, skipping the
+    node_id strings as it goes, without modifying the node or building
+    the full output in memory. Output matches Print of the node's
+    ElementTree, ending in a newline.
+
+    * stream
+      - File-like object with a binary write method.
+    * encoding
+      - String, the encoding to use.
+    * xml_declaration
+      - Bool, if True then an xml declaration header is written first.
+    '''
+    # The incremental writer can't write past the end of the root, and
+    # childless elements it writes would repeat namespace declarations
+    # made by their ancestors. Rare trees with comments or processing
+    # instructions beside the root, or childless elements using
+    # namespaces, are printed in full instead.
+    if (xml_node.getprevious() != None or xml_node.getnext() != None
+    or _namespaced_leaf_xpath(xml_node)):
+        text = Print(ET.ElementTree(xml_node), encoding = encoding,
+                     xml_declaration = xml_declaration)
+        stream.write(text)
+        if not text.endswith('\n'.encode(encoding)):
+            stream.write('\n'.encode(encoding))
+        return
+
+    with ET.xmlfile(stream, encoding = encoding) as xml_file:
+        if xml_declaration:
+            xml_file.write_declaration()
+        _Write_Node(xml_file, xml_node, 0, pretty = True, parent_nsmap = {})
+    # Text isn't allowed after the root by the xmlfile, so write
+    # the final newline directly.
+    stream.write('\n'.encode(encoding))
+    return
+
+
+# Xpath checking for childless elements whose tag or attributes
+# are in a namespace, which Write can't write directly.
+_namespaced_leaf_xpath = ET.XPath(
+    'boolean(descendant-or-self::*[not(*)]'
+    '[namespace-uri() != "" or @*[namespace-uri() != ""]])')
+
+def _Write_Node(xml_file, node, depth, pretty, parent_nsmap):
+    '''
+    Recursive support function for Write. Writes the node and its
+    children, without tails.
+
+    * depth
+      - Int, depth of the node, for indentation.
+    * pretty
+      - Bool, if False then no indentation is added; used when under
+        a node with mixed text content, as in lxml's prettyprint.
+    * parent_nsmap
+      - Dict of namespaces already declared by ancestors.
+    '''
+    # Only declare namespaces new to this node.
+    if isinstance(node.tag, str):
+        nsmap = node.nsmap
+        new_nsmap = {key : value for key, value in nsmap.items()
+                     if parent_nsmap.get(key) != value}
+
+    # Leaves (which includes comments) can have lxml write them
+    # directly, just leaving off the tail id.
+    if len(node) == 0:
+        # When under namespace declarations (eg. an xsi root attribute),
+        # lxml would repeat the declarations on the leaf, so write
+        # a plain copy instead, declaring just the new namespaces.
+        # (Leaves using a namespace are left to Print, by Write.)
+        if parent_nsmap and isinstance(node.tag, str):
+            leaf = ET.Element(node.tag, node.attrib, nsmap = new_nsmap or None)
+            leaf.text = node.text
+            xml_file.write(leaf)
+        else:
+            xml_file.write(node, with_tail = False)
+        return
+
+    # Nodes with text don't get indented children.
+    if node.text:
+        pretty = False
+    indent = '\n' + '  ' * (depth + 1) if pretty else ''
+
+    with xml_file.element(node.tag, node.attrib, nsmap = new_nsmap or None):
+        if node.text:
+            xml_file.write(node.text)
+        for child in node.iterchildren():
+            if indent:
+                xml_file.write(indent)
+            _Write_Node(xml_file, child, depth + 1, pretty, nsmap)
+        # Indent the closing tag.
+        if indent:
+            xml_file.write(indent[:-2])
+    return
+
+
 def Apply_Patch(original_node, patch_node, error_prefix = None):
     '''
     Apply a diff patch to the target xml node.
@@ -330,6 +469,7 @@ def Apply_Patch(original_node, patch_node, error_prefix = None):
             # prefixed '.' was needed to get this to work.
             # Note: if the xpath is malformed, this will throw an exception.
             try:
+                Plugin_Stats.Count('xpath_evals')
                 matched_nodes = temp_tree.xpath('.' + xpath)
             except Exception as ex:
                 Print_Error('xpath exception: {}'.format(ex))
@@ -466,7 +606,13 @@ def _Apply_Patch_Op(op_node, target_node, type):
     return
 
 
-def Make_Patch(original_node, modified_node, verify = True, maximal = True):
+def Make_Patch(
+        original_node, 
+        modified_node, 
+        verify = True, 
+        maximal = True,
+        dirty_node_ids = None,
+    ):
     '''
     Returns an xml diff node, suitable for converting from
     original_node to modified_node. Expects Fill_Node_IDs
@@ -480,6 +626,13 @@ def Make_Patch(original_node, modified_node, verify = True, maximal = True):
       - Bool, if True then make a maximal diff patch, replacing the original
         root with the modified root.
       - Used for testing of other functions.
+    * dirty_node_ids
+      - Optional set of node_id strings, holding every node changed
+        in modified_node (attributes, text, or child list) along with
+        all of their ancestors.
+      - When given, only these nodes are searched for changes, and
+        only they are copied from the original_node.
+      - When None, the full trees are compared.
     '''
     if maximal:
         # Set up a diff node as root.
@@ -501,16 +654,24 @@ def Make_Patch(original_node, modified_node, verify = True, maximal = True):
         # To make xpath generation easier/robust, as patches are generated
         #  the (copied) original xml will be edited with the changes, so
         #  that they are reflected in following xpaths.
-        original_copy = deepcopy(original_node)
+        if dirty_node_ids == None:
+            original_copy = deepcopy(original_node)
         
-        # Ensure the modified_node is fully filled in with node ids,
-        #  since they are important when the nodes get inserted into
-        #  the original_copy. (New nodes added since it was forked
-        #  from the original would otherwise have no id.)
-        Fill_Node_IDs(modified_node)
+            # Ensure the modified_node is fully filled in with node ids,
+            #  since they are important when the nodes get inserted into
+            #  the original_copy. (New nodes added since it was forked
+            #  from the original would otherwise have no id.)
+            Fill_Node_IDs(modified_node)
+        else:
+            # Only the dirty nodes, and enough of their children to
+            #  form xpaths, need copying.
+            original_copy = _Copy_Dirty_Nodes(original_node, dirty_node_ids)
+            # New nodes can only be children of dirty nodes.
+            _Fill_Dirty_Node_IDs(modified_node, dirty_node_ids)
 
         # Get a list of op elements.
-        patch_op_list = _Get_Patch_Ops_Recursive(original_copy, modified_node)
+        patch_op_list = _Get_Patch_Ops_Recursive(
+            original_copy, modified_node, dirty_node_ids)
 
         # Construct the diff patch with these as children.
         patch_node = ET.Element('diff')
@@ -522,6 +683,48 @@ def Make_Patch(original_node, modified_node, verify = True, maximal = True):
     return patch_node
 
 
+def _Copy_Dirty_Nodes(node, dirty_node_ids):
+    '''
+    Returns a partial copy of the node, for use in patch generation.
+    The node and any dirty descendents are copied with their children;
+    other children are copied without their own children, which is
+    enough for xpath construction since those subtrees will not
+    be searched.
+    '''
+    # Comments and similar get a plain copy; they have no children.
+    if not isinstance(node.tag, str):
+        return deepcopy(node)
+
+    node_copy = ET.Element(node.tag, attrib = dict(node.attrib))
+    node_copy.text = node.text
+    node_copy.tail = Get_Node_ID(node)
+    for child in node.iterchildren():
+        if Get_Node_ID(child) in dirty_node_ids:
+            node_copy.append(_Copy_Dirty_Nodes(child, dirty_node_ids))
+        elif not isinstance(child.tag, str) or len(child) == 0:
+            node_copy.append(deepcopy(child))
+        else:
+            child_copy = ET.Element(child.tag, attrib = dict(child.attrib))
+            child_copy.text = child.text
+            child_copy.tail = Get_Node_ID(child)
+            node_copy.append(child_copy)
+    return node_copy
+
+
+def _Fill_Dirty_Node_IDs(node, dirty_node_ids):
+    '''
+    Fills node ids for any new children of the node or its dirty
+    descendents, including the full subtrees of new children.
+    '''
+    for child in node.iterchildren():
+        node_id = Get_Node_ID(child)
+        if not node_id:
+            Fill_Node_IDs(child)
+        elif node_id in dirty_node_ids:
+            _Fill_Dirty_Node_IDs(child, dirty_node_ids)
+    return
+
+
 def _Patch_Node_Constructor(
         op,
         type,
@@ -628,18 +831,20 @@ def _Patch_Node_Constructor(
     return op_node
 
 
-def _Get_Patch_Ops_Recursive(original_node, modified_node):
+def _Get_Patch_Ops_Recursive(original_node, modified_node, dirty_node_ids = None):
     '''
     Recursive function which will return a list of patch operation elements
     to convert from the original_node to the modified_node.
     Returns a list of elements (add, remove, or replace).
-    Input nodes are expected to have the same tail property.
+    Input nodes are expected to have the same node id.
     The original_node will be edited according to the patch op as this
     progresses, to ensure xpaths update accordingly mid patching.
+    If dirty_node_ids is given, matched children not in it are
+    assumed unchanged and not recursed into.
     '''
-    # As a rule, the inputs will have the same tail, and
+    # As a rule, the inputs will have the same node id, and
     # the recursive function will only be called when this is true.
-    assert original_node.tail == modified_node.tail
+    assert Get_Node_ID(original_node) == Get_Node_ID(modified_node)
 
     patch_nodes = []
 
@@ -732,20 +937,23 @@ def _Get_Patch_Ops_Recursive(original_node, modified_node):
                 break
 
 
+            orig_child_id = Get_Node_ID(orig_child)
+            mod_child_id  = Get_Node_ID(mod_child)
+
             # Something went wrong if both have None for node ids.
-            if orig_child.tail == None and mod_child.tail == None:
+            if orig_child_id == None and mod_child_id == None:
                 raise XML_Patch_Exception('node ids not filled in well enough')
 
 
             # Check for a difference.
-            if orig_child.tail != mod_child.tail:
+            if orig_child_id != mod_child_id:
 
                 # Want to know what happened.
                 # Check if the mod_child is elsewhere in the original.
-                mod_child_in_orig = any(mod_child.tail == x.tail 
+                mod_child_in_orig = any(mod_child_id == Get_Node_ID(x)
                                         for x in original_node.getchildren())
                 # Check if the orig_child is elsewhere in the child.
-                orig_child_in_mod = any(orig_child.tail == x.tail 
+                orig_child_in_mod = any(orig_child_id == Get_Node_ID(x)
                                         for x in modified_node.getchildren())
 
                 if mod_child_in_orig == True and orig_child_in_mod == False:
@@ -791,7 +999,11 @@ def _Get_Patch_Ops_Recursive(original_node, modified_node):
             # If here, then the nodes appear to be the same, superficially.
             # Still need to handle deeper changes, so recurse and pick out
             #  lower level patches.
-            patch_nodes += _Get_Patch_Ops_Recursive(orig_child, mod_child)
+            # Skip this if the node and its children are known unchanged.
+            if dirty_node_ids != None and mod_child_id not in dirty_node_ids:
+                continue
+            patch_nodes += _Get_Patch_Ops_Recursive(
+                orig_child, mod_child, dirty_node_ids)
 
     return patch_nodes
 
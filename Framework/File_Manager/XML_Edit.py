@@ -0,0 +1,288 @@
+'''
+Support for transactional, in place editing of an XML_File's current
+xml, as a lighter alternative to the Get_Root/Update_Root deepcopy.
+
+Usage, from a transform:
+    with game_file.Begin_Edit() as edit:
+        node = edit.root.find('./some/node')
+        edit.Set(node, 'value', '2')
+
+Edits are applied directly to the file's modified_root, and journaled
+so that they can be undone. Leaving the "with" block normally will
+commit the edits; an exception will roll them back before propagating.
+'''
+'''
+Note on the journal:
+    Each record is a tuple starting with an op name, followed by the
+    info needed to undo it. Records are undone in reverse order.
+    - ('node', node, attrib_dict, text)
+      Snapshot of a node's attributes and text prior to its first edit.
+    - ('insert', parent, node)
+      A node was inserted; undo removes it.
+    - ('remove', parent, index, node)
+      A node was removed from the given index; undo reinserts it.
+    Node tails are left alone, since they hold node ids.
+    A savepoint is the journal length at the time it was taken; nodes
+    are snapshot again after it, so that undoing later records
+    restores their state as of the savepoint.
+'''
+from . import XML_Diff
+
+class XML_Edit:
+    '''
+    Open transaction on an XML_File. Create using XML_File.Begin_Edit.
+    Nodes changed directly (eg. by support functions that call
+    node.set) should be passed to Track first, so that they can be
+    rolled back.
+
+    Attributes:
+    * xml_file
+      - The XML_File being edited.
+    * root
+      - Element, the live current root of the xml_file. Edits made to
+        it are seen immediately by Get_Root_Readonly.
+    * journal
+      - List of undo records, in order of edits.
+    * tracked_node_ids
+      - Set of python ids of nodes with a snapshot in the journal,
+        to avoid repeated snapshots.
+    * dirty_node_ids
+      - Set of xml node_id strings (as filled in by XML_Diff.Fill_Node_IDs)
+        of edited nodes and all of their ancestors.
+      - Nodes without an id (eg. newly added) mark their nearest
+        ancestor that has one.
+    * dirty_parent_ids
+      - Set of xml node_id strings of nodes which had children
+        inserted or removed.
+      - Used to tell if xpath lookups through a node may resolve
+        differently than before the edit.
+    * top_level_tracked
+      - Bool, True if a direct child of the root was tracked, in which
+        case its attributes (eg. asset names) may have changed.
+    * is_open
+      - Bool, True until Commit or Rollback is called.
+    '''
+    def __init__(self, xml_file, root):
+        self.xml_file = xml_file
+        self.root = root
+        self.journal = []
+        self.tracked_node_ids = set()
+        self.dirty_node_ids = set()
+        self.dirty_parent_ids = set()
+        self.top_level_tracked = False
+        self.is_open = True
+        return
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        '''
+        Commits the edit, or rolls it back if an exception occurred.
+        The exception, if any, is not suppressed.
+        '''
+        # Skip if the user closed it already.
+        if self.is_open:
+            if exc_type == None:
+                self.Commit()
+            else:
+                self.Rollback()
+        return False
+
+
+    def _Mark_Dirty(self, node):
+        '''
+        Records the node_ids of the node and its ancestors as dirty.
+        '''
+        for this_node in [node, *node.iterancestors()]:
+            node_id = XML_Diff.Get_Node_ID(this_node)
+            # Skip nodes that don't have an id yet.
+            if node_id:
+                # Can stop early if the rest of the chain was seen.
+                if node_id in self.dirty_node_ids:
+                    break
+                self.dirty_node_ids.add(node_id)
+        return
+
+
+    def _Mark_Parent_Dirty(self, parent):
+        '''
+        Records the parent as having changed children, and marks it
+        and its ancestors as dirty.
+        '''
+        # Use the nearest ancestor with an id.
+        for this_node in [parent, *parent.iterancestors()]:
+            node_id = XML_Diff.Get_Node_ID(this_node)
+            if node_id:
+                self.dirty_parent_ids.add(node_id)
+                break
+        self._Mark_Dirty(parent)
+        return
+
+
+    def Track(self, node):
+        '''
+        Record the attributes and text of a node, prior to it being
+        edited directly. Only the first call for a node has an effect.
+        '''
+        assert self.is_open
+        if id(node) in self.tracked_node_ids:
+            return
+        self.tracked_node_ids.add(id(node))
+        # Only this node's attributes and text change, so its parent
+        # keeps the same children.
+        self._Mark_Dirty(node)
+        if node.getparent() is self.root:
+            self.top_level_tracked = True
+        self.journal.append(('node', node, dict(node.attrib), node.text))
+        return
+
+
+    def _Has_Changes(self):
+        '''
+        Returns True if the journal holds any net changes, comparing
+        node snapshots against the nodes' current attributes and text.
+        Inserted or removed nodes always count as changes.
+        '''
+        # Only the first snapshot of a node holds its original state.
+        seen_node_ids = set()
+        for record in self.journal:
+            if record[0] != 'node':
+                return True
+            _, node, attrib, text = record
+            if id(node) in seen_node_ids:
+                continue
+            seen_node_ids.add(id(node))
+            if node.text != text or dict(node.attrib) != attrib:
+                return True
+        return False
+
+
+    def Set(self, node, attribute, value):
+        '''
+        Sets an attribute of the node to the given value.
+        If value is None, the attribute is removed.
+        '''
+        self.Track(node)
+        if value == None:
+            if attribute in node.attrib:
+                node.attrib.pop(attribute)
+        else:
+            node.set(attribute, value)
+        return
+
+
+    def Set_Text(self, node, text):
+        '''
+        Sets the text of the node.
+        '''
+        self.Track(node)
+        node.text = text
+        return
+
+
+    def Insert(self, parent, index, node):
+        '''
+        Inserts a new child node under the parent, at the given index.
+        '''
+        assert self.is_open
+        parent.insert(index, node)
+        self.journal.append(('insert', parent, node))
+        self._Mark_Parent_Dirty(parent)
+        return
+
+
+    def Append(self, parent, node):
+        '''
+        Appends a new child node to the end of the parent.
+        '''
+        self.Insert(parent, len(parent), node)
+        return
+
+
+    def Remove(self, node):
+        '''
+        Removes the node from its parent.
+        '''
+        assert self.is_open
+        parent = node.getparent()
+        # Removing the root isn't supported.
+        assert parent != None
+        index = parent.index(node)
+        parent.remove(node)
+        self.journal.append(('remove', parent, index, node))
+        self._Mark_Parent_Dirty(parent)
+        return
+
+
+    def Get_Savepoint(self):
+        '''
+        Returns a savepoint, which may be passed to Rollback to undo
+        only the changes made after it, keeping the edit open.
+        '''
+        assert self.is_open
+        # Nodes edited after this need fresh snapshots.
+        self.tracked_node_ids.clear()
+        return len(self.journal)
+
+
+    def Commit(self):
+        '''
+        Closes the edit, keeping the changes. If anything was changed,
+        the file will be flagged as modified.
+        '''
+        assert self.is_open
+        self.is_open = False
+        # Tracked nodes may have been set back to their prior values,
+        # so check for actual changes.
+        self.xml_file._Close_Edit(self, changed = self._Has_Changes(),
+                                  dirty_node_ids = self.dirty_node_ids,
+                                  dirty_parent_ids = self.dirty_parent_ids)
+        self.journal = []
+        self.tracked_node_ids.clear()
+        return
+
+
+    def Rollback(self, savepoint = None):
+        '''
+        Undoes changes in reverse order, and closes the edit.
+
+        * savepoint
+          - Optional savepoint from Get_Savepoint; if given, only changes
+            made after it are undone, and the edit is left open.
+        '''
+        assert self.is_open
+        start = 0 if savepoint == None else savepoint
+        for record in reversed(self.journal[start:]):
+            op = record[0]
+            if op == 'node':
+                _, node, attrib, text = record
+                node.attrib.clear()
+                for key, value in attrib.items():
+                    node.set(key, value)
+                node.text = text
+            elif op == 'insert':
+                _, parent, node = record
+                parent.remove(node)
+            elif op == 'remove':
+                _, parent, index, node = record
+                parent.insert(index, node)
+
+        if savepoint != None:
+            del self.journal[start:]
+            # Nodes edited again need fresh snapshots. Dirty ids are
+            # kept, which may limit diffs less but is still correct.
+            self.tracked_node_ids.clear()
+            return
+
+        self.is_open = False
+        # Caches may have been refreshed against the edited state,
+        # so still report a change for them to clear, but don't
+        # flag the file as modified.
+        self.xml_file._Close_Edit(self, changed = False,
+                                  clear_caches = bool(self.journal))
+        self.journal = []
+        self.tracked_node_ids.clear()
+        return
@@ -3,6 +3,8 @@ Holds modules with most of the file handling framework.
 '''
 from .File_Types import XML_File, Misc_File
 from .File_System import File_System
+from .Text_Catalog import Text_Catalog
+from .Asset_Catalog import Asset_Catalog
 from . import XML_Diff
 from . import Extension_Finder
 # Pull out the most common file system function for transforms to use.
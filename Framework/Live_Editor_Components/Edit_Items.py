@@ -1,16 +1,249 @@
 
-from collections import defaultdict
-from ..File_Manager import Load_File
+import re
+from collections import namedtuple
+from functools import lru_cache
+from sys import intern
+from lxml import etree as ET
+from ..File_Manager import Load_File, XML_Diff
 from ..Common import Print
 
 # Static list of version names used.
 version_names = ['vanilla','patched','current','edited']
+# Index of each version in item value lists.
+version_indices = {name : index for index, name in enumerate(version_names)}
+
+# Static display info of items, shared between items with the same values.
+Item_Info = namedtuple('Item_Info', 
+    ['display_name', 'description', 'read_only', 'hidden'])
+
+@lru_cache(maxsize = None)
+def _Get_Item_Info(display_name, description, read_only, hidden):
+    'Returns a shared Item_Info for the given field values.'
+    return Item_Info(display_name, description, read_only, hidden)
+
+@lru_cache(maxsize = None)
+def _Get_Item_Key(name, virtual_path, xpath, attribute):
+    '''
+    Returns a shared key tuple of (name, virtual_path, xpath, attribute),
+    with interned strings, so that items for the same field (eg. across
+    table rebuilds) share one key and its xpath.
+    '''
+    return (intern(name), intern(virtual_path), intern(xpath), intern(attribute))
+
+# Pattern for a simple xpath step: a name with optional predicates,
+# not starting with a '.', and without axes, functions, or unions
+# outside of predicates. Predicates may hold quoted strings, but not
+# nested brackets.
+_xpath_step_pattern = r'''(?:[^/\[\]"'|(:@.]|\[(?:[^\[\]"']|"[^"]*"|'[^']*')*\])(?:[^/\[\]"'|(:@]|\[(?:[^\[\]"']|"[^"]*"|'[^']*')*\])*'''
+_simple_xpath_re = re.compile(r'\.(?:/{})*'.format(_xpath_step_pattern))
+_xpath_step_re   = re.compile(r'/({})'.format(_xpath_step_pattern))
+
+def _Split_Xpath(xpath):
+    '''
+    Splits a simple relative xpath (eg. './macro[@name="X"][1]/properties')
+    into a list of its steps, starting with '.'. Returns None for xpaths
+    that are not relative, or use anything beyond child steps with
+    predicates (eg. '//', '..', axes, functions, unions).
+    '''
+    if not _simple_xpath_re.fullmatch(xpath):
+        return None
+    return ['.'] + _xpath_step_re.findall(xpath)
+
+
+# Compiled xpaths for single steps, keyed by step string.
+_step_xpaths = {}
+
+def _Get_Step_Xpath(step):
+    'Returns a compiled xpath for a relative lookup of a single step.'
+    compiled = _step_xpaths.get(step)
+    if compiled == None:
+        compiled = ET.XPath('./' + step)
+        _step_xpaths[step] = compiled
+    return compiled
+
+
+class Xpath_Resolver:
+    '''
+    Batched xpath lookups, for many xpaths that share prefixes, eg. the
+    items of one asset that all start with './macro[@name="X"][1]'.
+    Simple xpaths are resolved one step at a time, with the nodes of
+    every prefix cached, so that shared prefixes are only looked up
+    once per version. Other xpaths are looked up directly.
+
+    Results are only valid while the xml is unchanged, so resolvers
+    should be short lived, eg. for one Make_Items call.
+
+    Attributes:
+    * game_file
+      - Optional XML_File to look up nodes in. First steps are looked up
+        through its Get_Xpath_Nodes, to use any lookup acceleration.
+    * version_roots
+      - Optional dict of xml roots keyed by version, used when there
+        is no game_file.
+    * version_xpath_nodes
+      - Dict, keyed by (version, xpath), holding lists of found nodes.
+    '''
+    def __init__(self, game_file = None, version_roots = None):
+        assert game_file != None or version_roots != None
+        self.game_file = game_file
+        self.version_roots = version_roots
+        self.version_xpath_nodes = {}
+        return
+
+
+    def Get_Nodes(self, xpath, version = 'current'):
+        '''
+        Returns a list of nodes matching the xpath in the given version.
+        The list should not be modified.
+        '''
+        key = (version, xpath)
+        nodes = self.version_xpath_nodes.get(key)
+        if nodes != None:
+            return nodes
+
+        steps = _Split_Xpath(xpath)
+        # Complex xpaths and single steps are looked up directly.
+        if steps == None or len(steps) <= 2:
+            if self.game_file != None:
+                nodes = self.game_file.Get_Xpath_Nodes(xpath, version = version)
+            else:
+                nodes = self.version_roots[version].xpath(xpath)
+        else:
+            # Look up the prefix nodes (likely cached), and evaluate
+            # the last step from each of them.
+            prefix_nodes = self.Get_Nodes('/'.join(steps[:-1]), version)
+            step_xpath = _Get_Step_Xpath(steps[-1])
+            nodes = [node for prefix_node in prefix_nodes
+                     for node in step_xpath(prefix_node)]
+
+        self.version_xpath_nodes[key] = nodes
+        return nodes
+
+
+    def Add_Nodes(self, xpath, version, nodes):
+        '''
+        Records the nodes matching an xpath in the given version, eg.
+        to prefill lookups of nodes indexed by some attribute.
+        '''
+        self.version_xpath_nodes[(version, xpath)] = nodes
+        return
+
+
+def Get_Item_Record(
+        version_roots, 
+        xpath, 
+        attribute, 
+        virtual_path = '',
+        xpath_resolver = None,
+    ):
+    '''
+    Returns a record tuple for an Edit_Item, of (xpath, attribute,
+    vanilla value, patched value, current value, xml_node_id),
+    looking up the values in the given xml roots. Missing nodes or
+    attributes give empty string values, and a missing patched node
+    gives a None xml_node_id. Versions that share the same root
+    object share a single lookup.
+    Meant for use where Edit_Items are built from xml copies that
+    are separate from their Game_File, eg. in worker processes.
+
+    * version_roots
+      - Dict, keyed by 'vanilla', 'patched', and 'current', holding
+        the xml root of each version of the file, eg. as returned
+        by XML_File.Get_Version_Roots.
+    * xpath
+      - String, xpath to the node, relative to the roots.
+    * attribute
+      - String, the node attribute to look up.
+    * virtual_path
+      - Optional string, path of the file, for error messages.
+    * xpath_resolver
+      - Optional Xpath_Resolver set up with the version_roots, to
+        batch lookups across multiple calls.
+    '''
+    # Start with patched, to look up the node id.
+    # Values are keyed by python id of the root looked up.
+    root_values = {}
+    xml_node_id = None
+    for version in ['patched','vanilla','current']:
+        root = version_roots[version]
+        if id(root) in root_values:
+            continue
+        if xpath_resolver != None:
+            nodes = xpath_resolver.Get_Nodes(xpath, version)
+        else:
+            nodes = root.xpath(xpath)
+        if len(nodes) > 1:
+            Print('Error: Found {} nodes for file "{}", xpath "{}".'
+                .format(len(nodes), virtual_path, xpath))
+        if not nodes:
+            root_values[id(root)] = ''
+        else:
+            root_values[id(root)] = nodes[0].get(attribute, default = '')
+            if version == 'patched':
+                xml_node_id = XML_Diff.Get_Node_ID(nodes[0])
+                assert xml_node_id
+    return (xpath, attribute, 
+            *[root_values[id(version_roots[version])]
+              for version in ['vanilla','patched','current']],
+            xml_node_id)
+
+
+def _Get_Dependent_Order(items, version):
+    '''
+    Returns a list of the given items and all of their dependents,
+    direct or indirect, for the given version, in topological order
+    (every item ahead of the items that depend on it).
+    Circular dependencies are cut where they are found, rather than
+    looping forever.
+    '''
+    # Build a reverse postorder with an iterative depth first search.
+    order = []
+    seen = set()
+    for root in items:
+        if root in seen:
+            continue
+        seen.add(root)
+        stack = [(root, iter(root.Get_Dependents(version)))]
+        while stack:
+            item, dependents = stack[-1]
+            for dependent in dependents:
+                if dependent not in seen:
+                    seen.add(dependent)
+                    stack.append((dependent, iter(dependent.Get_Dependents(version))))
+                    break
+            else:
+                # All dependents are placed; this item goes ahead of them.
+                stack.pop()
+                order.append(item)
+    order.reverse()
+    return order
+
+
+def Reset_Items(items, version):
+    '''
+    Resets the given version of the values of the items and all of
+    their dependents. All values are cleared first, and then attached
+    displays are updated in dependency order, so that no display
+    recomputes a value from a dependency that is still stale, and
+    each item is reset only once however many paths lead to it.
+    Values are recomputed lazily when read.
+    '''
+    index = version_indices[version]
+    order = _Get_Dependent_Order(items, version)
+    for item in order:
+        item.version_values[index] = None
+    for item in order:
+        item._Update_Displays(version)
+    return
+
 
 class _Base_Item:
     '''
     Base class for Edit_Item and Display_Item objects, representing
     an attribute of an xml node in some file, or else a computation
     for display.
+    Many of these are created for the live editor, so they use slots
+    and share their static display info.
 
     Attributes:
     * parent
@@ -18,12 +251,17 @@ class _Base_Item:
         do any reverse access.
     * name
       - String, internal name of the item.
+    * info
+      - Item_Info holding the display_name, description, read_only,
+        and hidden fields, which are also available as read-only
+        properties of the item.
+      - Shared by all items created with the same fields.
     * display_name
       - Optional string, name to be used during display in the gui or a file.
     * description
       - Optional string, descriptive text for this item.
-    * version_value_dict
-      - Dict of values, keyed by version.
+    * version_values
+      - List of values, indexed by version index (see version_indices).
       - Versions include: ['vanilla','patched','current','edited']
       - These are computed and buffered here.
       - Only 'edited' will be editable; the others are read-only and
@@ -46,17 +284,23 @@ class _Base_Item:
       - Q_Item_Group that points at this item, potentially
         holding multiple Q_Edit_Item and updating them all at once.
     * version_dependents
-      - Dict, keye by version, with lists of Display_Item objects
-        that depend on this item.
+      - List, indexed by version index, with lists of Display_Item
+        objects that depend on this item; None until a dependent
+        is added.
       - When this item is edited or reset, dependents will be
         reset automatically.
       - These should be filled in by the other items when they
-        are set up with dependencies.
-      - Note: avoid circular dependencies, as they might cause lockup.
+        are set up with dependencies, using Add_Dependent.
+      - Note: avoid circular dependencies; resets will cut them, but
+        computed values may be wrong.
       - To be filled in by the owner Edit_Object.
     * hidden
       - Bool, if True then this item should not be displayed.
     '''
+    __slots__ = (
+        'parent', 'name', 'info', 'version_values', 'version_dependents',
+        'widget', 'q_item_group')
+
     def __init__(
             self, 
             parent = None,
@@ -68,14 +312,53 @@ class _Base_Item:
         ):
         self.parent = parent
         self.name = name
-        self.display_name = display_name
-        self.description  = description
-        self.read_only = read_only
-        self.hidden = hidden
+        self.info = _Get_Item_Info(display_name, description, read_only, hidden)
         self.widget = None
         self.q_item_group = None
-        self.version_value_dict = {}
-        self.version_dependents = defaultdict(list)
+        self.version_values = [None, None, None, None]
+        self.version_dependents = None
+
+    # Static fields are read from the shared info.
+    @property
+    def display_name(self):
+        return self.info.display_name
+    @property
+    def description(self):
+        return self.info.description
+    @property
+    def read_only(self):
+        return self.info.read_only
+    @property
+    def hidden(self):
+        return self.info.hidden
+
+
+    def Get_Dependents(self, version):
+        '''
+        Returns a list of dependent items for the given version.
+        The list should not be modified directly.
+        '''
+        if self.version_dependents == None:
+            return []
+        return self.version_dependents[version_indices[version]]
+
+
+    def Add_Dependent(self, version, item):
+        '''
+        Record an item as dependent on this item for the given version.
+        '''
+        if self.version_dependents == None:
+            self.version_dependents = [[], [], [], []]
+        self.version_dependents[version_indices[version]].append(item)
+        return
+
+
+    def Remove_Dependent(self, version, item):
+        '''
+        Remove a dependent item recorded for the given version.
+        '''
+        self.version_dependents[version_indices[version]].remove(item)
+        return
 
 
     def Set_Widget(self, widget):
@@ -96,14 +379,31 @@ class _Base_Item:
     def Reset_Value(self, version):
         '''
         Resets the given version of the value to None, triggering
-        a recompute later. Also resets dependents.
+        a recompute later. Also resets dependents (see Reset_Items).
         If a widget is attached, the 'edited' version of the value
         will be recomputed and sent to the widget.
         If a q_item_group is attached, it will be told to do a fresh
         update.
         '''
-        self.version_value_dict[version] = None
+        Reset_Items([self], version)
+        return
+
+
+    def Reset_Dependents(self, version):
+        '''
+        Resets all items that depend on this item, directly or
+        indirectly, for the given version, but not this item itself.
+        '''
+        if self.Get_Dependents(version):
+            Reset_Items(self.Get_Dependents(version), version)
+        return
+
 
+    def _Update_Displays(self, version):
+        '''
+        Updates any attached widget or q_item_group after the given
+        version of the value was reset.
+        '''
         if self.widget != None and version == 'edited':
             # Update the widget text using setText.
             value = self.Get_Value(version)
@@ -117,9 +417,6 @@ class _Base_Item:
             # other functions (eg. Is_Modified), and does so
             # for all q_items involved.
             self.q_item_group.Update(version)
-
-        for dep in self.version_dependents[version]:
-            dep.Reset_Value(version)
         return
         
     def Init_References(self):
@@ -141,9 +438,12 @@ class Placeholder_Item(_Base_Item):
       - Bool, if True then this placeholder exists simply to add
         a separator to displayed item lists.
     '''
+    __slots__ = ('is_separator',)
+
     def __init__(self, *args, is_separator = False, **kwargs):
+        # Placeholders are always read only.
+        kwargs['read_only'] = True
         super().__init__(*args, **kwargs)
-        self.read_only = True
         self.is_separator = is_separator
 
     # Some dummy functions, so that users don't always have
@@ -169,11 +469,12 @@ class Display_Item(_Base_Item):
       - Can name its dependencies whatever it likes, but their order
         will need to match the dependencies list here.
     * dependency_names
-      - List of strings, names of items this display is dependent on.
+      - Tuple of strings, names of items this display is dependent on.
+      - May be shared with other items of the same macro.
     * version_dependencies
-      - Dict, keyed by version, with lists of Edit_Item and Display_Item
-        objects this item requires for its computations; will be fed to 
-        the function when called.
+      - List, indexed by version index, with lists of Edit_Item and
+        Display_Item objects this item requires for its computations;
+        will be fed to the function when called.
       - When these are reset or edited, they should call Reset on this item.
       - Some entries may be None for when a dependency is not available.
       - To be filled in by the owner Edit_Object.
@@ -187,6 +488,8 @@ class Display_Item(_Base_Item):
       - Allows a displayed term, like 'dps', be back-converted into
         edits of the source items, like 'damage'.
     '''
+    __slots__ = ('display_function', 'dependency_names', 'version_dependencies')
+
     def __init__(
             self, 
             display_function, 
@@ -197,24 +500,33 @@ class Display_Item(_Base_Item):
         super().__init__(read_only = read_only, **kwargs)
         self.display_function = display_function
         self.dependency_names = dependency_names
-        self.version_dependencies = defaultdict(list)
+        self.version_dependencies = [[], [], [], []]
         assert self.read_only
         return
 
 
+    def Get_Dependencies(self, version):
+        '''
+        Returns the list of dependency items for the given version,
+        which may be edited by the owner Edit_Object.
+        '''
+        return self.version_dependencies[version_indices[version]]
+
+
     def Get_Value(self, version):
         '''
         Return the value from the given version, computing it if
         needed.
         '''
+        index = version_indices[version]
         # On first call or after a reset, need to recompute the value.
-        if self.version_value_dict.get(version) == None:
+        if self.version_values[index] == None:
             # Gather values from dependencies, triggering their updates
             # as needed, for the selected version.
             # Missing dependencies will stay as None.
             # TODO: maybe just pass the dependency items directly.
             values = [x.Get_Value(version) if x != None else None
-                        for x in self.version_dependencies[version]]
+                        for x in self.version_dependencies[index]]
             # Pass the values to the display_function.
             # If this has trouble (eg. if bad text was fed in, such as
             #  non-float text when expecting a float), catch that case
@@ -226,8 +538,8 @@ class Display_Item(_Base_Item):
             # Convert None to an empty string.
             if value == None:
                 value = ''
-            self.version_value_dict[version] = value
-        return self.version_value_dict[version]
+            self.version_values[index] = value
+        return self.version_values[index]
     
         
     def Is_Modified(self):
@@ -242,14 +554,14 @@ class Display_Item(_Base_Item):
         '''
         if not self.Get_Value('edited'):
             return False
+        edited_deps = self.Get_Dependencies('edited')
         # Now look for modified dependencies.
         if any(dep.Is_Modified() 
-               for dep in self.version_dependencies['edited']
+               for dep in edited_deps
                if dep != None):
             return True
         # Also check if dependencies differ from the patched version.
-        if (set(self.version_dependencies['patched']) 
-            - set(self.version_dependencies['edited'])):
+        if (set(self.Get_Dependencies('patched')) - set(edited_deps)):
             return True
         return False
 
@@ -263,23 +575,36 @@ class Edit_Item(_Base_Item):
     * game_file
       - The Game_File object that holds the item being edited, in
         its various versions, to be used for the initial init.
-      - This may be from a multiprocessing copy, and will not be
-        kept in case it gets out of sync with transformed xml
-        state.
+      - This will not be kept, in case it gets out of sync with
+        transformed xml state.
+      - May be None if record is given.
+    * record
+      - Optional tuple of (xpath, attribute, vanilla value, patched value,
+        current value, xml_node_id), pre-extracted from the game file
+        versions (eg. by a worker process), to be used instead of
+        parsing the game_file.
+    * xpath_resolver
+      - Optional Xpath_Resolver for the game_file, used to batch the
+        initial lookups with other items.
 
     New attributes:
     * virtual_path
       - Path for the game file being edited.
+      - Read from the key.
     * xpath
       - Full xpath to the node being edited, relative to the file root.
       - Note: the attribute does not have to exist in the node prior
         to editing, for cases where an attribute will be added.
+      - Read from the key.
     * attribute
       - Node attribute being edited.
+      - Read from the key.
     * key
-      - String made from a "name,virtual_path,xpath,attribute", used as
+      - Tuple of (name, virtual_path, xpath, attribute), used as
         a way to identify this item uniquely but generically, for saving
         patches and elsewhere applyling them to xml.
+      - Interned and shared between items with the same fields, and
+        stored once when the item is made.
       - For safety across versions, there is some slight redundancy
         between name and the other fields, but this can allow either
         name or another field to change and the correct item to
@@ -295,6 +620,8 @@ class Edit_Item(_Base_Item):
         item was initialized from.
       - Used to aid in matching to live editor patches from a prior run.
     '''
+    __slots__ = ('key', 'xml_node_id', 'is_reference')
+
     def __init__(
             self,
             game_file,
@@ -303,26 +630,44 @@ class Edit_Item(_Base_Item):
             attribute,
             is_reference = False,
             read_only = False, # Customized default.
+            record = None,
+            xpath_resolver = None,
             **kwargs
         ):
         super().__init__(read_only = read_only, **kwargs)
-        self.virtual_path       = virtual_path
-        self.xpath              = xpath
-        self.attribute          = attribute
+        # Use a shared key with interned strings, since these are
+        # heavily repeated; the path fields are read from it.
+        self.key                = _Get_Item_Key(self.name, virtual_path,
+                                                xpath, attribute)
         self.xml_node_id        = None
         self.is_reference       = is_reference
-        self.key                = '{},{},{},{}'.format(
-            self.name, virtual_path, xpath, attribute)
-        # Just to be safe, there should only be 3 commas, none from
-        # the xpath or attribute.
-        assert self.key.count(',') == 3
+        # Just to be safe, there should be no commas in key fields,
+        # since patches are saved with comma separated keys.
+        assert not any(',' in x for x in self.key)
         # Init the values right away after creation, to get xpath
         # parsing out of the way.
-        self.Init_Values(game_file = game_file)
+        if record != None:
+            self.Init_Values_From_Record(record)
+        else:
+            self.Init_Values(game_file = game_file, 
+                             xpath_resolver = xpath_resolver)
         return
 
 
-    def Refresh_Value_From_File(self, version, game_file = None):
+    # Path fields are read from the shared key.
+    @property
+    def virtual_path(self):
+        return self.key[1]
+    @property
+    def xpath(self):
+        return self.key[2]
+    @property
+    def attribute(self):
+        return self.key[3]
+
+
+    def Refresh_Value_From_File(self, version, game_file = None, 
+                                xpath_resolver = None):
         '''
         Initialize a single version's value.
         For use at creation and after value resets, eg. when the
@@ -333,8 +678,11 @@ class Edit_Item(_Base_Item):
         * game_file
           - Optional Game_File, this will be used instead of a
             fresh Load_File if given.
-          - Added because of multiprocessing wanting to create a new
-            file system otherwise.
+        * xpath_resolver
+          - Optional Xpath_Resolver for the game_file, to use for
+            the node lookup.
+
+        Returns the node the value was taken from, or None if not found.
         '''
         if game_file == None:
             game_file = Load_File(self.virtual_path)
@@ -344,7 +692,10 @@ class Edit_Item(_Base_Item):
         #  such as a patched version adding a node missing from
         #  the vanilla version (eg. a ware with an added production
         #  formula).
-        nodes = game_file.Get_Xpath_Nodes(self.xpath, version = version)
+        if xpath_resolver != None:
+            nodes = xpath_resolver.Get_Nodes(self.xpath, version)
+        else:
+            nodes = game_file.Get_Xpath_Nodes(self.xpath, version = version)
         if len(nodes) > 1:
             Print('Error: Found {} nodes for file "{}", xpath "{}".'
                 .format(len(nodes), self.virtual_path, self.xpath))
@@ -358,30 +709,84 @@ class Edit_Item(_Base_Item):
             value = nodes[0].get(self.attribute, default = '')
 
         # Record it.
-        self.version_value_dict[version] = value
+        self.version_values[version_indices[version]] = value
 
         # Record the patched node for reference, to match up to
         # live_editor saved patches which may have had a different xpath.
         if version == 'patched' and nodes:
-            # There should be an id in the node tail.
-            if not nodes[0].tail:
-                from lxml import etree as ET
-                print('Edit_Item failed a node tail check, ', self.key)
+            # There should be an id attached to the node.
+            self.xml_node_id = XML_Diff.Get_Node_ID(nodes[0])
+            if not self.xml_node_id:
+                print('Edit_Item failed a node id check, ', self.key)
                 print(ET.tostring(nodes[0]))
                 assert False
-            self.xml_node_id = nodes[0].tail
-        return
+        return nodes[0] if nodes else None
 
 
-    def Init_Values(self, game_file):
+    def Update_Value_From_File(self, version, game_file = None, 
+                               xpath_resolver = None):
+        '''
+        Rereads a single version's value from the file, and if it changed,
+        updates dependents, references, and any attached gui items, as
+        for Reset_Value. Returns True if the value changed, else False.
+        Arguments are as for Refresh_Value_From_File.
+        '''
+        if game_file == None:
+            game_file = Load_File(self.virtual_path)
+        index = version_indices[version]
+        old_value = self.version_values[index]
+
+        # When current is known to match patched, its value can be
+        # copied without a lookup.
+        if (version == 'current' and game_file.Current_Matches_Patched()
+        and self.version_values[version_indices['patched']] != None):
+            self.version_values[index] = self.version_values[version_indices['patched']]
+        else:
+            self.Refresh_Value_From_File(version, game_file, xpath_resolver)
+
+        value = self.version_values[index]
+        if value == old_value:
+            return False
+
+        if self.q_item_group != None:
+            self.q_item_group.Update(version)
+        self.Reset_Dependents(version)
+        if self.is_reference:
+            self.parent.Update_Reference(self.name, version, value)
+        return True
+
+
+    def Init_Values(self, game_file, xpath_resolver = None):
         '''
         Do an initial parsing for all values from the source xml.
 
         * game_file
           - The Game_File to pull initial values from.
+        * xpath_resolver
+          - Optional Xpath_Resolver for the game_file.
         '''
-        for version in ['vanilla','patched','current']:
-            self.Refresh_Value_From_File(version, game_file = game_file)
+        # Start with the patched version, and share its value with
+        # the other versions when they are known to match, to save
+        # on xpath lookups (the common case for unpatched files, or
+        # nodes untouched by transforms).
+        patched_node = self.Refresh_Value_From_File(
+            'patched', game_file = game_file, xpath_resolver = xpath_resolver)
+        values = self.version_values
+        patched_value = values[version_indices['patched']]
+
+        if game_file.patched_matches_vanilla:
+            values[version_indices['vanilla']] = patched_value
+        else:
+            self.Refresh_Value_From_File(
+                'vanilla', game_file = game_file, xpath_resolver = xpath_resolver)
+
+        # If the node wasn't found, only a full file match can be used.
+        if game_file.Current_Matches_Patched(patched_node):
+            values[version_indices['current']] = patched_value
+        else:
+            self.Refresh_Value_From_File(
+                'current', game_file = game_file, xpath_resolver = xpath_resolver)
+
         # The edited value will copy from patched for now.
         # TODO: think about pre-edit transforms and how to capture
         #  their values, such that patch creation knows when this node
@@ -393,7 +798,24 @@ class Edit_Item(_Base_Item):
         # Consider adding a 5th version, partially transformed; the
         #  xml will need a way to track this (eg. forking xml game
         #  files when live editor patches are applied).
-        self.version_value_dict['edited'] = self.version_value_dict['patched']
+        values[version_indices['edited']] = values[version_indices['patched']]
+        return
+
+
+    def Init_Values_From_Record(self, record):
+        '''
+        Fill in initial values from a pre-extracted record, as an
+        alternative to Init_Values.
+
+        * record
+          - Tuple of (xpath, attribute, vanilla value, patched value,
+            current value, xml_node_id).
+        '''
+        xpath, attribute, vanilla, patched, current, xml_node_id = record
+        # Sanity check that the record was made for this item.
+        assert xpath == self.xpath and attribute == self.attribute
+        self.version_values = [vanilla, patched, current, patched]
+        self.xml_node_id = xml_node_id
         return
 
 
@@ -405,8 +827,7 @@ class Edit_Item(_Base_Item):
         '''
         # Update the parent object reference, if needed.
         if self.is_reference:
-            for version in version_names:
-                value = self.version_value_dict[version]
+            for version, value in zip(version_names, self.version_values):
                 self.parent.Update_Reference(self.name, version, value)
         return
 
@@ -415,8 +836,9 @@ class Edit_Item(_Base_Item):
         '''
         Return the value from the given version.
         '''
+        index = version_indices[version]
         # On first call or after a reset, need to recheck the value.
-        if self.version_value_dict.get(version) == None:
+        if self.version_values[index] == None:
 
             if version == 'edited':
                 # The edited value will initialize to the patched version.
@@ -424,16 +846,16 @@ class Edit_Item(_Base_Item):
                 #  got messy with display items that couldn't do calculations
                 #  off of blank input. Also, that style wouldn't pick up on
                 #  deleted attributes very well.
-                self.version_value_dict[version] = self.Get_Value('patched')
+                self.version_values[index] = self.Get_Value('patched')
             else:
                 self.Refresh_Value_From_File(version)
 
             # Update the parent object reference, if needed.
             if self.is_reference:
                 self.parent.Update_Reference(self.name, version, 
-                                             self.version_value_dict[version])
+                                             self.version_values[index])
 
-        return self.version_value_dict[version]
+        return self.version_values[index]
     
 
     def Get_Edited_Value(self):
@@ -452,11 +874,30 @@ class Edit_Item(_Base_Item):
         If self.is_reference, this also updates the parent object
         references.
         '''
-        self.version_value_dict[version] = value
-        for dep in self.version_dependents[version]:
-            dep.Reset_Value(version)
+        self.version_values[version_indices[version]] = value
+        self.Reset_Dependents(version)
         if self.is_reference:
             self.parent.Update_Reference(self.name, version, value)
+        self._Note_Edit(version)
+        return
+
+
+    def Reset_Value(self, version):
+        '''
+        As _Base_Item.Reset_Value, also noting possible edits.
+        '''
+        super().Reset_Value(version)
+        self._Note_Edit(version)
+        return
+
+
+    def _Note_Edit(self, version):
+        '''
+        If the version affects Is_Modified, tell the parent object
+        this item may have a changed edit.
+        '''
+        if version in ('edited', 'patched') and self.parent != None:
+            self.parent.Note_Item_Edit(self)
         return
 
 
@@ -1,10 +1,12 @@
 
 import inspect
+from functools import lru_cache
 from collections import OrderedDict, defaultdict
 from collections import namedtuple
 
 from .Edit_Items import Edit_Item, Display_Item, Placeholder_Item
-from .Edit_Items import version_names
+from .Edit_Items import Xpath_Resolver
+from .Edit_Items import version_names, Reset_Items
 
 # Macro tuples for aiding in construction of items.
 # TODO: maybe convert to classes, to make it easier to copy base
@@ -43,6 +45,15 @@ Item_Group_Macro = namedtuple('Item_Group_Macro',
     defaults = ['','',''])
 
 
+@lru_cache(maxsize = None)
+def _Get_Dependency_Names(display_function):
+    '''
+    Returns a tuple of the argument names of a display function, shared
+    by all Display_Items using it.
+    '''
+    return tuple(inspect.signature(display_function).parameters)
+
+
 class Edit_Object:
     '''
     An object represented by a collection of Edit_Items and Display_Items,
@@ -104,6 +115,16 @@ class Edit_Object:
         return
 
 
+    def Note_Item_Edit(self, item):
+        '''
+        Called by owned Edit_Items when their edited value may have
+        changed, passing the note along to the Live_Editor, if attached.
+        '''
+        if self.parent != None:
+            self.parent.Note_Item_Edit(item)
+        return
+
+
     def Update_Reference(self, item_name, version, ref_name):
         '''
         Update the reference to another edit object, overwriting
@@ -113,9 +134,14 @@ class Edit_Object:
         # if there is a problem (eg. the user typed in an invalid name).
         ref_object = self.parent.Get_Object(ref_name)
         # Record it. Note: if not found, this clears the prior ref.
-        self.item_version_object_refs[item_name][version] = ref_object
-        # Update dependencies of display items.
-        self.Update_Item_Dependencies(version)
+        refs = self.item_version_object_refs[item_name]
+        # Skip if nothing changed, eg. when a value is reread.
+        if version in refs and refs[version] is ref_object:
+            return
+        refs[version] = ref_object
+        # Update dependencies of display items that may look up
+        # items through references.
+        self.Update_Item_Dependencies(version, ref_dependent_only = True)
         return
 
 
@@ -142,49 +168,68 @@ class Edit_Object:
         return
 
 
-    def Update_Item_Dependencies(self, version):
+    def Update_Item_Dependencies(self, version, ref_dependent_only = False):
         '''
         Updates dependencies for owned display items, primarily for use
         at startup and when references change.
+        Links are only changed for display items whose dependencies
+        were changed, and those items (and their dependents) are reset.
+
+        * ref_dependent_only
+          - Bool, if True then only display items with dependencies
+            not found locally (eg. looked up through references)
+            are checked.
         '''
-        # First, delink all dependencies, to prune dependent lists.
-        # Eg. don't want an old dependency to think a local display
-        # item is still dependent on it.
+        changed_items = []
         for item in self.Get_Items():
             # Only looking to update display items.
             if not isinstance(item, Display_Item):
                 continue
-
-            # Loop over its existing dependencies, if any.
-            for dep in item.version_dependencies[version]:
-                if dep != None:
-                    # Delink from that item.
-                    dep.version_dependents[version].remove(item)
-
-            # Now clear the list.
-            item.version_dependencies[version].clear()
-
-
-        # Now do a pass to fill in deps, both directions.
-        for item in self.Get_Items():
-            # Only looking to update display items.
-            if not isinstance(item, Display_Item):
+            # Skip items that only use local items, if requested.
+            if ref_dependent_only and all(
+                    self.Get_Item(dep_name, allow_refs = False) != None
+                    for dep_name in item.dependency_names):
                 continue
+            if self._Link_Display_Item(item, version):
+                changed_items.append(item)
 
-            # Loop over the dep item names.
-            for dep_name in item.dependency_names:
-
-                # Look up the item; this may be from a reference.
-                dep_item = self.Get_Item(dep_name, version)
+        # Reset the changed items together, so shared dependents are
+        # only reset once.
+        if changed_items:
+            Reset_Items(changed_items, version)
+        return
 
-                # Record it, even if None.
-                item.version_dependencies[version].append(dep_item)
 
-                # If not none, add the dependent link.
-                if dep_item != None:
-                    dep_item.version_dependents[version].append(item)
+    def _Link_Display_Item(self, item, version):
+        '''
+        Looks up the dependencies of a display item for the given version,
+        updating links in both directions if any changed.
+        Returns True if the dependencies changed, else False.
+        '''
+        # Look up the items; these may be from a reference.
+        # Record them, even if None.
+        new_deps = [self.Get_Item(dep_name, version)
+                    for dep_name in item.dependency_names]
+        dependencies = item.Get_Dependencies(version)
+
+        # Check for a match, by identity.
+        if (len(new_deps) == len(dependencies)
+        and all(x is y for x, y in zip(new_deps, dependencies))):
+            return False
+
+        # Delink from old dependencies, to prune dependent lists.
+        # Eg. don't want an old dependency to think a local display
+        # item is still dependent on it.
+        for dep in dependencies:
+            if dep != None:
+                dep.Remove_Dependent(version, item)
 
-        return
+        # Fill in the new dependencies, with dependent links.
+        dependencies[:] = new_deps
+        for dep in new_deps:
+            if dep != None:
+                dep.Add_Dependent(version, item)
+        return True
 
 
     def Get_Items(self, allow_placeholders = False):
@@ -289,7 +334,8 @@ class Edit_Object:
             game_file,
             macro_list,
             xpath_prefix = '',
-            xpath_replacements = None
+            xpath_replacements = None,
+            item_records = None,
         ):
         '''
         Creates and records a list of Edit_Items and Display_Items
@@ -316,11 +362,25 @@ class Edit_Object:
             same macro.
           - Also useful for files which hold multiple objects, to
             be able to insert a per-object xpath prefix.
+        * item_records
+          - Optional dict, keyed by item name, holding pre-extracted
+            Edit_Item records (see Get_Item_Record), eg. from worker
+            processes.
+          - When given, no xpaths are checked against the game_file;
+            Edit_Item_Macros without a record become placeholders.
+          - Item_Group_Macros are not supported in this mode.
+
+        Item xpaths are looked up through a shared Xpath_Resolver, so
+        that the object's node is found once per version and item
+        lookups continue from it.
         '''
         # If there is an initial xpath prefix given, use it to pick
         #  out the starting node, else use root.
         xml_node = game_file.Get_Root_Readonly()
-        if xpath_prefix:
+        if item_records != None:
+            # Nodes aren't needed when working from records.
+            xml_node = None
+        elif xpath_prefix:
             test_nodes = xml_node.xpath(xpath_prefix)
             if len(test_nodes) == 1:
                 xml_node = test_nodes[0]
@@ -332,6 +392,11 @@ class Edit_Object:
                 # Just consider this an error for now.
                 raise AssertionError('Make_Items was given a bad xpath_prefix.')
 
+        # Set up batched lookups for this call, when reading the file.
+        xpath_resolver = None
+        if item_records == None:
+            xpath_resolver = Xpath_Resolver(game_file)
+
         # Bounce to the recursive function, unpacking the initial
         # root node.
         self._Make_Items_Recursive(
@@ -341,7 +406,9 @@ class Edit_Object:
             xpath_prefix = xpath_prefix,
             # Copy the list, so the function can pop items off it privately.
             macro_list = list(macro_list),
-            xpath_replacements = xpath_replacements )
+            xpath_replacements = xpath_replacements,
+            item_records = item_records,
+            xpath_resolver = xpath_resolver )
         return
 
     
@@ -353,7 +420,9 @@ class Edit_Object:
             name_prefix         = '',
             xpath_prefix        = '',
             display_name_prefix = '',
-            xpath_replacements  = None
+            xpath_replacements  = None,
+            item_records        = None,
+            xpath_resolver      = None,
         ):
         '''
         Recursive item builder. This will call itself when dealing
@@ -374,6 +443,12 @@ class Edit_Object:
           - String, prefix to apply to any item display names.
         * xpath_replacements
           - Dict of xpath term replacements.
+        * item_records
+          - Optional dict of pre-extracted Edit_Item records, keyed
+            by item name.
+        * xpath_resolver
+          - Xpath_Resolver for the game_file, used for item lookups
+            when not using item_records.
         '''
         # To deal with macro groups, this will pop off macros as they are
         # consumed, where groups pop off all macros in their group
@@ -408,6 +483,8 @@ class Edit_Object:
 
             # Deal with the macros based on type.
             if isinstance(macro, Item_Group_Macro):
+                # Records are not set up to handle groups.
+                assert item_records == None
 
                 # Collect the following macros up until the group closer,
                 # which is the same name prefixed with '/'.
@@ -452,6 +529,7 @@ class Edit_Object:
                         xpath_prefix        = child_xpath_prefix,
                         name_prefix         = name + extension,
                         display_name_prefix = display_name + extension,
+                        xpath_resolver      = xpath_resolver,
                         )
             
             elif isinstance(macro, Edit_Item_Macro):
@@ -463,8 +541,18 @@ class Edit_Object:
                 #  valid for only one version of the filep; perhaps an
                 #  Edit_Item should always be created, and it will just
                 #  deal with missing nodes internally.
-                nodes = xml_node.xpath(xpath)
-                if not nodes:
+                # With records, the node was found if a record exists.
+                if item_records != None:
+                    record = item_records.get(name)
+                    found = record != None
+                else:
+                    # Check the current version using the full xpath,
+                    # which will share prefix lookups with other items
+                    # and with the value lookups.
+                    record = None
+                    found = bool(xpath_resolver.Get_Nodes(abs_xpath, 'current'))
+
+                if not found:
                     self.Add_Item( Placeholder_Item(
                         parent       = self,
                         name         = name,
@@ -486,6 +574,8 @@ class Edit_Object:
                         read_only    = macro.read_only,
                         is_reference = macro.is_reference,
                         hidden       = macro.hidden,
+                        record       = record,
+                        xpath_resolver = xpath_resolver,
                         ))
 
             else:                
@@ -493,8 +583,7 @@ class Edit_Object:
                 # Parse dependencies from the function arg names.
                 # Note: these could come from other Edit_Objects, found
                 #  through a reference.
-                dependency_names = [
-                    x for x in inspect.signature(macro.display_function).parameters]
+                dependency_names = _Get_Dependency_Names(macro.display_function)
                                 
                 # Create the item.
                 self.Add_Item( Display_Item(
@@ -65,6 +65,18 @@ class Edit_Table:
       - Each row holds Edit_Item and Display_Item objects (or None) taken from
         the Edit_Object used for that row.
       - Intended for easing display code.
+      - Versions with the same references may share a table.
+    * column_schema
+      - Tuple of (list of item names, list of reference item names),
+        for the columns taken from the table objects themselves.
+      - Versions only differ in their referenced objects, so this is
+        found once and shared by all versions.
+      - None until first needed.
+    * version_ref_signatures
+      - Dict, keyed by version, holding tuples of the referenced objects
+        of each row when the version's table was built.
+      - If the references no longer match (eg. a reference item was
+        edited), the version's table will be rebuilt.
     '''
     '''
     TODO: maybe split out headers.
@@ -76,6 +88,8 @@ class Edit_Table:
         self.name = name
         self.object_view_list = []
         self.version_table_dict = {}
+        self.column_schema = None
+        self.version_ref_signatures = {}
         return
 
 
@@ -84,6 +98,8 @@ class Edit_Table:
         Attach an Object_View to this table.
         '''
         self.object_view_list.append(object_view)
+        # Any prior tables are missing this object.
+        self.Reset_Table()
         return
 
 
@@ -93,7 +109,10 @@ class Edit_Table:
         This may be useful as a way of dealing with changed object
         references.
         '''
-        self.table = None
+        self.version_table_dict.clear()
+        self.version_ref_signatures.clear()
+        self.column_schema = None
+        return
 
 
     def Get_Table(self, version = 'current', rebuild = False):
@@ -103,155 +122,189 @@ class Edit_Table:
         Columns unused by any object will be pruned out.
         The 'description' field will be automatically skipped.
         Generated tables are cached; avoid editing the returned table.
+        Cached tables are rebuilt if the objects' references for the
+        version have changed.
 
         * version
           - String, version of the items to use for evaluating references.
           - Defaults to 'current'.
         '''
-        if version not in self.version_table_dict or rebuild:
-            
-            # This gets a little tricky to pick out what to print, and
-            # in what order, once references get involved. Some objects
-            # may have missing references, others may ref objects with
-            # differing fields, and there may be multiple refs for
-            # an object that have overlapping fields.
-            # Display of a single object is straightforward, but merging
-            # multiple displays onto the same table can be quirky.
-
-            # To get something working, just assume that all objects will
-            # have references of the same types, and hence will have
-            # matching fields.
-
-            #-Removed; this doesn't work well when objects have potentially
-            # differing items or multiple refs.
-            ## Collect lists of items from each object.
-            #for object in self.objects_dict.values():
-            #    # Grab the items for this version.
-            #    items = object.Get_Display_Version_Items_Dict(
-            #        version = version,
-            #        # The descriptions can be long, so skip them.
-            #        skipped_item_names = ['description']
-            #        )[version]
-            #    # Add to the table.
-            #    table.append(items)
-            #    
-            ## If for some reason tables are not the same size, pad them out,
-            ##  to catch cases where one object has a reference that another
-            ##  is missing.
-            ## Also sample the first full row to get labels.
-            ## TODO: maybe do something smarter; this will only work well
-            ## if there is a single reference that is sometimes missing.
-            #num_columns = max(len(x) for x in table)
-            #labels = None
-            #for row in table:
-            #    # Get labels from a full row.
-            #    if labels == None and len(row) == num_columns:
-            #        labels = [x.display_name for x in row]
-            #    # Pad out the row with a simple loop.
-            #    while len(row) < num_columns:
-            #        row.append(None)
-
-            # Unpack the object views to get edit objects.
-            # TODO: maybe always work with edit objects.
-            edit_objects = [x.edit_object for x in self.object_view_list]
+        if rebuild:
+            self.Reset_Table()
+
+        # This gets a little tricky to pick out what to print, and
+        # in what order, once references get involved. Some objects
+        # may have missing references, others may ref objects with
+        # differing fields, and there may be multiple refs for
+        # an object that have overlapping fields.
+        # Display of a single object is straightforward, but merging
+        # multiple displays onto the same table can be quirky.
+        # Here, columns of the objects themselves are found once, and
+        # columns of each reference are found from whichever objects
+        # are referenced in this version.
             
-            # Build up the table by working through the object in parallel.
-            # References will be unpacked in a matched order, with any
-            # object that is missing a ref having it filled with None
-            # entries.
-            table = self._Get_Object_Group_Items(edit_objects)
-
-
-            # Find all inter-object references.
-            # Note: this will order the refs according to object search
-            # order, then its item order, so it could be out of sync
-            # with the original reference items if some objects are
-            # missing those ref items.
-            reference_item_names = []
-            for object in edit_objects:
-                for item in object.Get_Items():
-                    name = item.name
-                    if item.Is_Reference() and name not in reference_item_names:
-                        reference_item_names.append(name)
-                        
-            # Set up padding between refs.
-            padding = Placeholder_Item(display_name = '', is_separator = True)
-
-            # Go through them, in order.
-            for ref_name in reference_item_names:
-
-                # Collect the referenced objects.
-                ref_objects = []
-                for object in edit_objects:
-                    ref_objects.append( object.Get_Reference(ref_name, version))
-
-                # Collect items from the objects.
-                ref_table = self._Get_Object_Group_Items(ref_objects)
-
-                # Add to the base table.
-                # Note: these rows extend the base rows.
-                for base_item_row, ref_item_row in zip(table, ref_table):
-                    # Create a padding column.
-                    base_item_row.append(padding)
-                    base_item_row += ref_item_row
-                     
-                
-            # Collect the column labels, for convenience.
-            # These are display names, so differ from field names.
-            # Since some column entries can be None, this will search
-            # each column to find a non-None and get its label.
-            # Also, to verify, this will ensure all the column labels
-            # match across items.
-            labels = []
-            for col in range(len(table[0])):
-                label_set = set()
-                for row_items in table:
-                    item = row_items[col]
-                    if item != None:
-                        label_set.add(item.display_name)
-                # There should have been just one label found.
-                assert len(label_set) == 1
-                labels.append(label_set.pop())
+        # Unpack the object views to get edit objects.
+        # TODO: maybe always work with edit objects.
+        edit_objects = [x.edit_object for x in self.object_view_list]
+
+        if self.column_schema == None:
+            self.column_schema = self._Get_Column_Schema(edit_objects)
+        item_fields, reference_item_names = self.column_schema
+
+        # Collect the referenced objects, per reference name.
+        # These are the only part of the table that depends on version.
+        signature = tuple(
+            tuple(object.Get_Reference(ref_name, version) 
+                  for object in edit_objects)
+            for ref_name in reference_item_names)
+
+        # Reuse a cached table if the references still match.
+        if self.version_ref_signatures.get(version) == signature:
+            return self.version_table_dict[version]
+
+        # Reuse a table from another version with the same references,
+        # eg. when vanilla and patched refs are the same.
+        table = None
+        for other_version, other_signature in self.version_ref_signatures.items():
+            if other_signature == signature:
+                table = self.version_table_dict[other_version]
+                break
+
+        if table == None:
+            table = self._Build_Table(edit_objects, item_fields, 
+                                      reference_item_names, signature)
+
+        # Store the table.
+        self.version_table_dict[version] = table
+        self.version_ref_signatures[version] = signature
+        return table
+
+
+    def Get_Value_Table(self, version = 'current'):
+        '''
+        Returns a list of lists holding the column labels and then
+        the item values of the given version, with empty strings
+        where no item was available. This is a fresh table, which
+        may be edited.
+
+        * version
+          - String, version of the references and values to use.
+          - Defaults to 'current'.
+        '''
+        return list(self.Gen_Value_Rows(version))
+
+
+    def Gen_Value_Rows(self, version = 'current'):
+        '''
+        Generates rows as in Get_Value_Table, one at a time, so that
+        values are only gathered as they are consumed.
+        '''
+        item_table = self.Get_Table(version = version)
+        # Copy over the headers.
+        yield list(item_table[0])
+        for row in item_table[1:]:
+            yield ['' if item == None else item.Get_Value(version)
+                   for item in row]
+        return
+
+
+    def _Get_Column_Schema(self, edit_objects):
+        '''
+        Returns a tuple of (item names, reference item names) for the
+        given objects, as used for the table columns.
+        '''
+        item_fields = self._Get_Group_Fields(edit_objects)
+
+        # Find all inter-object references.
+        # Note: this will order the refs according to object search
+        # order, then its item order, so it could be out of sync
+        # with the original reference items if some objects are
+        # missing those ref items.
+        reference_item_names = []
+        for object in edit_objects:
+            for item in object.Get_Items():
+                name = item.name
+                if item.Is_Reference() and name not in reference_item_names:
+                    reference_item_names.append(name)
+        return item_fields, reference_item_names
 
 
-            # Go through the constructed table and find columns that
-            # don't have meaningful data, to prune them.
-            # Note: this comes up when there are Placeholder items present.
-            indices_to_remove = []
-            for index in range(len(labels)):
+    def _Build_Table(self, edit_objects, item_fields, 
+                     reference_item_names, signature):
+        '''
+        Builds and returns a new table, with the column labels as the
+        first row. Columns are filled one at a time, checking labels
+        and usage in the same pass.
+        '''
+        # Set up padding between refs.
+        padding = Placeholder_Item(display_name = '', is_separator = True)
 
+        # Gather the columns, as lists of items, with their labels.
+        # Columns without meaningful data are skipped.
+        columns = []
+        labels  = []
+        
+        # Build up the columns by working through the objects in parallel.
+        # References will be unpacked in a matched order, with any
+        # object that is missing a ref having it filled with None
+        # entries.
+        column_groups = [(edit_objects, item_fields)]
+        for ref_objects in signature:
+            column_groups.append((ref_objects, self._Get_Group_Fields(ref_objects)))
+
+        for group_index, (objects, fields) in enumerate(column_groups):
+            # Create a padding column ahead of each reference.
+            if group_index > 0:
+                columns.append([padding] * len(edit_objects))
+                labels.append(padding.display_name)
+
+            for field in fields:
+                # Make sure items come from the object itself,
+                # not a ref (to be safe).
+                column = [None if object == None 
+                          else object.Get_Item(field, allow_refs = False)
+                          for object in objects]
+
+                # Collect the column label, and note if the column is used.
+                # These are display names, so differ from field names.
                 # Consider it unused if all items are Placeholder_Items
                 # or None. Leave other items in place, even if they
                 # are valueless, in case this table is ever used for
                 # display and editing. Leave placeholder separators in place.
-                if all(row[index] == None 
-                       or (isinstance(row[index], Placeholder_Item)
-                           and not row[index].is_separator)
-                       for row in table):
-                    indices_to_remove.append(index)
-
-            # Removal done on second pass.
-            # Go from last to first, so the earlier indexes aren't
-            # getting shifted.
-            for index in reversed(indices_to_remove):
-                for row in table:
-                    del(row[index])
-                del(labels[index])
-                       
-            # Insert labels to be the new first row.
-            table.insert(0, labels)
-
-            # Store the table.
-            self.version_table_dict[version] = table
-        return self.version_table_dict[version]
-
-
-    def _Get_Object_Group_Items(self, object_list):
+                # Note: this comes up when there are Placeholder items present.
+                label_set = set()
+                used = False
+                for item in column:
+                    if item == None:
+                        continue
+                    label_set.add(item.display_name)
+                    if (not used 
+                    and (not isinstance(item, Placeholder_Item)
+                         or item.is_separator)):
+                        used = True
+                if not used:
+                    continue
+                # To verify, there should have been just one label found.
+                assert len(label_set) == 1
+                columns.append(column)
+                labels.append(label_set.pop())
+
+        # Flip the columns into rows, with labels as the new first row.
+        table = [labels]
+        if columns:
+            table += [list(row) for row in zip(*columns)]
+        else:
+            table += [[] for x in edit_objects]
+        return table
+
+
+    def _Get_Group_Fields(self, object_list):
         '''
-        From the given list of objects, select the items to be included,
-        and align them so that names match.
-        Returns a list of lists of items, or None entries for padding.
-        All items in a column will be from the same field name.
+        From the given list of objects, select the item names to be
+        included, ordered so that names from different objects
+        interleave sensibly.
+        Returns a list of item names. None entries in the object
+        list are skipped.
         '''
         # If objects have different field amounts, they will be sync'd
         # up here to pad them out so that all objects get entries
@@ -265,6 +318,8 @@ class Edit_Table:
         # Start by gathering the fields, in some sort of order.
         # This assumes they are all uniquely named.
         item_fields = []
+        # Set of the same names, for fast checks.
+        known_fields = set(skipped_item_names)
         # The best way to shuffle these together is unclear, but this
         # will aim to do one object at a time, and do field insertions
         # when a new field is encountered, placing it after the
@@ -279,13 +334,10 @@ class Edit_Table:
             for item in object.Get_Items():
                 name = item.name
 
-                # Skip names as requested.
-                if name in skipped_item_names:
-                    continue
-
-                # Skip if the name is known.
-                if name in item_fields:
+                # Skip if the name is known or skipped.
+                if name in known_fields:
                     continue
+                known_fields.add(name)
 
                 # If there is a prior name, look for it.
                 # (Note: this doesn't work so well when there is no
@@ -303,21 +355,4 @@ class Edit_Table:
                 # Update the prior_name for next iteration.
                 prior_name = name
 
-
-        # With the item names sorted out, can now do a pass to fill
-        # in the items.
-        table = []
-        for object in object_list:
-            row = []
-            table.append(row)
-
-            for field in item_fields:
-                if object == None:
-                    item = None
-                else:
-                    # Make sure it comes from the object itself,
-                    # not a ref (to be safe).
-                    item = object.Get_Item(field, allow_refs = False)
-                row.append(item)
-
-        return table
\ No newline at end of file
+        return item_fields
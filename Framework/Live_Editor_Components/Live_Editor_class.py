@@ -3,8 +3,8 @@ from collections import namedtuple, defaultdict
 import json
 
 from ..Common import Settings, Print
-from .Edit_Items import Edit_Item, Display_Item
-from ..File_Manager import Load_File
+from .Edit_Items import Edit_Item, Display_Item, Xpath_Resolver
+from ..File_Manager import Load_File, XML_Diff, File_System
 
 
 from functools import wraps
@@ -38,6 +38,9 @@ class Custom_Patch:
     * value
     * xml_node_id
     '''
+    __slots__ = ('name', 'virtual_path', 'xpath', 'attribute', 
+                 'value', 'xml_node_id')
+
     def __init__(self, name, virtual_path, xpath, attribute, value, xml_node_id = None):
         self.name = name
         self.virtual_path = virtual_path
@@ -48,20 +51,19 @@ class Custom_Patch:
 
     def Get_Item_Key(self):
         '''
-        Returns a key with (name,virtual_path,xpath,attribute).
+        Returns a key tuple with (name,virtual_path,xpath,attribute),
+        matching Edit_Item keys.
         '''
-        return '{},{},{},{}'.format(
-            self.name, self.virtual_path, self.xpath, self.attribute)
+        return (self.name, self.virtual_path, self.xpath, self.attribute)
 
     def Get_Node_ID_Key(self):
         '''
-        Returns a key with (virtual_path,xml_node_id,attribute), or
+        Returns a key tuple with (virtual_path,xml_node_id,attribute), or
         None if the xml_node_id is not filled in.
         '''
         if self.xml_node_id == None:
             return None
-        return '{},{},{}'.format(
-                self.virtual_path, self.xml_node_id, self.attribute) 
+        return (self.virtual_path, self.xml_node_id, self.attribute)
 
     def Update_From_Item(self, item):
         '''
@@ -111,8 +113,8 @@ class Live_Editor_class:
     * patches_key_dict
       - Dict holding patch values, loaded from a prior run or
         updated with current changes.
-      - Key is taken from item keys, eg. (name, virtual_path, xpath, attribute),
-        formed this way to make json save/load easier.
+      - Key is taken from item keys, a tuple of (name, virtual_path,
+        xpath, attribute); saved to json as comma joined strings.
       - To be checked and applied whenever an Edit_Object is added,
         and updated before writing out to json.
     * patches_node_id_dict
@@ -123,6 +125,21 @@ class Live_Editor_class:
       - During runtime, this dict may get out of date (holding deleted
         patches and similar), but any such discrepencies should be
         harmless as long as the patches_key_dict is checked first.
+    * patch_virtual_paths
+      - Set of virtual paths targeted by any patch in the above dicts,
+        used to skip patch matching for items of other files.
+      - Like patches_node_id_dict, this is not pruned when patches
+        are removed.
+    * object_name_dict
+      - Dict, keyed by object name, holding all Edit_Objects from
+        category_objects_dict, for fast lookups and name checks.
+    * edited_items
+      - Set of Edit_Items whose edited value may have changed since the
+        last Update_Patches, as noted by the items.
+    * patch_node_id_cache
+      - Dict, keyed by virtual_path, holding tuples of (patched root,
+        dict of xml_node_id keyed by xpath), for patch node lookups.
+      - Entries are rebuilt when the file's patched root changes.
     '''
     def __init__(self):
         self.category_objects_dict = defaultdict(dict)
@@ -131,6 +148,10 @@ class Live_Editor_class:
         self.tree_view_builders = {}
         self.patches_key_dict = {}
         self.patches_node_id_dict = {}
+        self.patch_virtual_paths = set()
+        self.object_name_dict = {}
+        self.edited_items = set()
+        self.patch_node_id_cache = {}
         self.init_complete = False
         return
 
@@ -149,6 +170,7 @@ class Live_Editor_class:
         # Leave patches alone; want their state to be kept.
         # Only really need to reset objects and tree views.
         self.category_objects_dict .clear()
+        self.object_name_dict      .clear()
         self.tree_view_dict        .clear()
         return
 
@@ -181,13 +203,13 @@ class Live_Editor_class:
         was added from outside the expected builder function.
         '''
         # Verify there is no name collision in any category.
-        if not all(edit_object.name not in x 
-                   for x in self.category_objects_dict.values()):
+        if edit_object.name in self.object_name_dict:
             raise AssertionError(('Object name "{}" is already in use')
                                  .format(edit_object.name))
 
         # Record to the given category.
         self.category_objects_dict[category][edit_object.name] = edit_object
+        self.object_name_dict[edit_object.name] = edit_object
 
         # Fill its category and parent attributes.
         edit_object.category = category
@@ -202,17 +224,16 @@ class Live_Editor_class:
         # xpaths, support matching based on one or the other of those
         # terms.
         for item in edit_object.Get_Items():
-            # Skip if not an Edit_Item.
-            if not isinstance(item, Edit_Item):
+            # Skip if not an Edit_Item, or no patches target its file.
+            if (not isinstance(item, Edit_Item)
+            or item.virtual_path not in self.patch_virtual_paths):
                 continue
 
             # Check the key.
             # Do this two ways, first using the item key as a primary check,
             # then do a backup check for node ids (for protection against
             # version changes).
-            node_id_key = '{},{},{}'.format(item.virtual_path, 
-                                            item.xml_node_id, 
-                                            item.attribute)
+            node_id_key = (item.virtual_path, item.xml_node_id, item.attribute)
 
             patch = None
             if item.key in self.patches_key_dict:
@@ -238,10 +259,16 @@ class Live_Editor_class:
         '''
         Returns an Edit_Object of the given name, or None if not found.
         '''
-        for subdict in self.category_objects_dict.values():
-            if name in subdict:
-                return subdict[name]
-        return None
+        return self.object_name_dict.get(name)
+
+
+    def Note_Item_Edit(self, item):
+        '''
+        Record an Edit_Item as possibly having a changed edit, to be
+        checked on the next Update_Patches.
+        '''
+        self.edited_items.add(item)
+        return
 
 
     def Record_Tree_View_Builder(self, name, build_function):
@@ -295,8 +322,13 @@ class Live_Editor_class:
         # gathering fails.
         if not self.category_objects_dict[category] or rebuild:
             self.Delayed_Init()
+            # Bring patches up to date with any edits of the objects
+            #  being replaced, so the new objects will pick them up.
+            self.Update_Patches()
             # Set up a category for the objects, also clearing
             #  out any existing objects.
+            for name in self.category_objects_dict[category]:
+                self.object_name_dict.pop(name, None)
             self.category_objects_dict[category] = {}
 
             # Add the objects in.
@@ -321,6 +353,7 @@ class Live_Editor_class:
         '''
         For all items, resets their 'current' value to force an update.
         For use when plugins have run since the items were gathered.
+        Consider using Refresh_Current_Item_Values instead.
         '''
         for item in self.Gen_Items():
             item.Reset_Value('current')
@@ -329,6 +362,40 @@ class Live_Editor_class:
         return
 
 
+    def Refresh_Current_Item_Values(self):
+        '''
+        Updates the 'current' value of items bound to files that the
+        File_System reports as changed, eg. by a script run since
+        the last refresh. Items whose value is unchanged are left alone,
+        without resetting dependents or gui displays.
+        Returns the number of items with changed values.
+        '''
+        changed_paths = File_System.Get_Changed_Virtual_Paths()
+        if not changed_paths:
+            return 0
+
+        # Batch lookups per file.
+        path_resolvers = {}
+        num_changed = 0
+        for item in self.Gen_Items():
+            if (not isinstance(item, Edit_Item) 
+            or item.virtual_path not in changed_paths):
+                continue
+
+            xpath_resolver = path_resolvers.get(item.virtual_path)
+            if xpath_resolver == None:
+                game_file = Load_File(item.virtual_path)
+                xpath_resolver = Xpath_Resolver(game_file)
+                path_resolvers[item.virtual_path] = xpath_resolver
+
+            if item.Update_Value_From_File(
+                    'current', 
+                    game_file = xpath_resolver.game_file, 
+                    xpath_resolver = xpath_resolver):
+                num_changed += 1
+        return num_changed
+
+
     def Update_Patches(self):
         '''
         Updates the loaded patches, adding/updating any new ones from
@@ -337,11 +404,12 @@ class Live_Editor_class:
 
         This will only modify the patches_key_dict, while the
         patches_node_id_dict will be allowed to get out of sync.
+
+        Only items noted in edited_items are checked.
         '''
-        for item in self.Gen_Items():
-            # Skip non-edit items.
-            if not isinstance(item, Edit_Item):
-                continue
+        edited_items = self.edited_items
+        self.edited_items = set()
+        for item in edited_items:
 
             # Check for modified Edit_Item objects.
             # Note: at this point patches should be in sync with
@@ -363,6 +431,7 @@ class Live_Editor_class:
                         value        = item.Get_Edited_Value(),
                         xml_node_id  = item.xml_node_id,
                         )                                       
+                    self.patch_virtual_paths.add(item.virtual_path)
 
             # When not modified, delete any old patch for this item.
             elif item.key in self.patches_key_dict:
@@ -400,7 +469,8 @@ class Live_Editor_class:
                             key = lambda x: (x.virtual_path, x.xpath, x.name)):
             # Use the recording key for it, which doesn't include
             # node id (which doesn't carry between sessions).
-            patch_dict[patch.Get_Item_Key()] = patch.value
+            # Json needs string keys, so comma join the key fields.
+            patch_dict[','.join(patch.Get_Item_Key())] = patch.value
 
         # Pick the path to use for the file, either default or based
         # on the override name.
@@ -443,31 +513,23 @@ class Live_Editor_class:
         with open(path, 'r') as file:
             json_dict = json.load(file)
 
-        # Work through the patches, looking to find their matching
-        # xml nodes.
-        for key, value in json_dict['patches'].items():
-            split_key = key.split(',')
-            virtual_path = split_key[1]
-            xpath        = split_key[2]
-            
-            # Load the file with the patch target node.
-            game_file = Load_File(virtual_path)
-            if game_file == None:
-                xml_node_id = None
-            else:
-                # Search for the node, patched version.
-                # Note: this should sync up with what the Edit_Items
-                # use for their xml_node_id.
-                nodes = game_file.Get_Xpath_Nodes(xpath, version = 'patched')
-                # It is possible a node won't be found.
-                if not nodes:
-                    xml_node_id = None
-                else:
-                    # Don't check for >1 for now; that is checked when
-                    # patched are properly applied in a transform.
-                    xml_node_id = nodes[0].tail
-                    # An id should have been attached.
-                    assert xml_node_id
+        # Split the keys, and group the patch xpaths by file, so that
+        #  each file is searched once with shared prefix lookups.
+        split_keys = [(key.split(','), value) 
+                      for key, value in json_dict['patches'].items()]
+        path_xpaths_dict = defaultdict(set)
+        for split_key, value in split_keys:
+            path_xpaths_dict[split_key[1]].add(split_key[2])
+
+        # Look up node ids for the xpaths of each file.
+        path_node_ids_dict = {}
+        for virtual_path, xpaths in path_xpaths_dict.items():
+            path_node_ids_dict[virtual_path] = self._Get_Patch_Node_IDs(
+                virtual_path, xpaths)
+
+        # Work through the patches, in json order.
+        for split_key, value in split_keys:
+            xml_node_id = path_node_ids_dict[split_key[1]].get(split_key[2])
             
             patch = Custom_Patch(
                 name         = split_key[0],
@@ -482,10 +544,55 @@ class Live_Editor_class:
             self.patches_key_dict[patch.Get_Item_Key()] = patch
             if patch.Get_Node_ID_Key() != None:
                 self.patches_node_id_dict[patch.Get_Node_ID_Key()] = patch
+            self.patch_virtual_paths.add(patch.virtual_path)
             
         return
 
 
+    def _Get_Patch_Node_IDs(self, virtual_path, xpaths):
+        '''
+        Returns a dict, keyed by xpath, of the xml_node_id of the first
+        node matching each of the given xpaths in the patched version of
+        the file. Xpaths with no match (or a missing file) map to None.
+        Results are kept in patch_node_id_cache, reused while the file's
+        patched root is unchanged.
+        '''
+        # Load the file with the patch target nodes.
+        game_file = Load_File(virtual_path)
+        if game_file == None:
+            return {}
+
+        # Get the cached ids, clearing them if the patched xml
+        #  has been replaced since they were found.
+        patched_root = game_file.Get_Root_Readonly(version = 'patched')
+        cache_root, xpath_node_ids = self.patch_node_id_cache.get(
+            virtual_path, (None, None))
+        if cache_root is not patched_root:
+            xpath_node_ids = {}
+            self.patch_node_id_cache[virtual_path] = (patched_root, 
+                                                      xpath_node_ids)
+
+        # Search for any new nodes, patched version.
+        # Note: this should sync up with what the Edit_Items
+        # use for their xml_node_id.
+        xpath_resolver = Xpath_Resolver(game_file = game_file)
+        for xpath in xpaths:
+            if xpath in xpath_node_ids:
+                continue
+            nodes = xpath_resolver.Get_Nodes(xpath, version = 'patched')
+            # It is possible a node won't be found.
+            if not nodes:
+                xml_node_id = None
+            else:
+                # Don't check for >1 for now; that is checked when
+                # patched are properly applied in a transform.
+                xml_node_id = XML_Diff.Get_Node_ID(nodes[0])
+                # An id should have been attached.
+                assert xml_node_id
+            xpath_node_ids[xpath] = xml_node_id
+        return xpath_node_ids
+
+
     def Get_Patches(self):
         '''
         Returns a list of all patches, as Custom_Patch objects.
@@ -227,6 +227,8 @@ def Run(*args):
                 
 
     Print('Calling {}'.format(args.control_script))
+    # Start fresh plugin timings for this script.
+    Framework.Plugin_Stats.Reset()
     try:
         # Attempt to load/run the module.
         import importlib        
@@ -239,6 +241,15 @@ def Run(*args):
             # Just grab the name; it should be found on included paths.
             str(args.control_script)
             ).load_module()
+
+        # Apply any transform edits still queued at the end of the script.
+        Framework.Edit_Planner.Apply_Edits()
+
+        # Report plugin timings and work counts, if any plugins ran.
+        if Framework.Plugin_Stats.call_records:
+            Framework.Plugin_Stats.Write_Report()
+            if Settings.verbose:
+                Framework.Plugin_Stats.Print_Summary()
         
         #Print('Run complete')
         
@@ -132,6 +132,10 @@ Writing custom edit code:
     (which includes any prior transform changes), make any custom edits
     with the help of the lxml package, and to put the changes back using
     Update_Root().
+  * For small edits to large files, Begin_Edit() may be used instead
+    to edit the current xml in place without copying it; changes
+    are committed at the end of a "with" block, or rolled back if
+    an exception occurs.
   * Existing plugins offer examples of this approach.
   * Edits made using the framework will automatically support
     diff patch generation.
@@ -172,12 +176,14 @@ from .Common import Settings
 from .Common import Analysis_Wrapper
 from .Common import Transform_Wrapper
 from .Common import Utility_Wrapper
+from .Common import Edit_Planner
+from .Common import Plugin_Stats
 from .Common import XML_Misc
 # Allow convenient catching of all special exception types.
 from .Common.Exceptions import *
 
 from . import File_Manager
-from .File_Manager import Load_File, File_System, XML_Diff
+from .File_Manager import Load_File, File_System, XML_Diff, Text_Catalog, Asset_Catalog
 
 from . import Live_Editor_Components
 from .Live_Editor_Components import Live_Editor
@@ -18,7 +18,6 @@ from ...Transforms.Support import Float_to_String
 
 @Live_Editor_Object_Builder('shields')
 def _Build_Shield_Objects():   
-    File_System.Load_Files('assets/props/SurfaceElements/*.xml')
     game_files = File_System.Get_Asset_Files_By_Class('macros','shieldgenerator')
     return Create_Objects_From_Asset_Files(game_files, shield_item_macros)
 
@@ -51,7 +50,6 @@ shield_item_macros = [
 
 @Live_Editor_Object_Builder('scanners')
 def _Build_Scanner_Objects():
-    File_System.Load_Files('assets/props/SurfaceElements/*.xml')
     game_files = File_System.Get_Asset_Files_By_Class('macros','scanner')
     return Create_Objects_From_Asset_Files(game_files, scanner_item_macros)
 
@@ -64,7 +62,6 @@ scanner_item_macros = [
 
 @Live_Editor_Object_Builder('dockingbays')
 def _Build_DockingBay_Objects():
-    File_System.Load_Files('assets/props/SurfaceElements/*.xml')
     game_files = File_System.Get_Asset_Files_By_Class('macros','dockingbay')
     return Create_Objects_From_Asset_Files(game_files, dockingbay_item_macros)
 
@@ -113,7 +110,6 @@ def _Build_Engine_Objects():
     Returns a list of Edit_Objects for 'assets/props/Engines'.
     Meant for calling from the Live_Editor.
     '''    
-    File_System.Load_Files('assets/props/Engines/*.xml')
     game_files = File_System.Get_Asset_Files_By_Class('macros','engine')
     return Create_Objects_From_Asset_Files(game_files, engine_item_macros)
 
@@ -5,10 +5,14 @@ Extra complexity added to multithread and to dynamically detect
 some fields.
 '''
 
+from collections import defaultdict
 from multiprocessing import Pool, cpu_count
+import atexit
 import time
 
-from Framework import File_System, Load_File, Print
+from lxml import etree as ET
+
+from Framework import File_System, Load_File, Print, Settings
 from Framework.Live_Editor_Components import *
 # Convenience macro renaming.
 E = Edit_Item_Macro
@@ -23,106 +27,73 @@ def _Build_Ware_Objects():
     Returns a list of Edit_Objects for all found wares.
     Meant for calling from the Live_Editor.
     '''
-    #t_file = Load_File('t/0001-L044.xml')
     # Look up the ware file.
     wares_file = Load_File('libraries/wares.xml')
-    xml_root = wares_file.Get_Root_Readonly()
     
     # Get the ware nodes; only first level children.
     ware_nodes = wares_file.Get_Root_Readonly().findall('./ware')
         
     start_time = time.time()
 
-    # TODO: maybe condition this on if Settings.disable_threading is
-    # set or not.
-    if 1:
+    if not Settings.disable_threading:
         '''
-        Try out multiprocessing to speed this up.
-
-        Observations, letting python split up ware nodes"
-        - Time goes from ~20 to ~30 seconds with 1 worker.
-        - Down to ~10 seconds with 6 workers; not much gain.
-
-        To possibly reduce data copy overhead, split up the ware nodes
-        manually into lists, and send a single full list to each worker.
-        - Down to 7-8 seconds from doing this.
-        - Still not great, but more than 2x speedup, so it's something.
-        - Note: for different process counts, best was at system
-          max threads, with higher counts not losing much time.
-        - Can let the Pool handle the thread counting automatically,
-          and it does get close, though that doesn't help with picking
-          the work unit size.
-        - Update: after making production nodes conditional, normal
+        Multiprocessing is used to speed this up.
+
+        Earlier observations:
+        - Time goes from ~20 to ~30 seconds with 1 worker, down to
+          7-8 seconds with one slice of ware nodes per worker.
+        - After making production nodes conditional, normal
           runs went 20 to ~4.5 seconds, and this went down to ~2.5.
-        
-        Later observations:
-        - The node ids tagged onto xml element tails seem to be
-          transferred okay through pickling, except the one on the
-          root node that has to be pruned.
-
-        - The file system appears to get completely replicated for
-          every thread, such that the wares file gets node ids
-          applied once globally and once per thread.
-          The global node ids are higher than the threads since they
-          are offset somewhat by any prior loaded xml, while the threads
-          all start from 0.
-
-        - This node id discrepency means the loaded elements mess up
-          the live editor patch matching, where editing maja snails
-          ends up changing marines.
-
-        - How can the stupid python threading be prevented from making
-          such a dumb complete system copy that doesn't even catch
-          everything? Eg. it should at least be copying the original
-          node ids, not starting from scratch.
-          - It seems like it goes:
-            - Item gets created with paths
-            - Item runs value init
-            - Value init calls Load_File, expecting it to be a quick
-              dict lookup.
-            - Multiprocessing barfs on itself and makes a new copy
-              of the file system that does not have the wanted
-              file loaded, and has to reload it from disk (with
-              diff patching).
-
-        - Workaround: change how object building works, such that
-          items are linked directly to their source game file and
-          do not have to do a file system load.
-          Further, tweak the pickler to keep the tag on the top
-          element copied.
-          Result: things seem to work okay now.
-        '''
 
-        # Pick the process runs needed to do all the work.
-        # Leave 1 thread free for system stuff.
-        num_processes = max(1, cpu_count() -1)
+        - The original style pickled every ware node (as xml text),
+          plus the full wares_file, to every worker, and pickled the
+          finished Edit_Objects back. Most of the time went to that
+          serialization, and a fresh pool was made on every call.
+
+        - The file system also got replicated in the workers, giving
+          different node ids than the parent, which messed up live
+          editor patch matching (editing maja snails would change
+          marines) until items stopped doing their own file loads.
+
+        Current style:
+        - A persistent pool is kept, whose workers are handed the xml
+          text of each version of the wares file once, at startup, and
+          parse it locally. The pool is only restarted if the xml
+          changes (eg. after a script run).
+        - Workers are sent just index ranges of ware nodes, and return
+          plain Edit_Item records (see Get_Item_Record).
+        - Node ids carry over in the xml text, since they are stored
+          in element tails.
+        - The Edit_Objects are built here, from the records.
+        '''
+        # Pick the index ranges needed to do all the work, one
+        # per worker.
+        num_processes = _Get_Num_Processes()
         max_nodes_per_worker = len(ware_nodes) // num_processes +1
-        slices = []
+        ranges = []
         start = 0
         while start < len(ware_nodes):
             # Compute the end point, limiting to the last node.
-            end = start + max_nodes_per_worker
-            if end > len(ware_nodes):
-                end = len(ware_nodes)
-            # Get the slice and store it.
-            slices.append( ware_nodes[start : end] )
-            # Update the start.
+            end = min(start + max_nodes_per_worker, len(ware_nodes))
+            ranges.append((start, end))
             start = end
 
-        # Use a starmap for this, since it needs to pass both the
-        # wares file and the ware node. Starmap will splat out
-        # the iterables.
-        inputs = [(slice, wares_file) for slice in slices]
-
-        pool = Pool()#processes = num_processes)
-        ware_edit_objects = sum(pool.starmap(
-            _Create_Objects, 
-            inputs,
-            ), [])
+        pool = _Get_Pool(wares_file)
+        record_dicts = sum(pool.map(_Worker_Get_Records, ranges), [])
         
     else:
-        # Single thread style.
-        ware_edit_objects = _Create_Objects(ware_nodes, wares_file)
+        # Single thread style, reading the file xml directly.
+        # The resolver goes through the file, to use its ware lookups.
+        record_dicts = _Get_Records(
+            wares_file.Get_Version_Roots(), 
+            Xpath_Resolver(game_file = wares_file),
+            ware_nodes)
+
+    # Build the objects from the records.
+    ware_edit_objects = []
+    for ware_node, item_records in zip(ware_nodes, record_dicts):
+        ware_edit_objects.append(
+            _Create_Object(ware_node, wares_file, item_records))
             
     Print('Ware Edit_Objects creation took {:0.2f} seconds'.format(
         time.time() - start_time))
@@ -130,44 +101,198 @@ def _Build_Ware_Objects():
     return ware_edit_objects
 
 
-def _Create_Objects(ware_nodes, wares_file):
+def _Get_Macros(ware_node):
+    '''
+    Returns a tuple of (xpath_prefix, macro list) for the given ware node.
     '''
-    Returns a list of objects for the given ware nodes.
+    # Do an xpath partial replacement to fill in the path
+    # to the node from the file base.
+    xpath_prefix = './ware[@id="{}"]'.format(ware_node.get('id'))
+                    
+    # Find production nodes, get their macros (can be multiple).
+    # Note: doing this conditionally instead of using pre-created
+    # macros reduced run time from 20 to 4 seconds. Most nodes
+    # do not have the full 3 production subnodes, nor 3 wares
+    # per production.
+    extra_macros = []
+    for prod_index, prod_node in enumerate(ware_node.findall('./production')):
+        # Offset indices by 1, for display names and for xpaths.
+        extra_macros += Get_Production_Macros(xpath_prefix, prod_index +1)            
+        # Loop over wares.
+        for ware_index, prod_ware_node in enumerate(prod_node.findall('./primary/ware')):
+            extra_macros += Get_Production_Ware_Macros(xpath_prefix, prod_index +1, ware_index +1)
+    return xpath_prefix, ware_item_macros + extra_macros
+
+
+def _Get_Records(version_roots, xpath_resolver, ware_nodes):
+    '''
+    Returns a list of dicts, one per ware node, holding Edit_Item
+    records keyed by item name. Items whose node is missing in the
+    current xml are left out.
+
+    * version_roots
+      - Dict of xml roots of the wares file, keyed by version.
+    * xpath_resolver
+      - Xpath_Resolver for the version_roots.
+    * ware_nodes
+      - List of ware nodes, from the current root.
     '''
     ret_list = []
     for ware_node in ware_nodes:
-        # Use the id attribute as the base name.
-        name = ware_node.get('id')
-        assert name != None
-        ware_edit_object = Edit_Object(name)
-        
-        # Do an xpath partial replacement to fill in the path
-        # to the node from the file base.
-        xpath_prefix = './ware[@id="{}"]'.format(name)
-                    
-        # Find production nodes, get their macros (can be multiple).
-        # Note: doing this conditionally instead of using pre-created
-        # macros reduced run time from 20 to 4 seconds. Most nodes
-        # do not have the full 3 production subnodes, nor 3 wares
-        # per production.
-        extra_macros = []
-        for prod_index, prod_node in enumerate(ware_node.findall('./production')):
-            # Offset indices by 1, for display names and for xpaths.
-            extra_macros += Get_Production_Macros(xpath_prefix, prod_index +1)            
-            # Loop over wares.
-            for ware_index, prod_ware_node in enumerate(prod_node.findall('./primary/ware')):
-                extra_macros += Get_Production_Ware_Macros(xpath_prefix, prod_index +1, ware_index +1)
-
-        # Fill in the edit items from macros.
-        ware_edit_object.Make_Items(
-            wares_file, 
-            ware_item_macros + extra_macros,
-            xpath_replacements = {'PREFIX': xpath_prefix}
-            )
-        ret_list.append(ware_edit_object)
+        xpath_prefix, macros = _Get_Macros(ware_node)
+        item_records = {}
+        for macro in macros:
+            if not isinstance(macro, Edit_Item_Macro):
+                continue
+            xpath = macro.xpath.replace('PREFIX', xpath_prefix)
+            # Only record items that are present.
+            if not xpath_resolver.Get_Nodes(xpath, 'current'):
+                continue
+            item_records[macro.name] = Get_Item_Record(
+                version_roots, xpath, macro.attribute, 'libraries/wares.xml',
+                xpath_resolver = xpath_resolver)
+        ret_list.append(item_records)
     return ret_list
 
 
+def _Create_Object(ware_node, wares_file, item_records):
+    '''
+    Returns an Edit_Object for the given ware node, filled in from
+    its item records.
+    '''
+    # Use the id attribute as the base name.
+    name = ware_node.get('id')
+    assert name != None
+    ware_edit_object = Edit_Object(name)
+    xpath_prefix, macros = _Get_Macros(ware_node)
+    # Fill in the edit items from macros.
+    ware_edit_object.Make_Items(
+        wares_file, 
+        macros,
+        xpath_replacements = {'PREFIX': xpath_prefix},
+        item_records = item_records,
+        )
+    return ware_edit_object
+
+
+# Persistent worker pool, and the key of the xml it was started with.
+_pool = None
+_pool_key = None
+
+def _Get_Num_Processes():
+    'Returns the number of worker processes to use.'
+    # Leave 1 thread free for system stuff.
+    return max(1, cpu_count() -1)
+
+
+def _Get_Pool_Key(wares_file):
+    '''
+    Returns a tuple identifying the xml state of the wares_file, which
+    changes whenever workers started from it would be out of date:
+    the file object, the change count of its current xml, its patched
+    root, and which versions share the patched root.
+    The vanilla xml of a file never changes, so isn't checked directly.
+    '''
+    version_roots = wares_file.Get_Version_Roots()
+    # Objects are held directly (neither defines equality, so they
+    # compare by identity), rather than by id which could be reused.
+    return (wares_file, 
+            wares_file.current_change_count,
+            version_roots['patched'],
+            version_roots['vanilla'] is version_roots['patched'],
+            version_roots['current'] is version_roots['patched'])
+
+
+def _Get_Pool(wares_file):
+    '''
+    Returns the worker pool set up with the current xml of the
+    wares_file, starting it or restarting it as needed.
+    '''
+    global _pool, _pool_key
+    # If the xml changed, the old workers are out of date.
+    pool_key = _Get_Pool_Key(wares_file)
+    if _pool != None and _pool_key != pool_key:
+        Close_Pool()
+
+    if _pool == None:
+        # Get the xml text of each version. The root tail (its node id)
+        # is left off, since it would not parse.
+        # Versions sharing the patched root are sent as None, and will
+        # share it again in the workers.
+        version_roots = wares_file.Get_Version_Roots()
+        xml_bytes = tuple(
+            None if (version != 'patched' 
+                     and version_roots[version] is version_roots['patched'])
+            else ET.tostring(version_roots[version], with_tail = False)
+            for version in ['vanilla','patched','current'])
+        _pool = Pool(
+            processes = _Get_Num_Processes(),
+            initializer = _Worker_Init,
+            initargs = (xml_bytes,))
+        _pool_key = pool_key
+    return _pool
+
+
+def Close_Pool():
+    '''
+    Shuts down the worker pool, if it is running.
+    '''
+    global _pool, _pool_key
+    if _pool != None:
+        _pool.terminate()
+        _pool.join()
+    _pool = None
+    _pool_key = None
+    return
+
+# Make sure workers are cleaned up on exit.
+atexit.register(Close_Pool)
+
+
+# Worker process state, filled in by _Worker_Init.
+_worker_version_roots = None
+_worker_xpath_resolver = None
+_worker_ware_nodes = None
+
+def _Worker_Init(xml_bytes):
+    '''
+    Worker process startup, which parses the xml versions.
+    '''
+    global _worker_version_roots, _worker_xpath_resolver, _worker_ware_nodes
+    vanilla_text, patched_text, current_text = xml_bytes
+    patched_root = ET.fromstring(patched_text)
+    _worker_version_roots = {
+        'vanilla' : (patched_root if vanilla_text == None 
+                     else ET.fromstring(vanilla_text)),
+        'patched' : patched_root,
+        'current' : (patched_root if current_text == None 
+                     else ET.fromstring(current_text)),
+        }
+    _worker_ware_nodes = _worker_version_roots['current'].findall('./ware')
+
+    # The xml won't change in this worker, so a single resolver can
+    # be kept. Prefill it with ware nodes by id, to avoid searching
+    # the full file for every ware.
+    _worker_xpath_resolver = Xpath_Resolver(version_roots = _worker_version_roots)
+    for version, root in _worker_version_roots.items():
+        xpath_nodes = defaultdict(list)
+        for ware_node in root.findall('./ware'):
+            xpath_nodes['./ware[@id="{}"]'.format(ware_node.get('id'))].append(ware_node)
+        for xpath, nodes in xpath_nodes.items():
+            _worker_xpath_resolver.Add_Nodes(xpath, version, nodes)
+    return
+
+
+def _Worker_Get_Records(index_range):
+    '''
+    Worker function, returning records for the ware nodes in the
+    given (start, end) index range.
+    '''
+    start, end = index_range
+    return _Get_Records(_worker_version_roots, _worker_xpath_resolver,
+                        _worker_ware_nodes[start : end])
+
+
 
 # TODO: this gets called 4 times for the 4 versions, which
 # seems overkill if the text file doesn't change.
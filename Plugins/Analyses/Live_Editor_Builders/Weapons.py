@@ -26,12 +26,9 @@ def _Build_Bullet_Objects():
     # Make sure engines are loaded for the missiles.
     Live_Editor.Get_Category_Objects('engines')
 
-    # Look up bullet files.
-    # These can be in two locations.
-    File_System.Load_Files('assets/props/WeaponSystems/*.xml')
-    File_System.Load_Files('assets/fx/weaponFx/*.xml')
-
     # Split out proper bullets from missiles and similar.
+    # Files are found through the macro index, loading only those
+    # that define these classes.
     bullet_game_files = File_System.Get_Asset_Files_By_Class('macros','bullet')
     missile_game_files = File_System.Get_Asset_Files_By_Class('macros',
                     'missile','bomb','mine','countermeasure')
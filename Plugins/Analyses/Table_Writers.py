@@ -0,0 +1,331 @@
+'''
+Support for writing tables of strings to output files, one row at a
+time, so that large tables never need to be held in memory as a whole.
+
+Tables are given as a label row followed by value rows; any iterable
+of rows is accepted, including generators.
+
+Supported formats:
+- 'csv'  : All tables in one csv file, with a blank line between them.
+- 'html' : All tables in one html file, as styled html tables.
+- 'jsonl': All tables in one json lines file; each table starts with
+           a line holding its labels, followed by a line per row.
+- 'columns': A folder holding a subfolder per table, with one json lines
+           file per column and a 'schema.json' listing the columns.
+'''
+import csv
+import json
+from html import escape
+from pathlib import Path
+
+from Framework import Settings
+
+def Write_Tables(file_name, *tables, formats = None, table_names = None):
+    '''
+    Writes one or more tables to output files, in the output folder.
+
+    * file_name
+      - String, name to use for generated files, without extension.
+    * tables
+      - Iterables of rows, each row being a list of strings. The
+        first row of each table holds the column labels.
+    * formats
+      - Optional list of strings, the output formats to write.
+      - Defaults to ['csv','html'].
+    * table_names
+      - Optional list of strings, names of the tables, used by formats
+        that record them.
+    '''
+    if formats == None:
+        formats = ['csv','html']
+    if table_names == None:
+        table_names = ['table_{}'.format(x) for x in range(len(tables))]
+
+    path = Settings.Get_Output_Folder() / file_name
+    writers = [Get_Table_Writer(format, path) for format in formats]
+    try:
+        for table_name, table in zip(table_names, tables):
+            # Pass along rows as they come in; the first is the labels.
+            rows = iter(table)
+            labels = next(rows, [])
+            for writer in writers:
+                writer.Start_Table(table_name, labels)
+            for row in rows:
+                for writer in writers:
+                    writer.Write_Row(row)
+            for writer in writers:
+                writer.End_Table()
+    finally:
+        for writer in writers:
+            writer.Close()
+    return
+
+
+def Get_Table_Writer(format, path):
+    '''
+    Returns a new table writer object for the given format, writing
+    to the given path (with the format's extension added).
+    '''
+    writer_classes = {
+        'csv'    : CSV_Writer,
+        'html'   : HTML_Writer,
+        'jsonl'  : JSONL_Writer,
+        'columns': Column_Writer,
+        }
+    if format not in writer_classes:
+        raise AssertionError('Table format "{}" not recognized; expected one of {}'
+                             .format(format, list(writer_classes.keys())))
+    return writer_classes[format](path)
+
+
+class Table_Writer:
+    '''
+    Base class for writing tables one row at a time.
+
+    Attributes:
+    * path
+      - Path to write to, without extension.
+    '''
+    def __init__(self, path):
+        self.path = Path(path)
+        return
+
+    def Start_Table(self, name, labels):
+        '''
+        Begin a new table with the given name and column labels.
+        '''
+        return
+
+    def Write_Row(self, row):
+        '''
+        Write a row of values to the current table.
+        '''
+        return
+
+    def End_Table(self):
+        '''
+        Finish the current table.
+        '''
+        return
+
+    def Close(self):
+        '''
+        Finish writing, closing any open files.
+        '''
+        return
+
+
+class CSV_Writer(Table_Writer):
+    '''
+    Writes tables to a single csv file, with values quoted as needed.
+
+    Attributes:
+    * file
+      - Open text file.
+    * csv_writer
+      - csv.writer wrapping the file.
+    '''
+    def __init__(self, path):
+        super().__init__(path)
+        self.file = open(self.path.with_name(self.path.name + '.csv'),
+                         'w', newline = '')
+        self.csv_writer = csv.writer(self.file)
+        return
+
+    def Start_Table(self, name, labels):
+        self.csv_writer.writerow(labels)
+        return
+
+    def Write_Row(self, row):
+        self.csv_writer.writerow(row)
+        return
+
+    def End_Table(self):
+        # Put extra space between tables.
+        self.csv_writer.writerow([])
+        return
+
+    def Close(self):
+        self.file.close()
+        return
+
+
+class HTML_Writer(Table_Writer):
+    '''
+    Writes tables to a single html file, as styled html table nodes.
+
+    Attributes:
+    * file
+      - Open text file.
+    * row_start
+      - String, opening tag for each row.
+    * cell_style
+      - String, style attribute text shared by each cell.
+    '''
+    # Pick the css styles; these will be ';' joined in a 'style' attribute.
+    # Using http://www.stylinwithcss.com/resources_css_properties.php
+    # to look up options.
+    table_styles = {
+        # Single line instead of double line borders.
+        'border-collapse' : 'collapse',
+        # Not too clear on this; was an attempt to stop word wrap.
+        #'width'           : '100%',
+        # Stop wordwrap on the names and headers and such.
+        'white-space'     : 'nowrap',
+        # Get values to be centered instead of left aligned.
+        'text-align'      : 'center',
+        # TODO: play with captioning.
+        'caption-side'    : 'left',
+        # Margin between tables.
+        'margin-bottom'   : '20px',
+        }
+    cell_styles = {
+        # Give some room around the text before hitting the cell borders.
+        # TODO: not working; if placed on the table, puts a giant
+        # margin around the whole table.
+        #'margin'          : '10px',
+        # Adjust this with padding. Don't set this very high; it is really
+        # sensitive.
+        'padding'         : '2px',
+        }
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.file = open(self.path.with_name(self.path.name + '.html'), 'w')
+        # CSS styles, separated by ;
+        self.cell_style = escape(';'.join('{}:{}'.format(k,v)
+                                          for k,v in self.cell_styles.items()))
+        self.row_start = '  <tr style="{}">\n'.format(self.cell_style)
+        return
+
+    def _Write_Cells(self, tag, row):
+        '''
+        Write a full row using the given cell tag.
+        '''
+        lines = [self.row_start]
+        for entry in row:
+            lines.append('    <{0} style="{1}">{2}</{0}>\n'.format(
+                tag, self.cell_style,
+                '' if entry == None else escape(entry, quote = False)))
+        lines.append('  </tr>\n')
+        self.file.write(''.join(lines))
+        return
+
+    def Start_Table(self, name, labels):
+        self.file.write('<table border="1" style="{}">\n'.format(
+            escape(';'.join('{}:{}'.format(k,v)
+                            for k,v in self.table_styles.items()))))
+        self._Write_Cells('th', labels)
+        return
+
+    def Write_Row(self, row):
+        self._Write_Cells('td', row)
+        return
+
+    def End_Table(self):
+        # Put extra space between tables.
+        self.file.write('</table>\n\n')
+        return
+
+    def Close(self):
+        self.file.close()
+        return
+
+
+class JSONL_Writer(Table_Writer):
+    '''
+    Writes tables to a single json lines file. Each table starts with
+    a {"table": name, "labels": [...]} line, followed by a
+    {"table": name, "values": [...]} line per row.
+
+    Attributes:
+    * file
+      - Open text file.
+    * table_name
+      - String, name of the current table.
+    '''
+    def __init__(self, path):
+        super().__init__(path)
+        self.file = open(self.path.with_name(self.path.name + '.jsonl'), 'w')
+        self.table_name = None
+        return
+
+    def Start_Table(self, name, labels):
+        self.table_name = name
+        self.file.write(json.dumps({'table': name, 'labels': labels}) + '\n')
+        return
+
+    def Write_Row(self, row):
+        self.file.write(json.dumps({'table': self.table_name, 'values': row}) + '\n')
+        return
+
+    def Close(self):
+        self.file.close()
+        return
+
+
+class Column_Writer(Table_Writer):
+    '''
+    Writes tables in a columnar layout: a folder (path + '_columns')
+    with a subfolder per table, holding a json lines file per column
+    (one json string per row) and a 'schema.json' with the table name,
+    column labels, and column file names.
+
+    Attributes:
+    * folder
+      - Path of the folder holding the table subfolders.
+    * table_count
+      - Int, number of tables started so far, used in folder names.
+    * column_files
+      - List of open files for the current table's columns.
+    '''
+    def __init__(self, path):
+        super().__init__(path)
+        self.folder = self.path.with_name(self.path.name + '_columns')
+        self.table_count = 0
+        self.column_files = []
+        return
+
+    def Start_Table(self, name, labels):
+        # Prefix the folder with the table index, to keep names unique
+        # and in order.
+        table_folder = self.folder / '{:03}_{}'.format(
+            self.table_count, _Get_Safe_Name(name))
+        self.table_count += 1
+        table_folder.mkdir(parents = True, exist_ok = True)
+
+        column_file_names = ['{:03}_{}.jsonl'.format(index, _Get_Safe_Name(label))
+                             for index, label in enumerate(labels)]
+        with open(table_folder / 'schema.json', 'w') as file:
+            json.dump({
+                'table'  : name,
+                'labels' : labels,
+                'files'  : column_file_names,
+                }, file, indent = 2)
+        self.column_files = [open(table_folder / x, 'w')
+                             for x in column_file_names]
+        return
+
+    def Write_Row(self, row):
+        for file, value in zip(self.column_files, row):
+            file.write(json.dumps(value) + '\n')
+        return
+
+    def End_Table(self):
+        for file in self.column_files:
+            file.close()
+        self.column_files = []
+        return
+
+    def Close(self):
+        self.End_Table()
+        return
+
+
+def _Get_Safe_Name(name):
+    '''
+    Returns the name with any characters unsafe for file names
+    replaced by underscores.
+    '''
+    return ''.join(x if x.isalnum() or x in '-_' else '_'
+                   for x in str(name))
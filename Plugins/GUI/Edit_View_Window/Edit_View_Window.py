@@ -137,7 +137,7 @@ class Edit_View_Window(Tab_Page_Widget, generated_class):
     def Soft_Refresh(self):
         '''
         Does a partial refresh of the table, redrawing the current
-        items. A call to Live_Editor.Reset_Current_Item_Values should
+        items. A call to Live_Editor.Refresh_Current_Item_Values should
         preceed this, shared across all pages being refreshed.
         '''
         self.table_model.Redraw()
@@ -346,8 +346,9 @@ class Script_Window(Tab_Page_Widget, generated_class):
         self.window.Print('Script run completed')
 
         # Tell any live edit tables to refresh their current values,
-        # since the script may have changed them.
-        Live_Editor.Reset_Current_Item_Values()
+        # since the script may have changed them. Only items in files
+        # changed by this or the prior run need a refresh.
+        Live_Editor.Refresh_Current_Item_Values()
         #-Removed; signals handle this.
         #self.window.Soft_Refresh()
         
@@ -1,13 +1,11 @@
 '''
 Transforms to jobs.
 '''
-from fnmatch import fnmatch
-from Framework import Transform_Wrapper, Load_File
-from .Support import Standardize_Match_Rules
-from .Support import XML_Multiply_Int_Attribute
-from .Support import XML_Multiply_Float_Attribute
+from Framework import Transform_Wrapper, Load_File, Edit_Planner
+from .Support import Match_Rules
+from .Support import Attribute_Batch
 
-@Transform_Wrapper()
+@Transform_Wrapper(queues_edits = True)
 def Adjust_Job_Count(
         # Allow job multipliers to be given as a loose list of args.
         *job_multipliers
@@ -44,52 +42,69 @@ def Adjust_Job_Count(
             ('*'                          , 1.1) )
     </code>
     '''    
-    # Put matching rules in standard form.
-    rules = Standardize_Match_Rules(job_multipliers)
+    # Compile the matching rules.
+    rules = Match_Rules(job_multipliers)
     
     jobs_game_file = Load_File('libraries/jobs.xml')
-    xml_root = jobs_game_file.Get_Root()
-        
-    # Loop over the jobs.
-    for job in xml_root.findall('./job'):
-        
-        # Look up the tags and a couple other properties of interest.
-        job_id      = job.get('id')
-        # The category node may not be present.
-        category = job.find('category')
-        if category != None:
-            faction  = category.get('faction')
-            size     = category.get('size')
-            # Parse the tags to separate them, removing
-            #  brackets and commas splitting.
-            tags     = [x.strip(' []') for x in category.get('tags').split(',') if x]
-        else:
-            faction  = None
-            size     = None
-            tags     = []
+    batch = Attribute_Batch('Adjust_Job_Count')
 
-        # Check the matching rules.
-        multiplier = None
-        for key, value, mult in rules:
-            if((key == '*')
-            or (key == 'id' and fnmatch(job_id, value))
-            or (key == 'faction' and faction == value)
-            # Check all tags, space separated.
-            or (key == 'tags' and all(x in tags for x in value.split(' ')))
-            # For sizes, add a 'ship_' prefix to the match_str.
-            or (key == 'size' and size == ('ship_'+value)) ):
-                multiplier = mult
-                break
-        # Skip if no match.
-        if multiplier == None:
-            continue
+    def Edit_Jobs(edit):
+        # Loop over the matched jobs.
+        for job, multiplier in rules.Gen_Matched_Args(
+                edit.root.findall('./job'), job_match_key_getters):
 
-        # Apply the multiplier to all fields of the quota node.
-        # The only quota that might be skipped is 'variation', but
-        #  go ahead and adjust it too for now.
-        quota = job.find('quota')
-        for name, value in quota.items():
-            XML_Multiply_Int_Attribute(quota, name, multiplier)
-                        
-    jobs_game_file.Update_Root(xml_root)
+            # Apply the multiplier to all fields of the quota node.
+            # The only quota that might be skipped is 'variation', but
+            #  go ahead and adjust it too for now.
+            quota = job.find('quota')
+            batch.Add_All(quota, multiplier, is_int = True, edit = edit)
+        batch.Apply()
+        return
+
+    # Apply the edit, possibly queued with other transforms.
+    Edit_Planner.Edit_Root(jobs_game_file, Edit_Jobs)
+    Edit_Planner.After_Edits(batch.Report)
     return
+
+
+def _Get_Category_Attribute(job, attribute):
+    '''
+    Returns an attribute of the job's category node, or None if
+    the node is not present.
+    '''
+    category = job.find('category')
+    if category == None:
+        return None
+    return category.get(attribute)
+
+
+def _Get_Job_Size(job):
+    '''
+    Returns the ship size of a job, with the 'ship_' prefix removed
+    to match the size rule values, or None.
+    '''
+    size = _Get_Category_Attribute(job, 'size')
+    if size == None or not size.startswith('ship_'):
+        return None
+    return size[len('ship_'):]
+
+
+def _Get_Job_Tags(job):
+    '''
+    Returns a set of the tags of a job.
+    '''
+    tags = _Get_Category_Attribute(job, 'tags')
+    if tags == None:
+        return set()
+    # Parse the tags to separate them, removing
+    #  brackets and commas splitting.
+    return set(x.strip(' []') for x in tags.split(',') if x)
+
+
+# Functions to look up the match rule keys of job nodes.
+job_match_key_getters = {
+    'id'      : lambda x: x.get('id'),
+    'faction' : lambda x: _Get_Category_Attribute(x, 'faction'),
+    'size'    : _Get_Job_Size,
+    'tags'    : _Get_Job_Tags,
+    }
@@ -52,30 +52,26 @@ def Apply_Live_Editor_Patches(
                             ).format(virtual_path))
             continue
 
-        # Modify it in one pass.
-        root = game_file.Get_Root()
+        # Modify it in one pass, in place, so that only the edited
+        # nodes need to be diffed later.
+        # TODO: maybe delay committing until all patches get applied.
+        with game_file.Begin_Edit() as edit:
 
-        for patch in patch_list:
-            # Look up the edited node; assume just one xpath match.
-            nodes = root.xpath(patch.xpath)
-            if not nodes:
-                Plugin_Log.Print(('Warning: Apply_Live_Editor_Patches could'
-                                ' not find node "{}" in file "{}"'
-                                ).format(patch.xpath, virtual_path))
-                continue
-            node = nodes[0]
+            for patch in patch_list:
+                # Look up the edited node; assume just one xpath match.
+                nodes = edit.root.xpath(patch.xpath)
+                if not nodes:
+                    Plugin_Log.Print(('Warning: Apply_Live_Editor_Patches could'
+                                    ' not find node "{}" in file "{}"'
+                                    ).format(patch.xpath, virtual_path))
+                    continue
+                node = nodes[0]
 
-            # Either update or remove the attribute.
-            # Assume it is safe to delete if the value is an empty string.
-            if patch.value == '':
-                if patch.attribute in node.keys():
-                    node.attrib.pop(patch.attribute)
-            else:
-                node.set(patch.attribute, patch.value)
-
-        # Put changes back.
-        # TODO: maybe delay this until all patches get applied, putting
-        # back before returning.
-        game_file.Update_Root(root)
+                # Either update or remove the attribute.
+                # Assume it is safe to delete if the value is an empty string.
+                if patch.value == '':
+                    edit.Set(node, patch.attribute, None)
+                else:
+                    edit.Set(node, patch.attribute, patch.value)
                 
     return
\ No newline at end of file
@@ -1,9 +1,7 @@
 
-from fnmatch import fnmatch
-from Framework import Transform_Wrapper, Load_File, File_System
-from .Support import Standardize_Match_Rules
-from .Support import XML_Multiply_Int_Attribute
-from .Support import XML_Multiply_Float_Attribute
+from Framework import Transform_Wrapper, Load_File, File_System, Edit_Planner
+from .Support import Match_Rules
+from .Support import Attribute_Batch
 
 doc_matching_rules = '''
     Ship transforms will commonly use a group of matching rules
@@ -76,7 +74,7 @@ which case all of these fields become unique but may only apply
 to newly constructed ships.
 '''
 
-@Transform_Wrapper(shared_docs = doc_matching_rules)
+@Transform_Wrapper(shared_docs = doc_matching_rules, queues_edits = True)
 def Adjust_Ship_Speed(
         *match_rule_multipliers
     ):
@@ -86,37 +84,43 @@ def Adjust_Ship_Speed(
     * match_rule_multipliers:
       - Series of matching rules paired with the multipliers to use.
     '''
-    # Put matching rules in standard form.
-    rules = Standardize_Match_Rules(match_rule_multipliers)
+    # Compile the matching rules.
+    rules = Match_Rules(match_rule_multipliers)
+    batch = Attribute_Batch('Adjust_Ship_Speed')
            
     game_files = File_System.Get_All_Indexed_Files('macros','ship_*')
-    for game_file in game_files:
-        xml_root = game_file.Get_Root()
-        # There may be multiple macros in a file (though generally
-        # this isn't expected).
-        ship_macros = xml_root.findall('./macro')
-
-        for ship_macro in ship_macros:
-            multiplier = Get_Match_Rule_Args(ship_macro, rules)
-            if multiplier == None:
-                continue
-
-            # These will all work on the inverted multiplier, since
-            # they reduce speed/acceleration.
-            inv_mult = 1/multiplier
-
-            # The fields to change are scattered under the physics node.
-            physics_node = ship_macro.find('./properties/physics')
-            drag_node = physics_node.find('./drag')
-            inertia_node = physics_node.find('./inertia')
-
-            XML_Multiply_Float_Attribute(physics_node, 'mass', inv_mult)
-            for drag_field in ['forward', 'reverse', 'horizontal', 'vertical']:
-                XML_Multiply_Float_Attribute(drag_node, drag_field, inv_mult)
-                
-        # Put the changes back.
-        game_file.Update_Root(xml_root)
 
+    def Edit_Ships(edits):
+        for edit in edits.values():
+            # There may be multiple macros in a file (though generally
+            # this isn't expected).
+            ship_macros = edit.root.findall('./macro')
+
+            # Pair matched macros with their multipliers.
+            for ship_macro, multiplier in rules.Gen_Matched_Args(
+                    ship_macros, ship_match_key_getters):
+
+                # These will all work on the inverted multiplier, since
+                # they reduce speed/acceleration.
+                inv_mult = 1/multiplier
+
+                # The fields to change are scattered under the physics node.
+                physics_node = ship_macro.find('./properties/physics')
+                drag_node = physics_node.find('./drag')
+                inertia_node = physics_node.find('./inertia')
+
+                batch.Add(physics_node, 'mass', inv_mult, edit = edit)
+                for drag_field in ['forward', 'reverse', 'horizontal', 'vertical']:
+                    batch.Add(drag_node, drag_field, inv_mult, edit = edit)
+
+        # Write back the changes to all files together.
+        batch.Apply()
+        return
+
+    # Edit in place, possibly queued with other transforms; changes
+    # are rolled back if an error occurs.
+    Edit_Planner.Edit_Files(game_files, Edit_Ships)
+    Edit_Planner.After_Edits(batch.Report)
     return
 
 
@@ -124,43 +128,27 @@ def Adjust_Ship_Speed(
 ##############################################################################
 # Support functions.
 
-def Get_Match_Rule_Args(ship_macro_xml, rules):
+def _Get_Ship_Type(ship_macro_xml):
     '''
-    Checks a ship macro against the given rules, and returns args from
-    the first matched rule (as a tuple of there is more than 1 arg).
-    On no match, returns None.
+    Returns the type of a ship macro, or None if it has none.
+    '''
+    # Not all ships have a type or purpose (mainly just spacesuits don't).
+    node = ship_macro_xml.find('./properties/ship')
+    return node.get('type') if node != None else None
+
 
-    * ship_macro_xml
-      - The xml node with the specific ship macro.
+def _Get_Ship_Purpose(ship_macro_xml):
     '''
-    assert ship_macro_xml.tag == 'macro'
+    Returns the primary purpose of a ship macro, or None if it has none.
+    '''
+    node = ship_macro_xml.find('./properties/purpose')
+    return node.get('primary') if node != None else None
 
-    # Look up properties of interest.
-    name = ship_macro_xml.get('name')
-    class_name = ship_macro_xml.get('class')
 
-    # Not all ships have a type or purpose (mainly just spacesuits don't).
-    try:
-        type = ship_macro_xml.find('./properties/ship').get('type')
-    except Exception:
-        type = None
-    try:
-        purpose = ship_macro_xml.find('./properties/purpose').get('primary')
-    except Exception:
-        purpose = None
-
-    # Check the matching rules.
-    for key, value, *args in rules:
-        if((key == '*')
-        or (key == 'name'    and fnmatch(name, value))
-        or (key == 'class'   and class_name == value)
-        or (key == 'type'    and type == value)
-        or (key == 'purpose' and purpose == value)
-        ):
-            # Want to return 1 item is there are 1 arg, else a tuple
-            # or list of them. Python has no clean syntax for this
-            # that is obvious.
-            if len(args) == 1:
-                return args[0]
-            return args
-    return None
\ No newline at end of file
+# Functions to look up the match rule keys of ship macro nodes.
+ship_match_key_getters = {
+    'name'    : lambda x: x.get('name'),
+    'class'   : lambda x: x.get('class'),
+    'type'    : _Get_Ship_Type,
+    'purpose' : _Get_Ship_Purpose,
+    }
\ No newline at end of file
@@ -1,6 +1,16 @@
 '''
 Various shared support functions for the transforms.
 '''
+import os
+import re
+from fnmatch import translate
+from Framework import Plugin_Log
+
+# Numpy is optional; bulk attribute math falls back on plain python.
+try:
+    import numpy
+except Exception:
+    numpy = None
 
 # TODO: maybe move this to Analyses.
 def Float_to_String(this_float, precision = 2):
@@ -55,6 +65,197 @@ def Standardize_Match_Rules(rules):
     return rule_list
 
 
+class Match_Rules:
+    '''
+    Compiled set of matching rules, for finding the first rule matched
+    by each of a group of objects in bulk.
+    Rules are standardized and compiled once: wildcard match values
+    to regex patterns, tag match values to frozensets, and substring
+    match values to tuples of terms.
+    Objects are matched by first extracting their match keys into
+    columns (lists with one value per object), after which each rule is
+    checked against only the objects not yet matched.
+
+    Attributes:
+    * rules
+      - List of standard form rule tuples, as from Standardize_Match_Rules.
+    * compiled_rules
+      - List of tuples of (key, match, args), in rule order, where match
+        is a compiled regex for wildcard keys, a frozenset for tag keys,
+        a tuple of terms for substring keys, or the match string otherwise.
+    * wildcard_keys
+      - Set of keys whose match values support wildcards.
+    * tag_keys
+      - Set of keys whose match values are space separated tags, which
+        all need to be present in the object's tags.
+    * substring_keys
+      - Set of keys whose match values are space separated terms, which
+        all need to be present somewhere in the object's value string,
+        eg. for tags matched by plain text search.
+    * used_keys
+      - Set of keys used by any rule, excluding '*'.
+    '''
+    def __init__(self, rules, wildcard_keys = ('name','id'), tag_keys = ('tags',),
+                 substring_keys = ()):
+        self.rules = Standardize_Match_Rules(rules)
+        self.wildcard_keys = set(wildcard_keys)
+        self.tag_keys = set(tag_keys)
+        self.substring_keys = set(substring_keys)
+        self.compiled_rules = []
+        self.used_keys = set()
+
+        for key, value, *args in self.rules:
+            if key == '*':
+                match = None
+            elif key in self.wildcard_keys:
+                # Normalize case as fnmatch does, to match the same names.
+                match = re.compile(translate(os.path.normcase(value)))
+            elif key in self.tag_keys:
+                # Drop blanks from excess spaces.
+                match = frozenset(x for x in value.split(' ') if x)
+            elif key in self.substring_keys:
+                # Blank terms would match anything, so can be dropped.
+                match = tuple(x for x in value.split(' ') if x)
+            else:
+                match = value
+            if key != '*':
+                self.used_keys.add(key)
+            self.compiled_rules.append((key, match, args))
+        return
+
+
+    def Get_Args(self, rule_index):
+        '''
+        Returns the args of the rule at the given index, as a single
+        value if there is one arg, else as a list.
+        '''
+        args = self.compiled_rules[rule_index][2]
+        if len(args) == 1:
+            return args[0]
+        return args
+
+
+    def Get_Rule_Indices(self, columns, count):
+        '''
+        Returns a list with, for each object, the index of the first
+        rule it matched, or None if no rule matched.
+
+        * columns
+          - Dict, keyed by match key, holding lists of the objects'
+            values for that key, in object order.
+          - Tag keys should hold sets of tags (or None).
+          - Substring keys should hold strings (or None).
+          - Keys not present never match.
+        * count
+          - Int, the number of objects.
+        '''
+        rule_indices = [None] * count
+        # Object indices yet to be matched.
+        unmatched = set(range(count))
+        # Per column lookups, built as rules need them.
+        value_groups = {}
+        tag_groups = {}
+
+        for rule_index, (key, match, args) in enumerate(self.compiled_rules):
+            if not unmatched:
+                break
+
+            if key == '*':
+                matched = unmatched
+
+            elif key not in columns:
+                continue
+
+            elif key in self.wildcard_keys:
+                # Test each distinct value once.
+                groups = _Get_Value_Groups(value_groups, columns, key)
+                matched = set()
+                for value, indices in groups.items():
+                    if value != None and match.match(os.path.normcase(value)):
+                        matched.update(indices)
+                matched &= unmatched
+
+            elif key in self.substring_keys:
+                # Test each distinct value string once.
+                groups = _Get_Value_Groups(value_groups, columns, key)
+                matched = set()
+                for value, indices in groups.items():
+                    if value != None and all(x in value for x in match):
+                        matched.update(indices)
+                matched &= unmatched
+
+            elif key in self.tag_keys:
+                # Intersect the objects holding each tag.
+                groups = _Get_Tag_Groups(tag_groups, columns, key)
+                matched = set(unmatched)
+                for tag in match:
+                    matched &= groups.get(tag, set())
+
+            else:
+                groups = _Get_Value_Groups(value_groups, columns, key)
+                matched = groups.get(match, set()) & unmatched
+
+            for index in matched:
+                rule_indices[index] = rule_index
+            unmatched = unmatched - matched
+        return rule_indices
+
+
+    def Gen_Matched_Args(self, objects, key_getters):
+        '''
+        Generator that yields tuples of (object, args) for each of the
+        objects that matched a rule, in object order, with args as
+        from Get_Args for the first matched rule.
+
+        * objects
+          - List of objects to match.
+        * key_getters
+          - Dict, keyed by match key, of functions which take an object
+            and return its value for that key.
+          - Only keys used by the rules are looked up, in a single
+            pass over the objects.
+        '''
+        objects = list(objects)
+        columns = {key: [] for key in self.used_keys if key in key_getters}
+        getters = [(key_getters[key], columns[key]) for key in columns]
+        for this_object in objects:
+            for getter, column in getters:
+                column.append(getter(this_object))
+
+        rule_indices = self.Get_Rule_Indices(columns, len(objects))
+        for this_object, rule_index in zip(objects, rule_indices):
+            if rule_index != None:
+                yield this_object, self.Get_Args(rule_index)
+        return
+
+
+def _Get_Value_Groups(value_groups, columns, key):
+    '''
+    Returns a dict keyed by the distinct values of a column, holding
+    sets of the object indices with that value, building it if needed.
+    '''
+    if key not in value_groups:
+        groups = value_groups[key] = {}
+        for index, value in enumerate(columns[key]):
+            groups.setdefault(value, set()).add(index)
+    return value_groups[key]
+
+
+def _Get_Tag_Groups(tag_groups, columns, key):
+    '''
+    Returns a dict keyed by tag, holding sets of the object indices
+    with that tag in a tags column, building it if needed.
+    '''
+    if key not in tag_groups:
+        groups = tag_groups[key] = {}
+        for index, tags in enumerate(columns[key]):
+            if not tags:
+                continue
+            for tag in tags:
+                groups.setdefault(tag, set()).add(index)
+    return tag_groups[key]
+
+
 
 def XML_Multiply_Int_Attribute(node, attr, multiplier):
     '''
@@ -88,4 +289,202 @@ def XML_Multiply_Float_Attribute(node, attr, multiplier):
     #  to do this in python, sadly.
     new_value_str = '{:.2f}'.format(new_value).rstrip('0').rstrip('.')
     node.set(attr, new_value_str)
-    return
\ No newline at end of file
+    return
+
+
+class Attribute_Batch:
+    '''
+    Batch of numeric xml attribute edits, gathered over a transform and
+    applied together. Each target attribute is scaled about a center
+    value by a multiplier, optionally clamped, then rounded and written
+    back as a string, following the same rules as
+    XML_Multiply_Int_Attribute and XML_Multiply_Float_Attribute.
+    When numpy is available the math is vectorized over all targets.
+    Targets may come from several files, each changed through its own
+    XML_Edit, so that a transform can gather all of its edits and
+    apply them once. An attribute targeted more than once is edited
+    in order, as if each edit were made after the prior one.
+    Change counts accumulate until reported.
+
+    Attributes:
+    * name
+      - Optional string, name used when reporting the change count to
+        the plugin log, normally the transform name.
+    * targets
+      - List of tuples of (node, attribute, is_int, edit), in order added.
+    * columns
+      - Dict of lists, one value per target, keyed by 'multiplier',
+        'center', 'min', and 'max'.
+    * change_count
+      - Int, number of attribute values changed by all Apply calls.
+    * target_count
+      - Int, number of distinct node attributes given to all Apply calls.
+    '''
+    def __init__(self, name = None):
+        self.name = name
+        self.targets = []
+        self.columns = {'multiplier': [], 'center': [], 'min': [], 'max': []}
+        self.change_count = 0
+        self.target_count = 0
+        return
+
+
+    def Add(
+            self,
+            node,
+            attribute,
+            multiplier = 1,
+            is_int = False,
+            center = 0,
+            min_value = None,
+            max_value = None,
+            edit = None,
+        ):
+        '''
+        Adds a target attribute to the batch. Nodes missing the
+        attribute are skipped.
+
+        * node, attribute
+          - The xml node and name of its numeric attribute to edit.
+        * multiplier
+          - Number, multiplier on the value's distance from the center.
+        * is_int
+          - Bool, if True the result is rounded to an int, with a
+            minimum of 1 if the original value and multiplier were
+            positive; else it is kept to 2 decimal places.
+        * center
+          - Number, value to scale about; the default of 0 gives a
+            plain multiplication.
+        * min_value, max_value
+          - Optional numbers, limits on the result.
+        * edit
+          - Optional open XML_Edit holding the node, used by Apply to
+            make the change so that it can be rolled back.
+        '''
+        if node.get(attribute) == None:
+            return
+        self.targets.append((node, attribute, is_int, edit))
+        self.columns['multiplier'].append(multiplier)
+        self.columns['center'].append(center)
+        self.columns['min'].append(float('-inf') if min_value == None else min_value)
+        self.columns['max'].append(float('inf') if max_value == None else max_value)
+        return
+
+
+    def Add_All(self, node, multiplier = 1, is_int = False, **kwargs):
+        '''
+        Adds all attributes of a node, with the same multiplier.
+        Other args are passed on to Add.
+        '''
+        for attribute in node.keys():
+            self.Add(node, attribute, multiplier, is_int, **kwargs)
+        return
+
+
+    def Get_New_Values(self, indices = None):
+        '''
+        Returns a list of new value strings, computed from the current
+        node values, one per target.
+
+        * indices
+          - Optional list of indices of the targets to compute;
+            defaults to all targets.
+        '''
+        if indices == None:
+            indices = range(len(self.targets))
+        if not indices:
+            return []
+        targets    = [self.targets[x] for x in indices]
+        columns    = {key : [column[x] for x in indices]
+                      for key, column in self.columns.items()}
+        value_strs = [node.get(attribute) for node, attribute, *_ in targets]
+        is_ints    = [is_int for _, _, is_int, _ in targets]
+
+        # Clamping comes before rounding, so that ints stay ints
+        # when a limit isn't a whole number.
+        if numpy != None:
+            values      = numpy.array(value_strs, dtype = float)
+            multipliers = numpy.array(columns['multiplier'], dtype = float)
+            centers     = numpy.array(columns['center'], dtype = float)
+            int_flags   = numpy.array(is_ints, dtype = bool)
+            new_values  = centers + (values - centers) * multipliers
+            new_values  = numpy.clip(new_values,
+                                     numpy.array(columns['min'], dtype = float),
+                                     numpy.array(columns['max'], dtype = float))
+            # Python and numpy both round halves to even.
+            rounded = numpy.round(new_values)
+            # Ints that rounded to 0 from positive terms become 1.
+            rounded[(rounded == 0) & (values > 0) & (multipliers > 0)] = 1
+            new_values = numpy.where(int_flags, rounded, new_values).tolist()
+        else:
+            new_values = []
+            for value_str, is_int, multiplier, center, min_value, max_value in zip(
+                    value_strs, is_ints, *columns.values()):
+                value = float(value_str)
+                new_value = center + (value - center) * multiplier
+                new_value = min(max(new_value, min_value), max_value)
+                if is_int:
+                    new_value = round(new_value)
+                    if new_value == 0 and value > 0 and multiplier > 0:
+                        new_value = 1
+                new_values.append(new_value)
+
+        # Convert to strings.
+        return [str(int(x)) if is_int else Float_to_String(x)
+                for x, is_int in zip(new_values, is_ints)]
+
+
+    def Apply(self):
+        '''
+        Writes the new values to all targets whose value changed, and
+        returns the number of attribute values changed. The targets are
+        cleared afterward.
+        '''
+        # Targets that repeat a node attribute go into later passes,
+        # which are computed from the results of earlier passes, to
+        # match edits made one after another.
+        passes = []
+        pass_counts = {}
+        for index, (node, attribute, *_) in enumerate(self.targets):
+            key = (node, attribute)
+            pass_number = pass_counts.get(key, 0)
+            pass_counts[key] = pass_number + 1
+            if pass_number == len(passes):
+                passes.append([])
+            passes[pass_number].append(index)
+
+        # Original values of changed attributes, keyed by (node, attribute).
+        original_values = {}
+        for indices in passes:
+            for index, new_value in zip(indices, self.Get_New_Values(indices)):
+                node, attribute, _, edit = self.targets[index]
+                value = node.get(attribute)
+                if value == new_value:
+                    continue
+                original_values.setdefault((node, attribute), value)
+                if edit != None:
+                    edit.Set(node, attribute, new_value)
+                else:
+                    node.set(attribute, new_value)
+        change_count = sum(1 for (node, attribute), value in original_values.items()
+                           if node.get(attribute) != value)
+
+        self.change_count += change_count
+        self.target_count += len(pass_counts)
+        self.targets = []
+        for column in self.columns.values():
+            column.clear()
+        return change_count
+
+
+    def Report(self):
+        '''
+        Prints the accumulated change count to the plugin log, if this
+        batch has a name, and resets the counts.
+        '''
+        if self.name != None:
+            Plugin_Log.Print('{}: changed {} of {} attribute values.'.format(
+                self.name, self.change_count, self.target_count))
+        self.change_count = 0
+        self.target_count = 0
+        return
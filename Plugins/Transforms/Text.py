@@ -1,6 +1,7 @@
 
 
 from Framework import Transform_Wrapper, Settings, Load_File, File_System
+from Framework import Text_Catalog
 
 @Transform_Wrapper(category = 'Text')
 def Color_Text(
@@ -28,30 +29,31 @@ def Color_Text(
     # TODO: add a list of support colors to the doc.
     # TODO: verify input.
 
-    # Load all text files.
-    game_files = File_System.Load_Files('t/*.xml')
+    # Find the text files holding any of the nodes, so that other
+    # languages are not loaded.
+    virtual_paths = Text_Catalog.Get_Paths_With_Text(
+        [(page, text) for page, text, color in page_t_colors])
 
     # Loop over them.
-    for game_file in game_files:
-        xml_root = game_file.Get_Root()
-
-        # Loop over the colorings.
-        change_found = False
-        for page, text, color in page_t_colors:
-            # Look up the node.
-            node = xml_root.find('./page[@id="{}"]/t[@id="{}"]'.format(page,text))
-            # Skip on missing node.
-            if node == None:
-                continue
-            # Prefix and suffix it with color.
-            node.text = r'\033{}{}\033X'.format(color, node.text)
-            change_found = True
+    for virtual_path in virtual_paths:
+        game_file = Load_File(virtual_path)
+        # Edit in place; the file is only flagged as modified if
+        # some text was colored.
+        with game_file.Begin_Edit() as edit:
+
+            # Loop over the colorings.
+            for page, text, color in page_t_colors:
+                # Look up the node.
+                node = edit.root.find('./page[@id="{}"]/t[@id="{}"]'.format(page,text))
+                # Skip on missing node.
+                if node == None:
+                    continue
+                # Prefix and suffix it with color.
+                edit.Set_Text(node, r'\033{}{}\033X'.format(color, node.text))
         
-        # TODO: delay this until after all loops complete, in
+        # TODO: delay committing until after all loops complete, in
         # case a later one has an error, to safely cancel the
         # whole transform.
-        if change_found:
-            game_file.Update_Root(xml_root)
 
     return
 
@@ -1,8 +1,7 @@
 '''
 Transforms to wares.
 '''
-from fnmatch import fnmatch
-from Framework import Transform_Wrapper, Load_File
+from Framework import Transform_Wrapper, Load_File, Edit_Planner
 from .Support import *
 
 # Shared documentation.
@@ -36,7 +35,7 @@ doc_matching_rules = '''
     </code>
     '''
 
-@Transform_Wrapper(shared_docs = doc_matching_rules)
+@Transform_Wrapper(shared_docs = doc_matching_rules, queues_edits = True)
 def Adjust_Ware_Price_Spread(
         # Allow multipliers to be given as a loose list of args.
         *match_rule_multipliers
@@ -50,47 +49,54 @@ def Adjust_Ware_Price_Spread(
       - Series of matching rules paired with the spread multipliers to use.
     '''
     wares_file = Load_File('libraries/wares.xml')
-    xml_root = wares_file.Get_Root()
-
-    # Get wars paired with multipliers.
-    for ware, multiplier in Gen_Wares_Matched_To_Args(xml_root, match_rule_multipliers):
-        
-        # Look up the existing spread.
-        price_node = ware.find('./price')
-        price_min  = int(price_node.get('min'))
-        price_avg  = int(price_node.get('average'))
-        price_max  = int(price_node.get('max'))
-
-        # If price is 0 or 1, just skip.
-        if price_avg in [0,1]:
-            continue
-
-        # Can individually adjust the min and max separations from average.
-        new_min = round(price_avg - (price_avg - price_min) * multiplier)
-        new_max = round(price_avg + (price_max - price_avg) * multiplier)
-
-        # Limit to a spread of 10 credits or more from min to max,
-        # or 5 from average.
-        if new_min > price_avg - 5:
-            new_min = price_avg - 5
-        if new_max < price_avg + 5:
-            new_max = price_avg + 5
-
-        # If min dropped to 0, bump it back to 1.
-        if new_min <= 0:
-            new_min = 1
-            # Adjust max to have the same spread from average.
-            new_max = price_avg + (price_avg - new_min)
+    batch = Attribute_Batch('Adjust_Ware_Price_Spread')
+
+    def Edit_Wares(edit):
+        # Get wars paired with multipliers.
+        for ware, multiplier in Gen_Wares_Matched_To_Args(edit.root, match_rule_multipliers):
+
+            # Look up the existing spread.
+            price_node = ware.find('./price')
+            price_min  = int(price_node.get('min'))
+            price_avg  = int(price_node.get('average'))
+
+            # If price is 0 or 1, just skip.
+            if price_avg in [0,1]:
+                continue
+
+            # Can individually adjust the min and max separations from average,
+            # scaling them about it.
+            # Limit to a spread of 10 credits or more from min to max,
+            # or 5 from average.
+            new_min = min(round(price_avg - (price_avg - price_min) * multiplier),
+                          price_avg - 5)
+
+            # If min would drop to 0, bump it back to 1, and adjust max to
+            # have the same spread from average.
+            if new_min <= 0:
+                batch.Add(price_node, 'min', 0, is_int = True, center = 1,
+                          edit = edit)
+                batch.Add(price_node, 'max', 0, is_int = True,
+                          center = price_avg + (price_avg - 1), edit = edit)
+            else:
+                batch.Add(price_node, 'min', multiplier, is_int = True,
+                          center = price_avg, max_value = price_avg - 5,
+                          edit = edit)
+                batch.Add(price_node, 'max', multiplier, is_int = True,
+                          center = price_avg, min_value = price_avg + 5,
+                          edit = edit)
 
         # Put them back.
-        price_node.set('min', str(int(new_min)))
-        price_node.set('max', str(int(new_max)))
+        batch.Apply()
+        return
 
-    wares_file.Update_Root(xml_root)
+    # Apply the edit, possibly queued with other transforms.
+    Edit_Planner.Edit_Root(wares_file, Edit_Wares)
+    Edit_Planner.After_Edits(batch.Report)
     return
 
 
-@Transform_Wrapper(shared_docs = doc_matching_rules)
+@Transform_Wrapper(shared_docs = doc_matching_rules, queues_edits = True)
 def Adjust_Ware_Prices(
         # Allow multipliers to be given as a loose list of args.
         *match_rule_multipliers
@@ -103,17 +109,21 @@ def Adjust_Ware_Prices(
       - Series of matching rules paired with the spread multipliers to use.
     '''
     wares_file = Load_File('libraries/wares.xml')
-    xml_root = wares_file.Get_Root()
-
-    # Get wars paired with multipliers.
-    for ware, multiplier in Gen_Wares_Matched_To_Args(xml_root, match_rule_multipliers):
-        
-        # Adjust everything in the price subnode.
-        price = ware.find('price')
-        for name, value in price.items():
-            XML_Multiply_Int_Attribute(price, name, multiplier)
+    batch = Attribute_Batch('Adjust_Ware_Prices')
+
+    def Edit_Wares(edit):
+        # Get wars paired with multipliers.
+        for ware, multiplier in Gen_Wares_Matched_To_Args(edit.root, match_rule_multipliers):
             
-    wares_file.Update_Root(xml_root)
+            # Adjust everything in the price subnode.
+            batch.Add_All(ware.find('price'), multiplier, is_int = True,
+                          edit = edit)
+        batch.Apply()
+        return
+
+    # Apply the edit, possibly queued with other transforms.
+    Edit_Planner.Edit_Root(wares_file, Edit_Wares)
+    Edit_Planner.After_Edits(batch.Report)
     return
 
 
@@ -127,36 +137,22 @@ def Gen_Wares_Matched_To_Args(ware_xml_root, match_rule_args):
     based on the weapon matching a rule in match_rule_args.
     The args may be a single value or a list of values.
     '''
-    # Put matching rules in standard form.
-    rules = Standardize_Match_Rules(match_rule_args)
-    
+    # Compile the matching rules.
+    # Ware tags are matched by plain text search of the tags string,
+    # so eg. "container" also matches "containers".
+    rules = Match_Rules(match_rule_args, tag_keys = (), 
+                        substring_keys = ('tags',))
     # Loop over the ware nodes; only first level children.
-    for ware in ware_xml_root.findall('./ware'):
-        
-        # Look up the tags and a couple other properties of interest.
-        ware_id     = ware.get('id')
-        group       = ware.get('group')
-        container   = ware.get('transport')
-        tags        = ware.get('tags', '')
-        
-        # Check the matching rules.
-        match_args = None
-        for key, value, *args in rules:
-            if((key == '*')
-            or (key == 'id' and fnmatch(ware_id, value))
-            or (key == 'group' and group == value)
-            or (key == 'container' and container == value)
-            # Check all tags, space separated.
-            or (key == 'tags' and all(x in tags for x in value.split(' ')))
-            ):
-                match_args = args
-                break
-        # Skip if no match.
-        if match_args == None:
-            continue
-        
-        # Isolate a single arg out of the list.
-        if len(match_args) == 1:
-            match_args = match_args[0]
-        yield ware, match_args
-    return
\ No newline at end of file
+    yield from rules.Gen_Matched_Args(
+        ware_xml_root.findall('./ware'), ware_match_key_getters)
+    return
+
+
+# Functions to look up the match rule keys of ware nodes.
+ware_match_key_getters = {
+    'id'        : lambda x: x.get('id'),
+    'group'     : lambda x: x.get('group'),
+    'container' : lambda x: x.get('transport'),
+    # Tags are searched as a plain string.
+    'tags'      : lambda x: x.get('tags', ''),
+    }
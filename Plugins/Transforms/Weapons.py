@@ -32,11 +32,9 @@ Notes on reload times:
 
         
 '''
-from fnmatch import fnmatch
-from Framework import Transform_Wrapper, Load_File, File_System
-from .Support import Standardize_Match_Rules
-from .Support import XML_Multiply_Int_Attribute
-from .Support import XML_Multiply_Float_Attribute
+from Framework import Transform_Wrapper, Load_File, File_System, Edit_Planner
+from .Support import Match_Rules
+from .Support import Attribute_Batch
 
 doc_matching_rules = '''
     Weapon transforms will commonly use a group of matching rules
@@ -73,7 +71,7 @@ doc_matching_rules = '''
     </code>
     '''
 
-@Transform_Wrapper(shared_docs = doc_matching_rules)
+@Transform_Wrapper(shared_docs = doc_matching_rules, queues_edits = True)
 def Adjust_Weapon_Damage(
         # Allow multipliers to be given as a loose list of args.
         *match_rule_multipliers
@@ -85,26 +83,19 @@ def Adjust_Weapon_Damage(
     * match_rule_multipliers:
       - Series of matching rules paired with the damage multipliers to use.
     '''
-    # Iterate through weapons that had matches.
-    for weapon, multiplier in Gen_Weapons_Matched_To_Args(match_rule_multipliers):
-
-        # Grab the bullet to be edited.
-        bullet_root = weapon.bullet_file.Get_Root()
-        Adjust_Bullet_Damage(bullet_root, multiplier)
-        
-        ## Quick test of fire rates.
-        #if bullet_root.find('.//macro').get('name') == 'bullet_gen_s_laser_01_mk1_macro':
-        #    ammo_node = bullet_root.find('.//ammunition')
-        #    ammo_node.set('value', '14')
-        #    print('testing basic laser ammo max upscale')
-
-        # Put the changes back.
-        weapon.bullet_file.Update_Root(bullet_root)
+    # Edit the bullets, possibly queued with other transforms.
+    _Edit_Matched_Bullets('Adjust_Weapon_Damage', match_rule_multipliers,
+                          Adjust_Bullet_Damage)
+
+    ## Quick test of fire rates.
+    #if bullet_root.find('.//macro').get('name') == 'bullet_gen_s_laser_01_mk1_macro':
+    #    ammo_node = bullet_root.find('.//ammunition')
+    #    ammo_node.set('value', '14')
+    #    print('testing basic laser ammo max upscale')
     return
 
 
-
-@Transform_Wrapper(shared_docs = doc_matching_rules)
+@Transform_Wrapper(shared_docs = doc_matching_rules, queues_edits = True)
 def Adjust_Weapon_Range(
         # Allow multipliers to be given as a loose list of args.
         *match_rule_multipliers
@@ -115,38 +106,39 @@ def Adjust_Weapon_Range(
     * match_rule_multipliers:
       - Series of matching rules paired with the range multipliers to use.
     '''
-    # Iterate through weapons that had matches.
-    for weapon, multiplier in Gen_Weapons_Matched_To_Args(match_rule_multipliers):
-
-        # Grab the bullet to be edited.
-        bullet_root = weapon.bullet_file.Get_Root()
-
-        # Note: range works somewhat differently for different bullet
-        # types.
-        # - Beams have range, lifetime, and speed; perhaps lifetime is
-        #   just beam minimum duration, and range can be edited directly.
-        # - Missiles have range and lifetime; edit range.
-        # - Others have lifetime and speed; need to adjust lifetime.
-
-        # Look into the missile or bullet node.
-        for tag in ['bullet','missile']:
-            node = bullet_root.find('.//'+tag)
-            if node == None:
-                continue
+    # Edit the bullets, possibly queued with other transforms.
+    _Edit_Matched_Bullets('Adjust_Weapon_Range', match_rule_multipliers,
+                          _Add_Bullet_Range)
+    return
+
+
+def _Add_Bullet_Range(bullet_root, multiplier, batch, edit):
+    '''
+    Adds a bullet's attributes to the batch for Adjust_Weapon_Range.
+    '''
+    # Note: range works somewhat differently for different bullet
+    # types.
+    # - Beams have range, lifetime, and speed; perhaps lifetime is
+    #   just beam minimum duration, and range can be edited directly.
+    # - Missiles have range and lifetime; edit range.
+    # - Others have lifetime and speed; need to adjust lifetime.
+
+    # Look into the missile or bullet node.
+    for tag in ['bullet','missile']:
+        node = bullet_root.find('.//'+tag)
+        if node == None:
+            continue
 
-            # If it has range, edit that.
-            if node.get('range') != None:
-                XML_Multiply_Float_Attribute(node, 'range', multiplier)
-            # Otherwise, edit lifetime.
-            elif node.get('lifetime') != None:
-                XML_Multiply_Float_Attribute(node, 'lifetime', multiplier)
-                
-        # Put the changes back.
-        weapon.bullet_file.Update_Root(bullet_root)
+        # If it has range, edit that.
+        if node.get('range') != None:
+            batch.Add(node, 'range', multiplier, edit = edit)
+        # Otherwise, edit lifetime.
+        elif node.get('lifetime') != None:
+            batch.Add(node, 'lifetime', multiplier, edit = edit)
     return
 
 
-@Transform_Wrapper(shared_docs = doc_matching_rules)
+@Transform_Wrapper(shared_docs = doc_matching_rules, queues_edits = True)
 def Adjust_Weapon_Shot_Speed(
         # Allow multipliers to be given as a loose list of args.
         *match_rule_multipliers
@@ -157,50 +149,51 @@ def Adjust_Weapon_Shot_Speed(
     * match_rule_multipliers:
       - Series of matching rules paired with the speed multipliers to use.
     '''
-    # Iterate through weapons that had matches.
-    for weapon, multiplier in Gen_Weapons_Matched_To_Args(match_rule_multipliers):
-
-        # Grab the bullet to be edited.
-        bullet_root = weapon.bullet_file.Get_Root()
-
-        # Note: range works somewhat differently for different bullet
-        # types.
-        # - Beams have range, lifetime, and speed; edit just speed.
-        # - Missiles have range and lifetime; edit lifetime?
-        # - Others have lifetime and speed; edit speed and adjust lifetime.
-
-        # Look into the missile or bullet node.
-        for tag in ['bullet','missile']:
-            node = bullet_root.find('.//'+tag)
-            if node == None:
-                continue
+    # Edit the bullets, possibly queued with other transforms.
+    _Edit_Matched_Bullets('Adjust_Weapon_Shot_Speed', match_rule_multipliers,
+                          _Add_Bullet_Shot_Speed)
+    return
+
 
-            # Check for all 3 fields.
-            if all(x in node.attrib for x in ['range','lifetime','speed']):
-                # Edit just speed.
-                XML_Multiply_Float_Attribute(node, 'speed', multiplier)
-
-            # Check for range and lifetime.
-            elif all(x in node.attrib for x in ['range','lifetime']):
-                # Edit just lifetime, reducing it.
-                # TODO: test if this works out in game; it's unclear on
-                #  how else missile speed is set, unless they have
-                #  fixed thrust and uncapped speed and accelerate
-                #  based on mass.
-                XML_Multiply_Float_Attribute(node, 'lifetime', 1/multiplier)
-                
-            # Check for speed and lifetime.
-            elif all(x in node.attrib for x in ['speed','lifetime']):
-                # Bump speed, decrease lifetime.
-                XML_Multiply_Float_Attribute(node, 'speed', multiplier)
-                XML_Multiply_Float_Attribute(node, 'lifetime', 1/multiplier)
-                                
-        # Put the changes back.
-        weapon.bullet_file.Update_Root(bullet_root)
+def _Add_Bullet_Shot_Speed(bullet_root, multiplier, batch, edit):
+    '''
+    Adds a bullet's attributes to the batch for Adjust_Weapon_Shot_Speed.
+    '''
+    # Note: range works somewhat differently for different bullet
+    # types.
+    # - Beams have range, lifetime, and speed; edit just speed.
+    # - Missiles have range and lifetime; edit lifetime?
+    # - Others have lifetime and speed; edit speed and adjust lifetime.
+
+    # Look into the missile or bullet node.
+    for tag in ['bullet','missile']:
+        node = bullet_root.find('.//'+tag)
+        if node == None:
+            continue
+
+        # Check for all 3 fields.
+        if all(x in node.attrib for x in ['range','lifetime','speed']):
+            # Edit just speed.
+            batch.Add(node, 'speed', multiplier, edit = edit)
+
+        # Check for range and lifetime.
+        elif all(x in node.attrib for x in ['range','lifetime']):
+            # Edit just lifetime, reducing it.
+            # TODO: test if this works out in game; it's unclear on
+            #  how else missile speed is set, unless they have
+            #  fixed thrust and uncapped speed and accelerate
+            #  based on mass.
+            batch.Add(node, 'lifetime', 1/multiplier, edit = edit)
+            
+        # Check for speed and lifetime.
+        elif all(x in node.attrib for x in ['speed','lifetime']):
+            # Bump speed, decrease lifetime.
+            batch.Add(node, 'speed', multiplier, edit = edit)
+            batch.Add(node, 'lifetime', 1/multiplier, edit = edit)
     return
 
 
-@Transform_Wrapper(shared_docs = doc_matching_rules)
+@Transform_Wrapper(shared_docs = doc_matching_rules, queues_edits = True)
 def Adjust_Weapon_Fire_Rate(
         # Allow multipliers to be given as a loose list of args.
         *match_rule_multipliers
@@ -211,43 +204,44 @@ def Adjust_Weapon_Fire_Rate(
     * match_rule_multipliers:
       - Series of matching rules paired with the RoF multipliers to use.
     '''
-    # Iterate through weapons that had matches.
-    for weapon, multiplier in Gen_Weapons_Matched_To_Args(match_rule_multipliers):
-
-        # Grab the bullet to be edited.
-        bullet_root = weapon.bullet_file.Get_Root()
-
-        # See notes above on rate of fire calculation.
-        # In short, need to edit the 'reload rate', 'reload time',
-        # and 'ammunition reload' fields to cover both normal weapons
-        # and burst weapons (where bursting rate is a combination of
-        # ammo reload and reload rate).
-
-        ammo_node   = bullet_root.find('.//ammunition')
-        reload_node = bullet_root.find('.//reload')
-
-        if ammo_node != None and ammo_node.get('reload'):
-            # Invert the multiplier to reduce reload time.
-            XML_Multiply_Float_Attribute(ammo_node, 'reload', 1/multiplier)
-
-        if reload_node != None and reload_node.get('time'):
-            # Invert the multiplier to reduce reload time.
-            XML_Multiply_Float_Attribute(reload_node, 'time', 1/multiplier)
-
-        if reload_node != None and reload_node.get('rate'):
-            # Keep multiplier as-is.
-            XML_Multiply_Float_Attribute(reload_node, 'rate', multiplier)
-
-        # Reduce the damage to compensate.
-        Adjust_Bullet_Damage(bullet_root, 1/multiplier)
-
-        # Also reduce the heat/bullet, if there is a heat value.
-        heat_node = bullet_root.find('.//heat')
-        if heat_node != None and heat_node.get('value'):
-            XML_Multiply_Float_Attribute(heat_node, 'value', 1/multiplier)
-                                
-        # Put the changes back.
-        weapon.bullet_file.Update_Root(bullet_root)
+    # Edit the bullets, possibly queued with other transforms.
+    _Edit_Matched_Bullets('Adjust_Weapon_Fire_Rate', match_rule_multipliers,
+                          _Add_Bullet_Fire_Rate)
+    return
+
+
+def _Add_Bullet_Fire_Rate(bullet_root, multiplier, batch, edit):
+    '''
+    Adds a bullet's attributes to the batch for Adjust_Weapon_Fire_Rate.
+    '''
+    # See notes above on rate of fire calculation.
+    # In short, need to edit the 'reload rate', 'reload time',
+    # and 'ammunition reload' fields to cover both normal weapons
+    # and burst weapons (where bursting rate is a combination of
+    # ammo reload and reload rate).
+
+    ammo_node   = bullet_root.find('.//ammunition')
+    reload_node = bullet_root.find('.//reload')
+
+    if ammo_node != None and ammo_node.get('reload'):
+        # Invert the multiplier to reduce reload time.
+        batch.Add(ammo_node, 'reload', 1/multiplier, edit = edit)
+
+    if reload_node != None and reload_node.get('time'):
+        # Invert the multiplier to reduce reload time.
+        batch.Add(reload_node, 'time', 1/multiplier, edit = edit)
+
+    if reload_node != None and reload_node.get('rate'):
+        # Keep multiplier as-is.
+        batch.Add(reload_node, 'rate', multiplier, edit = edit)
+
+    # Reduce the damage to compensate.
+    Adjust_Bullet_Damage(bullet_root, 1/multiplier, batch, edit)
+
+    # Also reduce the heat/bullet, if there is a heat value.
+    heat_node = bullet_root.find('.//heat')
+    if heat_node != None and heat_node.get('value'):
+        batch.Add(heat_node, 'value', 1/multiplier, edit = edit)
     return
 
 
@@ -259,11 +253,25 @@ def Adjust_Weapon_Fire_Rate(
 # Support functions.
 
 
-def Adjust_Bullet_Damage(bullet_root, multiplier):
+def Adjust_Bullet_Damage(bullet_root, multiplier, batch = None, edit = None):
     '''
     Shared function for adjusting a bullet's damage.
     Returns nothing; edits the bullet xml directly.
+
+    * batch
+      - Optional Attribute_Batch to add the damage attributes to,
+        for the caller to apply; if not given, they are changed
+        immediately.
+    * edit
+      - Optional open XML_Edit of the bullet, used to make the
+        changes so that they can be rolled back.
     '''
+    if batch == None:
+        local_batch = Attribute_Batch()
+        Adjust_Bullet_Damage(bullet_root, multiplier, local_batch, edit)
+        local_batch.Apply()
+        return
+
     # For damage editing, look for either the damage or explosion_damage
     # node (depending on if normal bullet or missile/mine/bomb).
     for tag in ['damage','explosiondamage']:
@@ -273,8 +281,41 @@ def Adjust_Bullet_Damage(bullet_root, multiplier):
 
         # Adjust all damage attributes (value, hull, shield, repair).
         # Note: these are floats.
-        for name in node.keys():
-            XML_Multiply_Float_Attribute(node, name, multiplier)
+        batch.Add_All(node, multiplier, edit = edit)
+    return
+
+
+def _Edit_Matched_Bullets(transform_name, match_rule_multipliers, add_function):
+    '''
+    Shared code for the weapon transforms, which edits the bullets of
+    matched weapons with a single Attribute_Batch applied to all of them
+    at once, possibly queued with other transforms. The batch's change
+    counts are reported once the edit is applied.
+
+    * transform_name
+      - String, name of the transform, used in the change report.
+    * match_rule_multipliers
+      - Matching rules paired with multipliers, as given to the transform.
+    * add_function
+      - Function which takes (bullet_root, multiplier, batch, edit) and
+        adds the bullet attributes to change to the batch.
+    '''
+    batch = Attribute_Batch(transform_name)
+    # Match the weapons now, against the xml as of this call.
+    weapon_multipliers = list(Gen_Weapons_Matched_To_Args(match_rule_multipliers))
+
+    def Edit_Bullets(edits):
+        # Gather all of the bullet attributes to change.
+        for weapon, multiplier in weapon_multipliers:
+            edit = edits[weapon.bullet_file]
+            add_function(edit.root, multiplier, batch, edit)
+        # Change them together.
+        batch.Apply()
+        return
+
+    Edit_Planner.Edit_Files([x.bullet_file for x, _ in weapon_multipliers],
+                            Edit_Bullets)
+    Edit_Planner.After_Edits(batch.Report)
     return
 
 
@@ -289,19 +330,15 @@ def Gen_Weapons_Matched_To_Args(match_rule_args):
     '''
     # Track which bullets were seen, to avoid repeats.
     bullets_seen = set()
-    # Put matching rules in standard form.
-    rules = Standardize_Match_Rules(match_rule_args)
+    # Compile the matching rules.
+    rules = Match_Rules(match_rule_args)
 
-    # Loop over weapons.
-    for weapon in Get_All_Weapons():
+    # Loop over matched weapons.
+    for weapon, args in rules.Gen_Matched_Args(
+            Get_All_Weapons(), weapon_match_key_getters):
         # Skip if the bullet seen before.
         if weapon.bullet_file in bullets_seen:
             continue
-
-        args = Get_Match_Rule_Args(weapon, rules)
-        # Skip if no match.
-        if args == None:
-            continue
         
         # Record the bullet. Only do this when a modification will occur.
         bullets_seen.add(weapon.bullet_file)
@@ -309,32 +346,19 @@ def Gen_Weapons_Matched_To_Args(match_rule_args):
     return
     
 
-def Get_Match_Rule_Args(weapon, rules):
+def _Get_Component_Attribute(weapon, attribute):
     '''
-    Checks a weapon against the given rules, and returns args from
-    the first matched rule (as a tuple of there is more than 1 arg).
-    On no match, returns None.
+    Returns an attribute of the weapon's component node.
     '''
-    # Look up the weapon tags and a couple other properties of interest.
-    #weapon_root = weapon.weapon_file.Get_Root_Readonly()
-    component_root = weapon.component_file.Get_Root_Readonly()
-    name           = component_root[0].get('name')
-    class_name     = component_root[0].get('class')
-    tags           = weapon.Get_Tags()
-
-    # Check the matching rules.
-    for key, value, *args in rules:
-        if((key == '*')
-        or (key == 'name' and fnmatch(name, value))
-        or (key == 'tags' and all(x in tags for x in value.split(' ')))
-        or (key == 'class' and class_name == value)):
-            # Want to return 1 item is there are 1 arg, else a tuple
-            # or list of them. Python has no clean syntax for this
-            # that is obvious.
-            if len(args) == 1:
-                return args[0]
-            return args
-    return None
+    return weapon.component_file.Get_Root_Readonly()[0].get(attribute)
+
+
+# Functions to look up the match rule keys of weapons.
+weapon_match_key_getters = {
+    'name'  : lambda x: _Get_Component_Attribute(x, 'name'),
+    'class' : lambda x: _Get_Component_Attribute(x, 'class'),
+    'tags'  : lambda x: set(x.Get_Tags()),
+    }
 
 
 class Weapon:
@@ -344,6 +368,10 @@ class Weapon:
     macro (with connection tags). Initializes from the weapon macro
     file.
 
+    Lookups are recorded along with the current_change_count of the
+    file they were taken from, so that Weapon objects can be reused
+    (through the Weapon_Cache) until their files are changed.
+
     Attributes:
     * weapon_file
       - Weapon macro file.
@@ -353,6 +381,21 @@ class Weapon:
       - Component file for the weapon.
       - Note: the bullet also has a component, but it isn't of interest
         for now.
+    * bullet_name
+      - String, name of the bullet macro, from the weapon macro.
+    * component_name
+      - String, name of the component, from the weapon macro.
+    * weapon_change_count
+      - Int, current_change_count of the weapon_file when the bullet
+        and component names were read.
+    * tags_xpath
+      - String, xpath to the component connection holding the tags,
+        or None if not found.
+    * tags
+      - List of strings, the primary tags of the weapon.
+    * tags_change_count
+      - Int, current_change_count of the component_file when the tags
+        were read, or None if not read yet.
 
     TODO: this needs an overhaul for when files define multiple weapons
     at once.
@@ -362,35 +405,77 @@ class Weapon:
 
         # Grab the root node.
         root = weapon_file.Get_Root_Readonly()
+        self.weapon_change_count = weapon_file.current_change_count
 
         # Look up the bullet and component connections.
-        bullet_name    = root.find('.//bullet').get('class')
-        component_name = root.find('.//component').get('ref')
+        self.bullet_name    = root.find('.//bullet').get('class')
+        self.component_name = root.find('.//component').get('ref')
+
+        self.bullet_file    = File_System.Get_Asset_File(self.bullet_name)
+        self.component_file = File_System.Get_Asset_File(self.component_name)
 
-        self.bullet_file    = File_System.Get_Asset_File(bullet_name)
-        self.component_file = File_System.Get_Asset_File(component_name)
+        # Tags are filled in on first use.
+        self.tags_xpath = None
+        self.tags = None
+        self.tags_change_count = None
         return
 
 
-    def Get_Tags_Xpath(self):
+    def Is_Current(self):
         '''
-        Returns an xpath to the "connection" node holding the main weapon
-        "tags" attribute.  If none found, returns None.
+        Returns True if the weapon file is unchanged since this object
+        was made, and its bullet and component names still resolve to
+        the same files, else False.
+        '''
+        return (self.weapon_file.current_change_count == self.weapon_change_count
+            and File_System.Get_Asset_File(self.bullet_name) is self.bullet_file
+            and File_System.Get_Asset_File(self.component_name) is self.component_file)
+
+
+    def _Update_Tags(self):
+        '''
+        Looks up the tags_xpath and tags from the component file, if not
+        done yet or if the component file changed since the last lookup.
         '''
+        if self.tags_change_count == self.component_file.current_change_count:
+            return
+        self.tags_xpath = None
+        self.tags = []
+        self.tags_change_count = self.component_file.current_change_count
+
         # Note: this connection doesn't have a standard name, but can
         # be identified by a "component" term in the tags.
         root = self.component_file.Get_Root_Readonly()
-        xpath = './/connection[@tags]'
-        for connection in root.xpath(xpath):
-            if 'component' in connection.get('tags'):
-                # Add the name of the connection to the xpath to
-                # uniquify it.
-                name = connection.get('name')
-                xpath += '[@name="{}"]'.format(name)
-                # Verify it.
-                assert root.xpath(xpath)[0] is connection
-                return xpath
-        return None
+        for connection in root.iter('connection'):
+            tags_str = connection.get('tags')
+            if tags_str == None or 'component' not in tags_str:
+                continue
+            # Add the name of the connection to the xpath to
+            # uniquify it.
+            xpath = './/connection[@tags][@name="{}"]'.format(
+                connection.get('name'))
+            # Verify it.
+            assert root.xpath(xpath)[0] is connection
+            self.tags_xpath = xpath
+
+            # These appear to always be space separated.
+            # Some tag lists have brackets and commas; verify that
+            #  isn't the case here.
+            assert '[' not in tags_str
+            assert ',' not in tags_str
+            # Remove any blanks due to excess spaces.
+            self.tags = [x for x in tags_str.split(' ') if x]
+            break
+        return
+
+
+    def Get_Tags_Xpath(self):
+        '''
+        Returns an xpath to the "connection" node holding the main weapon
+        "tags" attribute.  If none found, returns None.
+        '''
+        self._Update_Tags()
+        return self.tags_xpath
 
 
     def Get_Tags(self):
@@ -398,50 +483,84 @@ class Weapon:
         Finds and returns a list of strings holding the primary tags
         for this weapon, or an empty list if tags are not found.
         Pulled from a connection node the component_file.
-        If the tags are not found, returns an empty list.
+        The returned list should not be modified.
         '''
-        xpath = self.Get_Tags_Xpath()
-        if xpath == None:
-            return []
-        root = self.component_file.Get_Root_Readonly()
-        connection = root.find(xpath)
-        tags_str = connection.get('tags')
-
-        # These appear to always be space separated.
-        # Some tag lists have brackets and commas; verify that
-        #  isn't the case here.
-        assert '[' not in tags_str
-        assert ',' not in tags_str
-        # Remove any blanks due to excess spaces.
-        return [x for x in tags_str.split(' ') if x]
+        self._Update_Tags()
+        return self.tags
+
+
+class Weapon_Cache_class:
+    '''
+    Cache of Weapon objects, shared by the weapon transforms and the
+    live editor, so that weapon macros, bullets, components, and tags
+    are only looked up again after their files change.
+
+    Attributes:
+    * weapon_dict
+      - Dict, keyed by weapon macro XML_File, holding the Weapon
+        objects made for them.
+    * source_reader
+      - The File_System source reader the weapon_dict entries were
+        made under; when it changes (eg. on a File_System reset)
+        the entries are dropped.
+    '''
+    def __init__(self):
+        self.weapon_dict = {}
+        self.source_reader = None
+        return
+
+
+    def Reset(self):
+        '''
+        Clears all cached weapons.
+        '''
+        self.weapon_dict.clear()
+        self.source_reader = None
+        return
+
+
+    def Get_Weapons(self, weapon_files):
+        '''
+        Returns a list of Weapon objects for the given weapon macro files,
+        reusing cached objects that are still current.
+        Entries for files not given are dropped.
+        '''
+        # Drop weapons made through an older source reader.
+        source_reader = File_System.Get_Source_Reader()
+        if source_reader is not self.source_reader:
+            self.weapon_dict.clear()
+            self.source_reader = source_reader
+
+        weapon_dict = {}
+        for weapon_file in weapon_files:
+            weapon = self.weapon_dict.get(weapon_file)
+            # Remake the weapon if its links may have changed.
+            if weapon == None or not weapon.Is_Current():
+                weapon = Weapon(weapon_file)
+            weapon_dict[weapon_file] = weapon
+        self.weapon_dict = weapon_dict
+        return list(weapon_dict.values())
+
+
+# Static copy of the cache.
+Weapon_Cache = Weapon_Cache_class()
     
 
 def Get_All_Weapons():
     '''
     Returns a list of Weapon objects, for all discovered weapons.
-    Loads files from expected locations.
+    Loads files as needed, found through the asset index files.
     Includes various weapon classes: weapon, turret, missileturret, etc.
+    Weapon objects are reused from prior calls while their files
+    are unchanged.
     '''
-    # TODO: consider reading  components.xml and macros.xml for all
-    # macro and comp locations, since it pairs names with virtual path.
-    # That still leaves open the issue of picking which macros to
-    # load initially, and just simplifies bullet and component lookups
-    # after the weapon is found.
-
-    # Ensure the related files are loaded in.
-    # Weapons/missiles are in one spot, bullets another.
-    # Want to load in components as well as macros; most of the
-    #  wanted info is in macros, but they can link back to a
-    #  component with some tags of interest.
-    File_System.Load_Files('assets/props/WeaponSystems/*.xml')
-    File_System.Load_Files('assets/fx/weaponFx/*.xml')
-
-    # Grab the weapon macros.
+    # Grab the weapon macros; the asset catalog finds and loads only
+    # the files holding these classes. Bullets and components they link
+    # to are loaded on demand by name, through the index files.
     weapon_files = File_System.Get_Asset_Files_By_Class('macros',
                     'weapon','missilelauncher','turret',
                     'missileturret',
                     'bomblauncher')
 
     # Wrap into Weapon class objects to fill in links to other xml.
-    return [Weapon(x) for x in weapon_files]
-
+    return Weapon_Cache.Get_Weapons(weapon_files)